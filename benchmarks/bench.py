@@ -0,0 +1,189 @@
+"""End-to-end benchmarks of the package against the offline Notion stand-in.
+
+Each benchmark is set up on a fresh synthetic database, then timed on its
+own, so the numbers can be compared across commits:
+
+    python -m benchmarks.bench --sizes 100 10000 --output before.json
+    python -m benchmarks.bench --sizes 100 10000 --compare before.json
+
+Use --latency and --rate to add network round trips and Notion's rate
+limit to the picture; by default the fake answers instantly, which
+measures the package's own overhead.
+
+This is a script rather than a pytest-benchmark suite: a run over 100,000
+rows takes minutes, and the sizes and simulated network conditions are
+chosen per run. `tests/test_bench.py` runs every benchmark once on a small
+database, so that they keep working.
+"""
+import argparse
+import contextlib
+import io
+import json
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from tabulate import tabulate
+
+from jobapplier.api_requests import (fetch_database_jsons, add_cover_letters,
+                                     assign_positions)
+from jobapplier.cover_letter import LETTER_CONFIGS, build_letter
+from jobapplier.cv import cvfy_series, cvfy, ascii_lower
+from jobapplier.data_preprocessing import map_dict, build_dataframe
+from jobapplier.fake_notion import FakeNotion
+
+DATABASE_ID = 'bench'
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """Register a benchmark setup function.
+
+    A setup function receives the database size, a scratch directory and
+    the fake server options, and returns the function to time along with
+    the `FakeNotion` it talks to, if any.
+    """
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def fake_database(n_rows, latency, rate):
+    fake = FakeNotion(latency=latency, rate=rate)
+    pages = fake.add_database(DATABASE_ID, n_rows)
+    return fake, pages
+
+
+@benchmark('fetch_database_jsons')
+def setup_fetch(n_rows, tmp, latency, rate):
+    fake, _ = fake_database(n_rows, latency, rate)
+    client = fake.client(rate=rate)
+    return lambda: fetch_database_jsons(client, DATABASE_ID), fake
+
+
+@benchmark('build_dataframe')
+def setup_dataframe(n_rows, tmp, latency, rate):
+    _, pages = fake_database(n_rows, latency, rate)
+    return lambda: build_dataframe(pages), None
+
+
+@benchmark('build_letter')
+def setup_letter(n_rows, tmp, latency, rate):
+    if not all(Path(config['template_file']).exists()
+               for config in LETTER_CONFIGS.values()):
+        return None, None
+    _, pages = fake_database(n_rows, latency, rate)
+    rows = [map_dict(page) for page in pages]
+
+    def run():
+        for row in rows:
+            build_letter(row['language'], row['company'], row['job_title'])
+    return run, None
+
+
+@benchmark('add_cover_letters')
+def setup_cover_letters(n_rows, tmp, latency, rate):
+    if not all(Path(config['template_file']).exists()
+               for config in LETTER_CONFIGS.values()):
+        return None, None
+    fake, _ = fake_database(n_rows, latency, rate)
+    client = fake.client(rate=rate)
+    ledger_path = Path(tempfile.mkdtemp(dir=tmp)).joinpath('ledger.sqlite')
+    return lambda: add_cover_letters(client, DATABASE_ID, 'paragraph',
+                                     ledger_path=ledger_path), fake
+
+
+@benchmark('assign_positions')
+def setup_positions(n_rows, tmp, latency, rate):
+    fake, pages = fake_database(n_rows, latency, rate)
+    # A daily run: the newest 1% of the entries are not numbered yet.
+    for page in pages[-max(1, n_rows // 100):]:
+        page['properties']['Position']['number'] = None
+    client = fake.client(rate=rate)
+    mirror_path = Path(tempfile.mkdtemp(dir=tmp)).joinpath('mirror.sqlite')
+    return lambda: assign_positions(client, DATABASE_ID, dry_run=False,
+                                    mirror_path=mirror_path), fake
+
+
+@benchmark('cvfy')
+def setup_cvfy(n_rows, tmp, latency, rate):
+    _, pages = fake_database(n_rows, latency, rate)
+    df = build_dataframe(pages)
+
+    def run():
+        cvfy.cache_clear()
+        ascii_lower.cache_clear()
+        cvfy_series(df['job_title'], df['language'])
+    return run, None
+
+
+def run_benchmarks(names, sizes, repeat, latency, rate):
+    """Time each benchmark at each size and return one row per run."""
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_rows in sizes:
+            for name in names:
+                timings = []
+                requests = writes = 0
+                for _ in range(repeat):
+                    run, fake = BENCHMARKS[name](n_rows, tmp, latency, rate)
+                    if run is None:
+                        break
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        start = time.perf_counter()
+                        run()
+                        timings.append(time.perf_counter() - start)
+                    if fake:
+                        requests = len(fake.requests)
+                        writes = len(fake.writes)
+                if not timings:
+                    print(f'Skipped {name}: letter templates not found.')
+                    continue
+                rows.append({
+                    'benchmark': name,
+                    'rows': n_rows,
+                    'best': min(timings),
+                    'median': statistics.median(timings),
+                    'requests': requests,
+                    'writes': writes,
+                })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='benchmarks.bench')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 10_000],
+                        help='database sizes, e.g. 100 10000 100000')
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS),
+                        default=list(BENCHMARKS))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds added to each fake API call')
+    parser.add_argument('--rate', type=float, default=None,
+                        help='requests per second allowed by the fake API')
+    parser.add_argument('--output', type=Path,
+                        help='write the results to a JSON file')
+    parser.add_argument('--compare', type=Path,
+                        help='JSON results of a previous run to compare to')
+    args = parser.parse_args(argv)
+
+    rows = run_benchmarks(vars(args)['only'], vars(args)['sizes'],
+                          vars(args)['repeat'], vars(args)['latency'],
+                          vars(args)['rate'])
+    if vars(args)['compare']:
+        previous = {(row['benchmark'], row['rows']): row['best'] for row in
+                    json.loads(vars(args)['compare'].read_text())}
+        for row in rows:
+            before = previous.get((row['benchmark'], row['rows']))
+            row['vs_before'] = f"{row['best'] / before:.2f}x" if before \
+                else '-'
+    print(tabulate(rows, headers='keys', tablefmt='psql', floatfmt='.4f'))
+    if vars(args)['output']:
+        vars(args)['output'].write_text(json.dumps(rows, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,36 @@
-import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Iterator, TYPE_CHECKING
 
-import pandas as pd
-import requests
 from requests.models import Response
 
-from jobapplier.cover_letter import build_letter
-from jobapplier.data_preprocessing import build_dataframe, is_cleaned_substring
+from jobapplier.blocks import (build_block, text_blocks, split_paragraphs,
+                               batch_children)
+from jobapplier.client import NotionClient
+from jobapplier.constants import (MIRROR_PATH, LEDGER_PATH,
+                                  NOTION_MAX_CONCURRENCY)
+from jobapplier.cover_letter import render_many
+from jobapplier.company_index import COMPANY_LOOKUP_COLUMNS, company_entries
+from jobapplier.data_preprocessing import (PROPERTY_SCHEMA, map_dict,
+                                           extract_number, schema_properties)
+from jobapplier.dispatcher import DispatchResult, summarize
+from jobapplier.instrumentation import count, span, timed
+from jobapplier.ledger import (open_ledger, content_hash, is_recorded,
+                               has_letter, record_letter)
+from jobapplier.plan import (Plan, PageUpdate, BlockAppend, apply_writes,
+                             client_rate, execute_plan)
+from jobapplier.mirror import (open_mirror, last_edited_watermark,
+                               upsert_pages, mark_missing_as_archived,
+                               load_pages, cached_block_trees,
+                               store_block_trees, store_query_ranks,
+                               reconciled_at, mark_reconciled)
+from jobapplier.queries import (PENDING_LETTERS_COLUMNS,
+                                PENDING_LLM_LETTERS_COLUMNS,
+                                pending_letters_filter, is_pending_letter)
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 def stage_is_none(entry: dict) -> bool:
@@ -13,65 +38,32 @@ def stage_is_none(entry: dict) -> bool:
     return entry['properties']['Stage']['select'] is None
 
 
-def build_rich_text(text: str):
-    """Build a Notion rich text JSON object from a plain text string.
-
-    If the input text's length exceeds 2000 characters, it is broken into
-    chunks.
-    """
-
-    max_len = 2000
-    chunks = [text[i:i + max_len] for i in range(0, len(text), max_len)]
-    rich_text = [{
-        "type": "text",
-        "text": {
-            "content": chunk
-        }
-    } for chunk in chunks]
-    return rich_text
-
-
 def build_codeblock_json(text: str):
     """Build a Notion code block JSON object from a plain text string."""
-    rich_text = build_rich_text(text)
-    children = {
-        "children": [
-            {
-                "object": "block",
-                "type": "code",
-                "code": {
-                    "caption": [],
-                    "rich_text": rich_text,
-                    "language": "plain text"
-                }
-            }
-        ]
-    }
-
-    return children
+    return {"children": [build_block(text, 'code')]}
 
 
 def build_paragraph_json(text: str) -> dict:
     """Build a Notion paragraph JSON object from a plain text string."""
-    rich_text = build_rich_text(text)
-    children = {
-        "children": [
-            {
-                "object": "block",
-                "type": "paragraph",
-                "paragraph": {
-                    "rich_text": rich_text
-                }
-            }
-        ]
-    }
-    return children
+    return {"children": [build_block(text, 'paragraph')]}
+
+
+def build_block_children(text: str, block_type: str | None) -> dict:
+    """Build the `children` payload of a block append request.
+
+    Supported block types are 'code' and 'paragraph'; any other value falls
+    back to a paragraph.
+    """
+    if block_type == 'code':
+        return build_codeblock_json(text)
+    return build_paragraph_json(text)
 
 
+@timed('add_block')
 def add_block(
         text: str,
         block_id: str,
-        headers: dict,
+        client: NotionClient,
         block_type: str
 ) -> Response:
     """Append a block to the specified Notion block or page.
@@ -84,8 +76,8 @@ def add_block(
         The text content to include in the block.
     block_id : str
         The ID of the parent block or page to append the code block to.
-    headers : str
-        Notion API headers for a PATCH request.
+    client : NotionClient
+        The Notion API client used to send the PATCH request.
     block_type : str
         Type of Notion block to create. Supported values: 'code', 'paragraph'.
 
@@ -94,180 +86,760 @@ def add_block(
     Response
         The HTTP response object returned by the Notion API.
     """
-    if block_type == 'code':
-        children = build_codeblock_json(text)
-    elif block_type == 'paragraph':
-        children = build_paragraph_json(text)
-    else:
-        children = build_paragraph_json(text)
-    url = f"https://api.notion.com/v1/blocks/{block_id}/children"
-    response = requests.patch(url, headers=headers, data=json.dumps(children))
+    children = build_block_children(text, block_type)
+    response, _ = client.send('PATCH', f'blocks/{block_id}/children',
+                              payload=children)
     return response
 
 
-def fetch_database_jsons(url: str, headers: dict) -> list:
+@timed('append_blocks')
+def append_blocks(client: NotionClient, block_id: str,
+                  children: list[dict]) -> list[dict]:
+    """Append many blocks to a Notion block or page in as few requests as
+    possible.
+
+    Blocks are packed by `batch_children` under Notion's block count and
+    payload size limits, and the batches are sent in order, so that e.g. a
+    letter and a job summary built with `text_blocks` land in one request.
+
+    Reference: https://developers.notion.com/reference/patch-block-children
+
+    Parameters
+    ----------
+    client : NotionClient
+        The Notion API client used to send the PATCH requests.
+    block_id : str
+        The ID of the parent block or page to append the blocks to.
+    children : list of dict
+        The blocks to append, e.g. built with `build_block`.
+
+    Returns
+    -------
+    list of dict
+        The appended blocks, as returned by Notion.
+    """
+    appended = []
+    for batch in batch_children(children):
+        appended.extend(client.append_children(block_id, batch)['results'])
+    return appended
+
+
+def property_ids(client: NotionClient, database_id: str,
+                 names: list[str]) -> list[str]:
+    """Return the IDs of database properties given their names.
+
+    Reference: https://developers.notion.com/reference/retrieve-a-database
+    """
+    schema = client.request('GET', f'databases/{database_id}')['properties']
+    return [schema[name]['id'] for name in names]
+
+
+def iter_result_pages(
+        client: NotionClient,
+        database_id: str,
+        filter: dict | None = None,
+        sorts: list[dict] | None = None,
+        filter_properties: list[str] | None = None,
+        page_size: int = 100
+) -> Iterator[list[dict]]:
+    """Yield the results of a database query one cursor page at a time.
+
+    The request for the next cursor page is sent in the background as soon
+    as the current one arrives, so the caller processes a page while the
+    next one is downloading. At most two result pages are held in memory.
+
+    Parameters
+    ----------
+    client : NotionClient
+        The Notion API client used to query the database.
+    database_id : str
+        The ID of the Notion database.
+    filter : dict or None
+        A Notion filter object, evaluated server-side so that only matching
+        entries are downloaded.
+    sorts : list of dict or None
+        A Notion sorts payload.
+    filter_properties : list of str or None
+        IDs of the properties to include in each entry. All properties are
+        returned if None.
+    page_size : int
+        Number of entries per result page, 100 at most.
+
+    Yields
+    ------
+    list of dict
+        The database entry objects of one result page.
+    """
+    base_body = {"page_size": page_size}
+    if filter:
+        base_body["filter"] = filter
+    if sorts:
+        base_body["sorts"] = sorts
+    params = None
+    if filter_properties:
+        params = {"filter_properties": filter_properties}
+
+    def query(cursor):
+        body = dict(base_body)
+        if cursor:
+            body["start_cursor"] = cursor
+        return client.query_database(database_id, body=body, params=params)
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        future = executor.submit(query, None)
+        while future is not None:
+            with span('pagination_wait'):
+                data = future.result()
+            count('notion_result_pages')
+            future = None
+            if data["has_more"]:
+                future = executor.submit(query, data.get("next_cursor"))
+            yield data["results"]
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_database_jsons(client: NotionClient, database_id: str,
+                        **query) -> Iterator[dict]:
+    """Yield the JSON entries of a Notion database as they are downloaded.
+
+    Accepts the same query arguments as `iter_result_pages`.
+    """
+    for results in iter_result_pages(client, database_id, **query):
+        yield from results
+
+
+@timed('fetch_database_jsons')
+def fetch_database_jsons(
+        client: NotionClient,
+        database_id: str,
+        filter: dict | None = None,
+        sorts: list[dict] | None = None,
+        filter_properties: list[str] | None = None,
+        page_size: int = 100
+) -> list:
     """Fetch all JSON entries from a Notion database and return them as a list.
 
     Parameters
     ----------
-    url : str
-        The Notion API endpoint URL for querying the database.
-    headers : dict
-        A dictionary of HTTP headers including authorization and version info.
+    client : NotionClient
+        The Notion API client used to query the database.
+    database_id : str
+        The ID of the Notion database.
+    filter : dict or None
+        A Notion filter object, evaluated server-side so that only matching
+        entries are downloaded.
+    sorts : list of dict or None
+        A Notion sorts payload.
+    filter_properties : list of str or None
+        IDs of the properties to include in each entry. All properties are
+        returned if None.
+    page_size : int
+        Number of entries per result page, 100 at most.
 
     Returns
     -------
     list
         A list of all database entry objects returned by the Notion API.
     """
-    has_more = True
-    cursor = None
-    all_pages = []
-    body = {}
+    return list(iter_database_jsons(
+        client,
+        database_id,
+        filter=filter,
+        sorts=sorts,
+        filter_properties=filter_properties,
+        page_size=page_size
+    ))
+
+
+@timed('sync_mirror')
+def sync_mirror(client: NotionClient, database_id: str,
+                mirror_path: Path = MIRROR_PATH,
+                reconcile: bool = False,
+                on_pages: Callable[[list[dict]], None] | None = None,
+                reconcile_after: float | None = None) -> int:
+    """Bring the local mirror of a Notion database up to date.
+
+    Only pages edited since the last sync are requested, using a
+    `last_edited_time` filter sorted in ascending order. The first sync
+    downloads the whole database.
 
-    while has_more:
+    Parameters
+    ----------
+    client : NotionClient
+        The Notion API client used to query the database.
+    database_id : str
+        The ID of the Notion database.
+    mirror_path : Path
+        Location of the SQLite mirror file.
+    reconcile : bool
+        If True, also list the IDs of all live pages (projected on the title
+        property only), mark pages that disappeared from the database as
+        archived and store the query order of the others, see `load_pages`.
+    on_pages : callable or None
+        Called with each result page of edited pages once it is stored.
+    reconcile_after : float or None
+        If given, also reconcile when the last reconcile is older than
+        this many hours. The incremental query never returns archived or
+        deleted pages, so without reconciling they stay in the mirror.
+
+    Returns
+    -------
+    int
+        The number of pages added or changed since the previous sync.
+    """
+    conn = open_mirror(mirror_path)
+    try:
+        if reconcile_after is not None and not reconcile:
+            last = reconciled_at(conn, database_id)
+            reconcile = last is None or (
+                datetime.now(timezone.utc) - last
+                > timedelta(hours=reconcile_after)
+            )
+        since = last_edited_watermark(conn, database_id)
+        sorts = [{"timestamp": "last_edited_time", "direction": "ascending"}]
+        since_filter = None
+        if since:
+            since_filter = {
+                "timestamp": "last_edited_time",
+                "last_edited_time": {"on_or_after": since}
+            }
+        changed = 0
+        for results in iter_result_pages(client, database_id,
+                                         filter=since_filter, sorts=sorts):
+            changed += upsert_pages(conn, database_id, results)
+            if on_pages:
+                on_pages(results)
+
+        if reconcile:
+            live_pages = fetch_database_jsons(client, database_id,
+                                              filter_properties=["title"])
+            live_ids = [page['id'] for page in live_pages]
+            removed = mark_missing_as_archived(conn, database_id,
+                                               set(live_ids))
+            if removed:
+                print(f"{removed} pages were removed from the database.")
+            store_query_ranks(conn, database_id, live_ids)
+            mark_reconciled(conn, database_id)
+    finally:
+        conn.close()
+
+    return changed
+
+
+def fetch_mirrored_pages(client: NotionClient, database_id: str,
+                         mirror_path: Path = MIRROR_PATH,
+                         reconcile: bool = False) -> list:
+    """Sync the local mirror of a Notion database and return its pages.
+
+    The returned list has the same shape as the one returned by
+    `fetch_database_jsons`, but only the pages edited since the previous
+    call are downloaded.
+    """
+    changed = sync_mirror(client, database_id, mirror_path=mirror_path,
+                          reconcile=reconcile)
+    print(f"Local mirror synced, {changed} pages updated.")
+    conn = open_mirror(mirror_path)
+    try:
+        return load_pages(conn, database_id)
+    finally:
+        conn.close()
+
+
+def block_plain_text(block: dict) -> str:
+    """Return the plain text of a block's rich text, if it has any."""
+    content = block.get(block['type'], {})
+    return ''.join(t['plain_text'] for t in content.get('rich_text', []))
+
+
+def list_block_children(client: NotionClient, block_id: str) -> list[dict]:
+    """Return all the child blocks of a block or page, following the
+    pagination cursor.
+
+    Reference: https://developers.notion.com/reference/get-block-children
+    """
+    blocks = []
+    cursor = None
+    while True:
+        params = {"page_size": 100}
         if cursor:
-            body = {"start_cursor": cursor}
-        search_response = requests.post(url=url, headers=headers, json=body)
-        search_response.raise_for_status()
-        data = search_response.json()
-        all_pages.extend(data["results"])
-        has_more = data["has_more"]
-        cursor = data.get("next_cursor")
+            params["start_cursor"] = cursor
+        data = client.request('GET', f'blocks/{block_id}/children',
+                              params=params)
+        blocks.extend(data['results'])
+        if not data['has_more']:
+            return blocks
+        cursor = data['next_cursor']
 
-    return all_pages
 
+def fetch_block_tree(client: NotionClient, block_id: str) -> list[dict]:
+    """Return the child blocks of a block or page, with the children of
+    nested blocks (toggles, lists, columns...) under a 'children' key.
 
+    Sub-pages and child databases are not walked into.
+    """
+    blocks = list_block_children(client, block_id)
+    for block in blocks:
+        if block.get('has_children') and block['type'] not in (
+                'child_page', 'child_database'):
+            block['children'] = fetch_block_tree(client, block['id'])
+    return blocks
+
+
+@timed('fetch_block_trees')
+def fetch_block_trees(
+        client: NotionClient,
+        pages: list[dict],
+        mirror_path: Path = MIRROR_PATH,
+        max_concurrency: int = NOTION_MAX_CONCURRENCY
+) -> dict[str, list[dict]]:
+    """Return the block tree of the content of each page.
+
+    Trees are cached in the mirror along with the page's
+    `last_edited_time`, so only pages edited since their tree was stored
+    are downloaded again. Those are walked concurrently.
+
+    Parameters
+    ----------
+    client : NotionClient
+        The Notion API client used to read the page contents.
+    pages : list of dict
+        The raw pages, as returned by a database query.
+    mirror_path : Path
+        Location of the SQLite mirror file holding the cache.
+    max_concurrency : int
+        Maximum number of pages walked at the same time.
+
+    Returns
+    -------
+    dict
+        The block tree of each page, by page ID.
+    """
+    edited_times = {page['id']: page['last_edited_time'] for page in pages}
+    conn = open_mirror(mirror_path)
+    try:
+        trees = cached_block_trees(conn, edited_times)
+        missing = [page_id for page_id in edited_times
+                   if page_id not in trees]
+        count('block_tree_cache', len(trees), result='hit')
+        count('block_tree_cache', len(missing), result='miss')
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            fetched = list(executor.map(
+                lambda page_id: fetch_block_tree(client, page_id), missing
+            ))
+        store_block_trees(conn, [
+            (page_id, edited_times[page_id], blocks)
+            for page_id, blocks in zip(missing, fetched)
+        ])
+    finally:
+        conn.close()
+    trees.update(zip(missing, fetched))
+    return trees
+
+
+def block_tree_text(blocks: list[dict]) -> str:
+    """Return the plain text of a block tree, one line per block."""
+    lines = []
+    for block in blocks:
+        text = block_plain_text(block)
+        if text:
+            lines.append(text)
+        nested = block_tree_text(block.get('children', []))
+        if nested:
+            lines.append(nested)
+    return '\n'.join(lines)
+
+
+def full_job_description(row: dict, blocks: list[dict]) -> str | None:
+    """Return the job description of an entry: its 'Job Description'
+    property followed by the text of the page content."""
+    parts = [row['job_description'], block_tree_text(blocks)]
+    return '\n\n'.join(part for part in parts if part) or None
+
+
+def find_existing_letter(client: NotionClient, page_id: str, text: str,
+                         blocks: list[dict] | None = None) -> str | None:
+    """Return the ID of the first child block of a page holding `text`.
+
+    The letter may be held by a single block, as appended by earlier
+    versions, or by consecutive blocks, one per paragraph. The child blocks
+    are downloaded unless given as `blocks`.
+
+    Reference: https://developers.notion.com/reference/get-block-children
+    """
+    paragraphs = split_paragraphs(text)
+    if blocks is None:
+        blocks = list_block_children(client, page_id)
+    texts = [block_plain_text(block) for block in blocks]
+    for i, block in enumerate(blocks):
+        if texts[i] == text or texts[i:i + len(paragraphs)] == paragraphs:
+            return block['id']
+    return None
+
+
+def iter_letter_appends(
+        client: NotionClient,
+        database_id: str,
+        block_type: str | None,
+        ledger,
+        max_concurrency: int = NOTION_MAX_CONCURRENCY,
+        check_existing: bool = False,
+        llm: bool = False,
+        mirror_path: Path = MIRROR_PATH,
+        schema: dict = PROPERTY_SCHEMA,
+        usage=None,
+        on_incomplete: Callable[[dict], None] | None = None
+) -> Iterator[BlockAppend]:
+    """Yield the cover letter append of each pending entry as soon as its
+    result page is downloaded and its letter built.
+
+    Entries that already have their letter are yielded with no batches.
+    Entries missing a company or a job title are not yielded, but passed
+    to `on_incomplete`. See `add_cover_letters` for the parameters; `usage`
+    is the `llm_letters.TokenUsage` updated with `llm`.
+    """
+    result_pages = iter_result_pages(
+        client,
+        database_id,
+        filter=pending_letters_filter(schema),
+        filter_properties=property_ids(
+            client, database_id,
+            schema_properties(PENDING_LLM_LETTERS_COLUMNS if llm
+                              else PENDING_LETTERS_COLUMNS, schema)
+        )
+    )
+    if llm:
+        from jobapplier.llm_letters import render_llm_letters
+
+    for results in result_pages:
+        lettered = set()
+        with span('map_and_render'):
+            rows = []
+            for entry in results:
+                row = map_dict(entry, schema)
+                if is_pending_letter(row):
+                    rows.append(row)
+                elif on_incomplete is not None:
+                    on_incomplete(row)
+            if llm:
+                lettered = {row['page_id'] for row in rows
+                            if has_letter(ledger, row['page_id'])}
+                rows = [row for row in rows
+                        if row['page_id'] not in lettered]
+            if llm or check_existing:
+                pending_ids = {row['page_id'] for row in rows}
+                trees = fetch_block_trees(
+                    client,
+                    [entry for entry in results
+                     if entry['id'] in pending_ids],
+                    mirror_path=mirror_path,
+                    max_concurrency=max_concurrency
+                )
+            if llm:
+                letters = render_llm_letters(
+                    [(row['language'], row['company'], row['job_title'],
+                      full_job_description(row, trees[row['page_id']]))
+                     for row in rows],
+                    usage=usage
+                )
+            else:
+                letters = render_many(
+                    (row['language'], row['company'], row['job_title'])
+                    for row in rows
+                )
+        for page_id in lettered:
+            yield BlockAppend(page_id, [])
+        for row, letter in zip(rows, letters):
+            page_id = row['page_id']
+            letter_hash = content_hash(letter)
+            if is_recorded(ledger, page_id, letter_hash):
+                yield BlockAppend(page_id, [])
+                continue
+            if check_existing:
+                block_id = find_existing_letter(client, page_id, letter,
+                                                blocks=trees[page_id])
+                if block_id:
+                    record_letter(ledger, page_id, letter_hash, block_id)
+                    yield BlockAppend(page_id, [])
+                    continue
+            yield BlockAppend(
+                page_id=page_id,
+                batches=batch_children(text_blocks(letter, block_type)),
+                label=f"{row['job_title']} at {row['company']}",
+                letter_hash=letter_hash
+            )
+
+
+def report_incomplete(rows: list[dict]) -> None:
+    """Print the pending entries skipped for lack of a company or a job
+    title."""
+    if not rows:
+        return
+    print(f"{len(rows)} pending entries have no company or job title yet, "
+          f"skipped:")
+    for row in rows:
+        print(f"  {row['job_title'] or '(no job title)'} at "
+              f"{row['company'] or '(no company)'} ({row['page_id']})")
+
+
+@timed('add_cover_letters')
 def add_cover_letters(
-        database_url: str,
-        headers: dict,
-        block_type: str | None
-) -> list:
+        client: NotionClient,
+        database_id: str,
+        block_type: str | None,
+        max_concurrency: int = NOTION_MAX_CONCURRENCY,
+        ledger_path: Path = LEDGER_PATH,
+        check_existing: bool = False,
+        llm: bool = False,
+        mirror_path: Path = MIRROR_PATH,
+        schema: dict = PROPERTY_SCHEMA
+) -> list[DispatchResult]:
     """Generate and append cover letters to Notion entries missing a 'stage'
     value.
 
     This function:
-    1. Fetches entries from the provided Notion database URL.
-    2. Filters for entries where the 'stage' property is not set.
-    3. Builds a cover letter using language, company, and job title.
-    4. Appends each cover letter as a Notion block (e.g., paragraph or code).
+    1. Queries the Notion database for entries where the 'stage' property
+       is not set and the 'language' property is. The filter runs
+       server-side and only the properties needed for the letter are
+       downloaded. Entries missing a company or a job title are skipped
+       and listed, as their letter cannot be built yet.
+    2. Builds a cover letter using language, company, and job title, or,
+       with `llm`, has an LLM tailor it to the job description.
+    3. Appends each cover letter as Notion blocks, one paragraph block per
+       letter paragraph or a single code block, sending the requests
+       concurrently under Notion's rate limit. All the blocks of a letter
+       go in a single request, unless they exceed Notion's request limits.
+
+    Entries are streamed: letters for the first result page are built and
+    sent while the following pages are still downloading. Use
+    `plan_cover_letters` to compute all the appends without sending them.
+
+    Every successful append is recorded in a ledger as soon as its response
+    comes back, so a rerun after a crash or a partial failure skips the
+    pages that already received the same letter.
 
     Parameters
     ----------
-    database_url : str
-        The URL of the Notion database to query.
-    headers : dict
-        HTTP headers for Notion API requests, including authorization and
-        version info.
+    client : NotionClient
+        The Notion API client used for all requests.
+    database_id : str
+        The ID of the Notion database to query.
     block_type : str or None
         The Notion block type to use when appending the cover letter. Can
         be either 'paragraph' or 'code'.
+    max_concurrency : int
+        Maximum number of append requests in flight at the same time.
+    ledger_path : Path
+        Location of the SQLite ledger of appended letters.
+    check_existing : bool
+        If True, also read the existing children of pages missing from the
+        ledger and skip those already holding the letter, e.g. letters
+        appended before the ledger existed.
+    llm : bool
+        If True, generate the letters with `llm_letters.render_llm_letters`.
+        Pages that already received any letter are skipped before paying
+        for a completion, since a generated letter may differ between runs.
+        The job description given to the LLM includes the page content.
+    mirror_path : Path
+        Location of the SQLite mirror file caching the page contents read
+        for `llm` and `check_existing`.
+    schema : dict
+        The property schema of the database, see `PROPERTY_SCHEMA`.
 
     Returns
     -------
-    list of Response
-        A list of HTTP response objects from the Notion API, one for each
-        appended block.
+    list of DispatchResult
+        One result per page with its status code, number of attempts and
+        error message, if any. Skipped pages have no result.
     """
-    print("Fetching database with Notion's API...")
-    results = fetch_database_jsons(url=database_url, headers=headers)
-    print("Database successfully fetched.")
-    df_full = build_dataframe(results)
-    columns = ['page_id', 'job_title', 'company', 'language']
-    df_pending = df_full.loc[
-        df_full['stage'].isna() & df_full['language'].notna(), columns
-    ]
-    df_pending['cover_letter'] = df_pending.apply(
-        lambda row: build_letter(
-            row['language'],
-            row['company'],
-            row['job_title']
-        ),
-        axis=1
-    )
-
-    responses = []
-    for i, (index, row) in enumerate(df_pending.iterrows()):
-        response = add_block(
-            text=row['cover_letter'],
-            block_id=row['page_id'],
-            headers=headers,
-            block_type=block_type
-        )
-        responses.append(response)
-        print(f'{i + 1}. Cover letter added to {row['job_title']}'
-              f' at {row['company']}')
-
+    print("Fetching pending entries with Notion's API...")
+    if llm:
+        from jobapplier.llm_letters import TokenUsage
+
+        usage = TokenUsage()
+    ledger = open_ledger(ledger_path)
+    skipped = 0
+    incomplete = []
+
+    def pending_appends():
+        nonlocal skipped
+        for append in iter_letter_appends(
+                client, database_id, block_type, ledger,
+                max_concurrency=max_concurrency,
+                check_existing=check_existing, llm=llm,
+                mirror_path=mirror_path, schema=schema,
+                usage=usage if llm else None,
+                on_incomplete=incomplete.append):
+            if append.batches:
+                yield append
+            else:
+                skipped += 1
+
+    def report(result: DispatchResult):
+        if result.ok:
+            print(f'Cover letter added to {result.label}')
+        else:
+            print(f'Failed to add cover letter to {result.label}: '
+                  f'{result.status_code} {result.error}')
+
+    try:
+        dispatch_results = apply_writes(client, pending_appends(),
+                                        max_concurrency=max_concurrency,
+                                        ledger=ledger, on_result=report)
+    finally:
+        ledger.close()
+    print(summarize(dispatch_results))
+    if skipped:
+        print(f"{skipped} pages already had their cover letter, skipped.")
+    report_incomplete(incomplete)
+    if llm:
+        print(usage)
+        for error in usage.errors:
+            print(f'Template used for {error}')
     print("Cover letters are generated and added to the Notion database.")
 
-    return responses
+    return dispatch_results
+
+
+@timed('plan_cover_letters')
+def plan_cover_letters(
+        client: NotionClient,
+        database_id: str,
+        block_type: str | None,
+        ledger_path: Path = LEDGER_PATH,
+        check_existing: bool = False,
+        llm: bool = False,
+        mirror_path: Path = MIRROR_PATH,
+        schema: dict = PROPERTY_SCHEMA
+) -> Plan:
+    """Compute the appends of `add_cover_letters` without sending them.
+
+    Nothing is written to Notion. With `llm`, the letters are generated,
+    and cached, so that applying the plan appends the reviewed letters.
+    Apply the plan with `plan.execute_plan`.
+    """
+    plan = Plan(action='fill_cover_letters', database_id=database_id,
+                rate_limit=client_rate(client))
+    if llm:
+        from jobapplier.llm_letters import TokenUsage
+
+        usage = TokenUsage()
+    ledger = open_ledger(ledger_path)
+    incomplete = []
+    try:
+        for append in iter_letter_appends(
+                client, database_id, block_type, ledger,
+                check_existing=check_existing, llm=llm,
+                mirror_path=mirror_path, schema=schema,
+                usage=usage if llm else None,
+                on_incomplete=incomplete.append):
+            if append.batches:
+                plan.block_appends.append(append)
+            else:
+                plan.skipped += 1
+    finally:
+        ledger.close()
+    report_incomplete(incomplete)
+    if llm:
+        print(usage)
+    print(plan.summary())
+    return plan
 
 
 def company_substring_entries(
         substring: str,
-        url: str,
-        headers: dict
-) -> pd.DataFrame:
-    """Return entries where company contains the given substring."""
-    results = fetch_database_jsons(url=url, headers=headers)
-    df_jobs = build_dataframe(results)
-    columns = ['job_title', 'company', 'date_applied', 'origin', 'stage']
-    df_containing_substring = df_jobs.loc[
-        df_jobs['company'].map(lambda x: is_cleaned_substring(substring, x)),
-        columns
-    ]
-    return df_containing_substring
-
-
-def assign_positions(database_url: str, headers: dict,
-                     position_property: str = "Position", dry_run: bool = True):
+        client: NotionClient,
+        database_id: str,
+        fuzzy: bool = False,
+        mirror_path: Path = MIRROR_PATH
+) -> 'pd.DataFrame':
+    """Return entries where company contains the given substring, as a
+    dataframe. See `company_entries`."""
+    import pandas as pd
+
+    columns = COMPANY_LOOKUP_COLUMNS + (['match', 'score'] if fuzzy else [])
+    entries = company_entries(substring, client, database_id, fuzzy=fuzzy,
+                              mirror_path=mirror_path)
+    return pd.DataFrame(entries, columns=columns)
+
+
+@timed('plan_positions')
+def plan_positions(client: NotionClient, database_id: str,
+                   position_property: str = "Position",
+                   only_changed: bool = True,
+                   mirror_path: Path = MIRROR_PATH) -> Plan:
+    """Plan the updates of `assign_positions` without sending them."""
+    all_pages = fetch_mirrored_pages(client, database_id,
+                                     mirror_path=mirror_path, reconcile=True)
+    total = len(all_pages)
+    plan = Plan(action='assign_positions', database_id=database_id,
+                rate_limit=client_rate(client))
+
+    for idx, page in enumerate(all_pages):
+        page_id = page['id']
+        position_value = total - idx  # reverse order
+        current_value = extract_number(position_property, page['properties'])
+        if only_changed and current_value == position_value:
+            plan.skipped += 1
+            continue
+        row = map_dict(page)
+        plan.page_updates.append(PageUpdate(
+            page_id=page_id,
+            properties={position_property: {'number': position_value}},
+            label=f"{current_value} → {position_value} ← "
+                  f"{row['job_title'] or ''} @ {row['company'] or ''}"
+                  f" (applied {row['date_applied'] or ''})"
+        ))
+
+    print(f'{len(plan.page_updates)}/{total} entries to renumber, '
+          f'{plan.skipped} writes saved.')
+    return plan
+
+
+@timed('assign_positions')
+def assign_positions(client: NotionClient, database_id: str,
+                     position_property: str = "Position", dry_run: bool = True,
+                     max_concurrency: int = NOTION_MAX_CONCURRENCY,
+                     only_changed: bool = True,
+                     mirror_path: Path = MIRROR_PATH
+                     ) -> list[DispatchResult]:
     """Assign reversed order numbers to all database entries based on query
     order.
 
+    By default, only the entries whose current number differs from their
+    target number are updated, so that adding a few entries on top of the
+    database costs a few writes instead of one per entry.
+
     Parameters
     ----------
-    database_url : str
-        The Notion API database query endpoint, e.g.
-        "https://api.notion.com/v1/databases/<db_id>/query".
-    headers : dict
-        Headers including Authorization, Notion-Version, and Content-Type.
+    client : NotionClient
+        The Notion API client used for all requests.
+    database_id : str
+        The ID of the Notion database.
     position_property : str
         The name of the Number property to update.
     dry_run : bool
-        If True, only prints the planned updates without sending PATCH requests.
-    """
-    all_pages = fetch_database_jsons(url=database_url, headers=headers)
-    total = len(all_pages)
+        If True, only prints a summary of the planned updates without
+        sending PATCH requests. Use `plan_positions` to review them.
+    max_concurrency : int
+        Maximum number of update requests in flight at the same time.
+    only_changed : bool
+        If False, update every entry, even those already numbered correctly.
+    mirror_path : Path
+        Location of the SQLite mirror file.
 
-    for idx, page in enumerate(all_pages):
-        page_id = page['id']
-        position_value = total - idx  # reverse order
-        props = page['properties']
-
-        def get_text(prop_name):
-            if prop_name in props and props[prop_name]['type'] == 'title':
-                return ''.join(
-                    [t['plain_text'] for t in props[prop_name]['title']])
-            if prop_name in props and props[prop_name]['type'] == 'rich_text':
-                return ''.join(
-                    [t['plain_text'] for t in props[prop_name]['rich_text']])
-            if prop_name in props and props[prop_name]['type'] == 'date':
-                return props[prop_name]['date']['start']
-            return ''
-
-        job_title = get_text('Job Title')
-        company = get_text('Company')
-        date_applied = get_text('Date Applied')
-
-        print(f'Planned: {position_value} ← {job_title} @ {company} '
-              f'(applied {date_applied}) [{page_id}]')
-
-        if not dry_run:
-            update_url = f'https://api.notion.com/v1/pages/{page_id}'
-            update_payload = {
-                'properties': {position_property: {'number': position_value}}}
-            resp = requests.patch(update_url, headers=headers,
-                                  json=update_payload)
-            resp.raise_for_status()
-            print(f'Updated: {position_value} ← {job_title} @ {company}'
-                  f' (applied {date_applied})')
+    Returns
+    -------
+    list of DispatchResult
+        One result per updated page, empty on a dry run.
+    """
+    plan = plan_positions(client, database_id,
+                          position_property=position_property,
+                          only_changed=only_changed, mirror_path=mirror_path)
+    if dry_run:
+        print(plan.summary())
+        return []
+    if not plan.page_updates:
+        return []
+    return execute_plan(plan, client, max_concurrency=max_concurrency)
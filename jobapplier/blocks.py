@@ -0,0 +1,241 @@
+import json
+import re
+from typing import Iterable
+
+try:
+    import orjson
+except ImportError:  # optional, see the 'fast' extra
+    orjson = None
+
+from jobapplier.constants import (NOTION_MAX_TEXT_LENGTH,
+                                  NOTION_MAX_RICH_TEXT_ITEMS,
+                                  NOTION_MAX_BLOCKS_PER_REQUEST,
+                                  NOTION_MAX_PAYLOAD_BYTES)
+
+TEXT_BLOCK_TYPES = ['paragraph', 'heading_1', 'heading_2', 'heading_3',
+                    'bulleted_list_item', 'numbered_list_item', 'quote',
+                    'code']
+
+PARAGRAPH_BREAK = re.compile(r'\n[ \t]*\n')
+
+
+def dumps(obj) -> bytes:
+    """Serialize a request payload to compact JSON, with orjson if it is
+    installed.
+
+    Payloads are sized with the same function that serializes them, so the
+    size checks of `batch_children` and `validate_children` hold for the
+    bytes actually sent.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False,
+                      separators=(',', ':')).encode('utf-8')
+
+
+def utf16_length(text: str) -> int:
+    """Return the length of a text in UTF-16 code units, the unit of
+    Notion's text length limits: characters outside the Basic Multilingual
+    Plane, such as most emojis, count twice."""
+    if text.isascii():
+        return len(text)
+    return len(text.encode('utf-16-le')) // 2
+
+
+def split_text(text: str, max_len: int = NOTION_MAX_TEXT_LENGTH) -> list[str]:
+    """Split a text into chunks of at most `max_len` UTF-16 code units.
+
+    Chunks end after the last whitespace that fits, so that words are not
+    cut, unless that would leave a chunk less than half full. Joining the
+    chunks gives back the text.
+    """
+    if len(text) <= max_len // 2:
+        # Short enough whatever its characters, the common case.
+        return [text] if text else []
+    chunks = []
+    start = 0
+    # A slice of 2 * max_len characters holds more than max_len code units
+    # whenever the rest of the text does.
+    while utf16_length(text[start:start + 2 * max_len]) > max_len:
+        end = start + max_len
+        excess = utf16_length(text[start:end]) - max_len
+        while excess > 0:
+            # Each character is one or two code units, so this never cuts
+            # more than one code unit too many.
+            end -= (excess + 1) // 2
+            excess = utf16_length(text[start:end]) - max_len
+        space = max(text.rfind(char, start, end) for char in ' \n\t')
+        if space >= start + (end - start) // 2:
+            end = space + 1
+        chunks.append(text[start:end])
+        start = end
+    if start < len(text):
+        chunks.append(text[start:])
+    return chunks
+
+
+def rich_text_items(chunks: list[str]) -> list[dict]:
+    return [{"type": "text", "text": {"content": chunk}} for chunk in chunks]
+
+
+def build_rich_text(text: str):
+    """Build a Notion rich text JSON object from a plain text string.
+
+    If the input text exceeds 2000 UTF-16 code units, it is broken into
+    chunks on word boundaries, see `split_text`.
+    """
+    return rich_text_items(split_text(text))
+
+
+def rich_text_block(rich_text: list[dict], block_type: str) -> dict:
+    content = {"rich_text": rich_text}
+    if block_type == 'code':
+        content = {"caption": [], **content, "language": "plain text"}
+    return {
+        "object": "block",
+        "type": block_type,
+        block_type: content
+    }
+
+
+def build_block(text: str, block_type: str | None = 'paragraph') -> dict:
+    """Build a single Notion block JSON object from a plain text string.
+
+    Supported block types are listed in `TEXT_BLOCK_TYPES`; None falls back
+    to a paragraph.
+    """
+    block_type = block_type or 'paragraph'
+    if block_type not in TEXT_BLOCK_TYPES:
+        raise ValueError(f'Unsupported block type: {block_type}')
+    return rich_text_block(build_rich_text(text), block_type)
+
+
+def split_paragraphs(text: str) -> list[str]:
+    """Split a text on blank lines, dropping empty paragraphs."""
+    paragraphs = (paragraph.strip() for paragraph in
+                  PARAGRAPH_BREAK.split(text))
+    return [paragraph for paragraph in paragraphs if paragraph]
+
+
+def text_blocks(text: str, block_type: str | None = 'paragraph') -> list[dict]:
+    """Build the blocks holding a text, one per paragraph.
+
+    Code blocks keep the whole text in a single block, so that its layout is
+    preserved. Paragraphs too long for the rich text limits of one block are
+    spread over several blocks.
+    """
+    block_type = block_type or 'paragraph'
+    if block_type not in TEXT_BLOCK_TYPES:
+        raise ValueError(f'Unsupported block type: {block_type}')
+    if block_type == 'code':
+        parts = [text]
+    else:
+        parts = split_paragraphs(text)
+    blocks = []
+    for part in parts:
+        items = rich_text_items(split_text(part))
+        for i in range(0, len(items), NOTION_MAX_RICH_TEXT_ITEMS):
+            blocks.append(rich_text_block(
+                items[i:i + NOTION_MAX_RICH_TEXT_ITEMS], block_type
+            ))
+    return blocks
+
+
+def payload_size(children: list[dict]) -> int:
+    """Return the size in bytes of a `children` payload once serialized."""
+    return len(dumps({"children": children}))
+
+
+def validate_children(
+        children: list[dict],
+        max_blocks: int = NOTION_MAX_BLOCKS_PER_REQUEST,
+        max_bytes: int = NOTION_MAX_PAYLOAD_BYTES
+) -> int:
+    """Check a `children` payload against Notion's request limits, to fail
+    before sending a request bound to be rejected.
+
+    Reference: https://developers.notion.com/reference/request-limits
+
+    Returns
+    -------
+    int
+        The size of the serialized payload, in bytes.
+
+    Raises
+    ------
+    ValueError
+        If the payload breaks a limit.
+    """
+    if len(children) > max_blocks:
+        raise ValueError(f'{len(children)} blocks in one request, '
+                         f'{max_blocks} at most.')
+    for block in children:
+        rich_text = block.get(block.get('type'), {}).get('rich_text', [])
+        if len(rich_text) > NOTION_MAX_RICH_TEXT_ITEMS:
+            raise ValueError(f'{len(rich_text)} rich text items in a block, '
+                             f'{NOTION_MAX_RICH_TEXT_ITEMS} at most.')
+        for item in rich_text:
+            content = item.get('text', {}).get('content', '')
+            if len(content) <= NOTION_MAX_TEXT_LENGTH // 2:
+                continue
+            length = utf16_length(content)
+            if length > NOTION_MAX_TEXT_LENGTH:
+                raise ValueError(f'Rich text of {length} characters, '
+                                 f'{NOTION_MAX_TEXT_LENGTH} at most.')
+    size = payload_size(children)
+    if size > max_bytes:
+        raise ValueError(f'Payload of {size} bytes, {max_bytes} at most.')
+    return size
+
+
+def batch_children(
+        children: Iterable[dict],
+        max_blocks: int = NOTION_MAX_BLOCKS_PER_REQUEST,
+        max_bytes: int = NOTION_MAX_PAYLOAD_BYTES
+) -> list[list[dict]]:
+    """Pack blocks into the fewest append requests allowed by Notion's limits.
+
+    Blocks keep their order, so each batch must be sent after the previous
+    one. Since a batch can only hold consecutive blocks, filling each batch
+    as much as possible gives the fewest batches.
+
+    Reference: https://developers.notion.com/reference/request-limits
+
+    Parameters
+    ----------
+    children : iterable of dict
+        The blocks to append.
+    max_blocks : int
+        Maximum number of blocks in one request.
+    max_bytes : int
+        Maximum size of one serialized request payload.
+
+    Returns
+    -------
+    list of list of dict
+        The batches of blocks, one per request.
+
+    Raises
+    ------
+    ValueError
+        If a single block is larger than `max_bytes`.
+    """
+    overhead = payload_size([])
+    batches = []
+    batch = []
+    batch_bytes = overhead
+    for block in children:
+        # Blocks after the first one are preceded by ',' in the array.
+        block_bytes = len(dumps(block)) + 1
+        if overhead + block_bytes - 1 > max_bytes:
+            raise ValueError('A single block exceeds the payload size limit.')
+        if batch and (len(batch) >= max_blocks
+                      or batch_bytes + block_bytes > max_bytes):
+            batches.append(batch)
+            batch = []
+            batch_bytes = overhead
+        batch_bytes += block_bytes if batch else block_bytes - 1
+        batch.append(block)
+    if batch:
+        batches.append(batch)
+    return batches
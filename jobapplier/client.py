@@ -0,0 +1,223 @@
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.models import Response
+
+from jobapplier.blocks import dumps, validate_children
+from jobapplier.constants import (NOTION_API_URL, NOTION_RATE_LIMIT,
+                                  NOTION_MAX_RETRIES, NOTION_POOL_SIZE,
+                                  NOTION_TIMEOUT)
+from jobapplier.instrumentation import count, observe, is_enabled
+
+
+# Request payloads are serialized by `blocks.dumps` rather than by requests.
+JSON_HEADERS = {'Content-Type': 'application/json'}
+
+
+class TokenBucket:
+    """Thread-safe token bucket limiting the average request rate.
+
+    Parameters
+    ----------
+    rate : float
+        Number of tokens added per second, i.e. the sustained request rate.
+    capacity : int
+        Maximum number of tokens, i.e. the allowed burst size.
+    """
+
+    def __init__(self, rate: float = NOTION_RATE_LIMIT, capacity: int = 3):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Block until a token is available and consume it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                elapsed = now - self._updated
+                self._tokens = min(self.capacity,
+                                   self._tokens + elapsed * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_time = (1 - self._tokens) / self.rate
+            time.sleep(wait_time)
+
+
+def retry_delay(response: Response, attempt: int,
+                backoff: float = 0.5) -> float:
+    """Return how long to wait before retrying a failed request.
+
+    A 429 response carries a `Retry-After` header which is honored as is.
+    Other retryable errors use exponential backoff with full jitter.
+    """
+    retry_after = response.headers.get('Retry-After')
+    if response.status_code == 429 and retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return random.uniform(0, backoff * 2 ** attempt)
+
+
+def endpoint(path: str) -> str:
+    """Return a path without its object IDs, e.g. 'blocks/children' for
+    'blocks/<id>/children', to label request metrics."""
+    parts = path.strip('/').split('/')
+    return parts[0] if len(parts) <= 2 else f'{parts[0]}/{parts[-1]}'
+
+
+def is_retryable(response: Response) -> bool:
+    """Return True for throttled (429) and server error (5xx) responses."""
+    return response.status_code == 429 or response.status_code >= 500
+
+
+class NotionClient:
+    """Notion API client sharing one pooled HTTP session.
+
+    All requests go through a single `requests.Session` with keep-alive and
+    gzip, so a batch job reuses a handful of connections instead of doing a
+    TLS handshake per call. Requests are rate limited by a token bucket and
+    retried on 429 and 5xx responses.
+
+    Parameters
+    ----------
+    headers : dict
+        Notion API headers, including authorization and version info.
+    pool_size : int
+        Maximum number of kept-alive connections to api.notion.com.
+    timeout : float or tuple of float
+        Connect and read timeout of each request, in seconds.
+    limiter : TokenBucket or None
+        Rate limiter shared by all requests of this client.
+    max_retries : int
+        Number of retries of a throttled or failed request.
+    """
+
+    def __init__(
+            self,
+            headers: dict,
+            pool_size: int = NOTION_POOL_SIZE,
+            timeout: float | tuple[float, float] = NOTION_TIMEOUT,
+            limiter: TokenBucket | None = None,
+            max_retries: int = NOTION_MAX_RETRIES
+    ):
+        self.timeout = timeout
+        self.limiter = limiter or TokenBucket()
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+        self.session.headers['Accept-Encoding'] = 'gzip, deflate'
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size,
+                              pool_block=True)
+        self.session.mount('https://', adapter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        """Close the underlying session and its pooled connections."""
+        self.session.close()
+
+    def url(self, path: str) -> str:
+        """Return the absolute API URL of a path like 'pages/<id>'."""
+        if path.startswith('https://'):
+            return path
+        return f'{NOTION_API_URL}/{path.lstrip("/")}'
+
+    def send(
+            self,
+            method: str,
+            path: str,
+            payload: dict | None = None,
+            params: dict | None = None
+    ) -> tuple[Response, int]:
+        """Send a rate-limited request, retrying on 429 and 5xx responses.
+
+        Returns
+        -------
+        tuple of (Response, int)
+            The last HTTP response and the number of attempts made.
+        """
+        url = self.url(path)
+        data = dumps(payload) if payload is not None else None
+        labels = {'method': method, 'endpoint': endpoint(path)}
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            self.limiter.acquire()
+            sent = time.perf_counter()
+            observe('rate_limit_wait_seconds', sent - start)
+            attempt += 1
+            response = self.session.request(method, url, data=data,
+                                            params=params,
+                                            headers=JSON_HEADERS,
+                                            timeout=self.timeout)
+            if is_enabled():
+                observe('notion_request_seconds',
+                        time.perf_counter() - sent, **labels)
+                count('notion_requests', status=response.status_code,
+                      **labels)
+                count('notion_bytes_sent', len(response.request.body or b''))
+                count('notion_bytes_received', len(response.content))
+            if not is_retryable(response) or attempt > self.max_retries:
+                return response, attempt
+            count('notion_retries', status=response.status_code, **labels)
+            time.sleep(retry_delay(response, attempt - 1))
+
+    def request(
+            self,
+            method: str,
+            path: str,
+            payload: dict | None = None,
+            params: dict | None = None
+    ) -> dict:
+        """Send a request and return its decoded JSON body.
+
+        Raises
+        ------
+        requests.HTTPError
+            If the final response has an error status code.
+        """
+        response, _ = self.send(method, path, payload=payload, params=params)
+        response.raise_for_status()
+        return response.json()
+
+    def query_database(self, database_id: str, body: dict | None = None,
+                       params: dict | None = None) -> dict:
+        """Query one page of results of a database.
+
+        Reference: https://developers.notion.com/reference/post-database-query
+        """
+        return self.request('POST', f'databases/{database_id}/query',
+                            payload=body or {}, params=params)
+
+    def append_children(self, block_id: str, children: list[dict]) -> dict:
+        """Append child blocks to a block or page.
+
+        The payload is checked against Notion's request limits first, see
+        `blocks.validate_children`.
+
+        Reference: https://developers.notion.com/reference/patch-block-children
+        """
+        validate_children(children)
+        return self.request('PATCH', f'blocks/{block_id}/children',
+                            payload={'children': children})
+
+    def update_page(self, page_id: str, properties: dict) -> dict:
+        """Update the properties of a page.
+
+        Reference: https://developers.notion.com/reference/patch-page
+        """
+        return self.request('PATCH', f'pages/{page_id}',
+                            payload={'properties': properties})
@@ -0,0 +1,253 @@
+import re
+import sqlite3
+from bisect import bisect_left
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from unidecode import unidecode
+
+from jobapplier.constants import MIRROR_PATH, MIRROR_RECONCILE_HOURS
+from jobapplier.data_preprocessing import PROPERTY_SCHEMA, EXTRACTORS, map_dict
+from jobapplier.mirror import open_mirror, load_pages, mirror_version
+
+if TYPE_CHECKING:
+    from jobapplier.client import NotionClient
+
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS company_index (
+    database_key TEXT NOT NULL,
+    page_id TEXT NOT NULL,
+    company TEXT NOT NULL,
+    normalized TEXT NOT NULL,
+    PRIMARY KEY (database_key, page_id)
+);
+CREATE TABLE IF NOT EXISTS company_index_state (
+    database_key TEXT PRIMARY KEY,
+    mirror_version INTEGER NOT NULL
+);
+"""
+
+COMPANY_LOOKUP_COLUMNS = ['job_title', 'company', 'date_applied', 'origin',
+                          'stage']
+
+NON_ALPHANUMERIC = re.compile(r'[^0-9a-z]+')
+
+
+def normalize_company(name: str) -> str:
+    """Unidecode, casefold and strip punctuation from a company name.
+
+    'Société Générale, S.A.' becomes 'societe generale s a'.
+    """
+    return NON_ALPHANUMERIC.sub(' ', unidecode(str(name)).casefold()).strip()
+
+
+def trigrams(text: str) -> set[str]:
+    """Return the character trigrams of a normalized string.
+
+    The string is padded with spaces so that short names and word
+    boundaries also produce trigrams.
+    """
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+@dataclass
+class CompanyMatch:
+    """A database entry whose company matches a query."""
+    page_id: str
+    company: str
+    kind: str
+    score: float
+
+
+class CompanyIndex:
+    """In-memory lookup structures over normalized company names.
+
+    Supports substring lookups (like `is_cleaned_substring`, but also
+    insensitive to punctuation and spacing), token-prefix lookups and fuzzy
+    lookups by trigram similarity.
+
+    Parameters
+    ----------
+    entries : list of tuple
+        (page_id, company, normalized company) triples.
+    """
+
+    def __init__(self, entries: list[tuple[str, str, str]]):
+        self.entries = entries
+        self.trigram_postings: dict[str, set[int]] = {}
+        self.trigram_sets = []
+        self.compact_names = [normalized.replace(' ', '')
+                              for _, _, normalized in entries]
+        token_pairs = []
+        for idx, (_, _, normalized) in enumerate(entries):
+            grams = trigrams(normalized)
+            self.trigram_sets.append(grams)
+            for gram in grams:
+                self.trigram_postings.setdefault(gram, set()).add(idx)
+            token_pairs.extend((token, idx) for token in normalized.split())
+        token_pairs.sort()
+        self.tokens = [token for token, _ in token_pairs]
+        self.token_entries = [idx for _, idx in token_pairs]
+
+    def candidates(self, grams: set[str]) -> set[int]:
+        """Return the entries sharing at least one trigram with `grams`."""
+        found = set()
+        for gram in grams:
+            found |= self.trigram_postings.get(gram, set())
+        return found
+
+    def substring(self, normalized: str) -> set[int]:
+        """Return the entries whose name contains `normalized`.
+
+        Spaces are ignored on both sides, so 'loreal' matches "L'Oréal".
+        """
+        compact = normalized.replace(' ', '')
+        if not compact:
+            return set()
+        return {idx for idx, name in enumerate(self.compact_names)
+                if compact in name}
+
+    def token_prefix(self, normalized: str) -> set[int]:
+        """Return the entries having a token that starts with each query
+        token, e.g. 'soc gen' matches 'societe generale'."""
+        result = None
+        for query_token in normalized.split():
+            matched = set()
+            start = bisect_left(self.tokens, query_token)
+            for pos in range(start, len(self.tokens)):
+                if not self.tokens[pos].startswith(query_token):
+                    break
+                matched.add(self.token_entries[pos])
+            result = matched if result is None else result & matched
+        return result or set()
+
+    def fuzzy(self, normalized: str, threshold: float) -> dict[int, float]:
+        """Return the entries with a trigram Dice similarity to `normalized`
+        of at least `threshold`, with their similarity."""
+        grams = trigrams(normalized)
+        scores = {}
+        for idx in self.candidates(grams):
+            other = self.trigram_sets[idx]
+            score = 2 * len(grams & other) / (len(grams) + len(other))
+            if score >= threshold:
+                scores[idx] = score
+        return scores
+
+    def search(self, query: str, fuzzy: bool = False,
+               threshold: float = 0.6) -> list[CompanyMatch]:
+        """Find the entries whose company matches `query`.
+
+        Exact substring matches come first, then token-prefix matches and,
+        if `fuzzy` is True, near-duplicate names by trigram similarity.
+        """
+        normalized = normalize_company(query)
+        kinds = {}
+        for idx in self.substring(normalized):
+            kinds[idx] = ('substring', 1.0)
+        for idx in self.token_prefix(normalized) - kinds.keys():
+            kinds[idx] = ('prefix', 1.0)
+        if fuzzy:
+            for idx, score in self.fuzzy(normalized, threshold).items():
+                kinds.setdefault(idx, ('fuzzy', round(score, 3)))
+
+        matches = [
+            CompanyMatch(page_id=self.entries[idx][0],
+                         company=self.entries[idx][1], kind=kind, score=score)
+            for idx, (kind, score) in kinds.items()
+        ]
+        return sorted(matches, key=lambda match: -match.score)
+
+
+def build_company_index(conn: sqlite3.Connection,
+                        database_key: str) -> CompanyIndex:
+    """Return the company index of a mirrored database.
+
+    Normalized names are persisted in the mirror and recomputed only when
+    the mirror changed since the index was last built, i.e. once per sync
+    that brought in new data.
+    """
+    conn.executescript(INDEX_SCHEMA)
+    version = mirror_version(conn, database_key)
+    row = conn.execute(
+        "SELECT mirror_version FROM company_index_state "
+        "WHERE database_key = ?",
+        (database_key,)
+    ).fetchone()
+
+    if row is None or row[0] != version:
+        prop_name, prop_type, _ = PROPERTY_SCHEMA['company']
+        extract = EXTRACTORS[prop_type]
+        rows = []
+        for page in load_pages(conn, database_key):
+            company = extract(prop_name, page['properties'])
+            if company:
+                rows.append((database_key, page['id'], company,
+                             normalize_company(company)))
+        with conn:
+            conn.execute("DELETE FROM company_index WHERE database_key = ?",
+                         (database_key,))
+            conn.executemany(
+                "INSERT INTO company_index (database_key, page_id, company, "
+                "normalized) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO company_index_state "
+                "(database_key, mirror_version) VALUES (?, ?)",
+                (database_key, version)
+            )
+
+    entries = conn.execute(
+        "SELECT page_id, company, normalized FROM company_index "
+        "WHERE database_key = ?",
+        (database_key,)
+    ).fetchall()
+    return CompanyIndex(entries)
+
+
+def company_entries(
+        substring: str,
+        client: 'NotionClient | None',
+        database_id: str,
+        fuzzy: bool = False,
+        mirror_path: Path = MIRROR_PATH
+) -> list[dict]:
+    """Return entries where company contains the given substring.
+
+    Companies are looked up in the normalized company index of the local
+    mirror, which is rebuilt only when the sync brought in changes. With
+    `fuzzy`, near-duplicate spellings are matched as well, and the match
+    kind and similarity score are added to each entry.
+
+    The sync also reconciles the mirror once every `MIRROR_RECONCILE_HOURS`,
+    so that entries removed from the tracker stop matching. If `client` is
+    None, the mirror is used as is, without syncing, and may still hold
+    removed entries. Neither pandas nor requests are imported then, which
+    keeps quick command line lookups fast.
+    """
+    if client is not None:
+        from jobapplier.api_requests import sync_mirror
+
+        sync_mirror(client, database_id, mirror_path=mirror_path,
+                    reconcile_after=MIRROR_RECONCILE_HOURS)
+    conn = open_mirror(mirror_path)
+    try:
+        index = build_company_index(conn, database_id)
+        matches = index.search(substring, fuzzy=fuzzy)
+        pages = load_pages(conn, database_id,
+                           page_ids=[match.page_id for match in matches])
+    finally:
+        conn.close()
+
+    by_page = {match.page_id: match for match in matches}
+    entries = []
+    for page in pages:
+        row = map_dict(page)
+        entry = {column: row[column] for column in COMPANY_LOOKUP_COLUMNS}
+        if fuzzy:
+            entry['match'] = by_page[page['id']].kind
+            entry['score'] = by_page[page['id']].score
+        entries.append(entry)
+    return entries
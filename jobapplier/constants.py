@@ -1,34 +1,97 @@
 from configparser import ConfigParser
+from functools import lru_cache
 from pathlib import Path
 
 CONFIG_NAME = "config.ini"
 CONFIG_PATH = Path(__file__).resolve().parent.parent / CONFIG_NAME
 
-config = ConfigParser()
-config.read(CONFIG_PATH)
 
-NOTION_API_KEY = config['secrets']['api_key']
-TEST_DATABASE_ID = config['databases']['test_database_id']
-JOB_TRACKER_2_DATABASE_ID = config['databases']['job_tracker_2_database_id']
-OPENAI_KEY = config['secrets']['openai_key']
+@lru_cache(maxsize=None)
+def get_config() -> ConfigParser:
+    """Read `config.ini` on first use and cache it."""
+    config = ConfigParser()
+    config.read(CONFIG_PATH)
+    return config
 
-API_HEADERS = {
-    "Authorization": f"Bearer {NOTION_API_KEY}",
-    "Content-Type": "application/json",
-    "Accept": "application/json",
-    "Notion-Version": "2022-06-28",
+
+def api_headers(api_key: str) -> dict:
+    """Return the Notion API headers for an integration secret."""
+    return {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+        "Accept": "application/json",
+        "Notion-Version": "2022-06-28",
+    }
+
+
+# Constants read from config.ini. They are resolved on first access by the
+# module-level __getattr__ below, so importing this module (and every
+# module depending on it) does not read the config file.
+CONFIG_CONSTANTS = {
+    'NOTION_API_KEY': lambda c: c['secrets']['api_key'],
+    'OPENAI_KEY': lambda c: c['secrets']['openai_key'],
+    'OPENAI_BASE_URL':
+        lambda c: c.get('openai', 'base_url', fallback='') or None,
+    'OPENAI_MODEL':
+        lambda c: c.get('openai', 'model', fallback='') or LLM_MODEL,
+    'TEST_DATABASE_ID': lambda c: c['databases']['test_database_id'],
+    'JOB_TRACKER_2_DATABASE_ID':
+        lambda c: c['databases']['job_tracker_2_database_id'],
+    'API_HEADERS': lambda c: api_headers(c['secrets']['api_key']),
+    'URL_TEST_DATABASE': lambda c: (
+        f"https://api.notion.com/v1/databases/"
+        f"{c['databases']['test_database_id']}/query"),
+    'URL_JOB_TRACKER_2_DATABASE': lambda c: (
+        f"https://api.notion.com/v1/databases/"
+        f"{c['databases']['job_tracker_2_database_id']}/query"),
 }
-URL_TEST_DATABASE = (f"https://api.notion.com/v1/databases/{TEST_DATABASE_ID}"
-                     f"/query")
-URL_JOB_TRACKER_2_DATABASE = (
-    f"https://api.notion.com/v1/databases/{JOB_TRACKER_2_DATABASE_ID}"
-    f"/query")
+
+
+def __getattr__(name: str):
+    if name in CONFIG_CONSTANTS:
+        return CONFIG_CONSTANTS[name](get_config())
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+NOTION_API_URL = "https://api.notion.com/v1"
+NOTION_POOL_SIZE = 10
+NOTION_TIMEOUT = (5, 30)  # connect and read timeouts, in seconds
+NOTION_RATE_LIMIT = 3.0  # average requests per second allowed by Notion
+NOTION_MAX_CONCURRENCY = 3
+NOTION_MAX_RETRIES = 5
+NOTION_MAX_TEXT_LENGTH = 2000  # characters per rich text item
+NOTION_MAX_RICH_TEXT_ITEMS = 100
+NOTION_MAX_BLOCKS_PER_REQUEST = 100
+NOTION_MAX_PAYLOAD_BYTES = 500_000
 
 DOCUMENTS_PATH = Path("documents")
 CV_RAW_PATH = DOCUMENTS_PATH.joinpath("cv_raw")
 CV_RENAMED_PATH = DOCUMENTS_PATH.joinpath("cv_renamed")
+CV_MANIFEST_FILE = Path("manifest.json")
+CV_COPY_WORKERS = 8
 DATA_PATH = DOCUMENTS_PATH.joinpath("data")
 LISTINGS_INIT_FILE = Path("listings_init.csv")
+LISTINGS_SCREENED_FILE = Path("listings_screened.csv")
+RUN_REPORT_FILE = Path("run_report.json")
+MIRROR_PATH = DATA_PATH.joinpath("notion_mirror.sqlite")
+LEDGER_PATH = DATA_PATH.joinpath("letters_ledger.sqlite")
+LLM_CACHE_PATH = DATA_PATH.joinpath("llm_cache.sqlite")
+MIRROR_RECONCILE_HOURS = 24  # max age of the list of live pages of a mirror
+SNAPSHOT_PATH = DATA_PATH.joinpath("snapshot")
+TRACKERS_PATH = DATA_PATH.joinpath("trackers")
+TRACKER_SECTION_PREFIX = "tracker:"
+TRACKER_MAX_WORKERS = 4  # trackers processed at the same time
 
 LETTER_TEMPLATE_PATH_EN = Path("documents/letter_templates/en_template.txt")
 LETTER_TEMPLATE_PATH_FR = Path("documents/letter_templates/fr_template.txt")
+LLM_PROMPT_PATH = Path("documents/letter_templates/llm_prompt.txt")
+LLM_MODEL = "gpt-4.1"
+LLM_MAX_CONCURRENCY = 4
+
+WATCH_MIN_INTERVAL = 2.0  # seconds between polls right after a change
+WATCH_MAX_INTERVAL = 60.0  # seconds between polls of an idle tracker
+WATCH_BACKOFF = 1.5
+
+DEDUP_THRESHOLD = 0.7  # Jaccard similarity of company and title trigrams
+DEDUP_NUM_PERM = 64  # MinHash permutations
+DEDUP_BANDS = 16  # LSH bands of DEDUP_NUM_PERM / DEDUP_BANDS rows
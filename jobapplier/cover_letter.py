@@ -1,11 +1,16 @@
+import re
 import unicodedata
-import pandas as pd
+from functools import lru_cache
+from typing import Iterable
+
 import os
 
 from jobapplier.constants import (LETTER_TEMPLATE_PATH_EN, DATA_PATH,
                                   LETTER_TEMPLATE_PATH_FR)
+from jobapplier.instrumentation import timed
 
 
+@lru_cache(maxsize=4096)
 def starts_with_vowel(word: str) -> bool:
     """Return True if the word starts with a vowel (supports accents)."""
     word = word.strip()
@@ -19,30 +24,113 @@ def starts_with_vowel(word: str) -> bool:
     return base_letter in 'aeiouy'
 
 
-def build_letter_config(company: str, title: str) -> dict:
-    """Return letter config dict for English and French templates."""
-    configs = {
-        'EN': {
-            'template_file': LETTER_TEMPLATE_PATH_EN,
-            'replacements': {
-                'COMPANY NAME': company,
-                'JOB TITLE': title,
-            },
-            'article_before_title': ('as a ', 'as an ')
+LETTER_CONFIGS = {
+    'EN': {
+        'template_file': LETTER_TEMPLATE_PATH_EN,
+        'placeholders': {
+            'COMPANY NAME': 'company',
+            'JOB TITLE': 'title',
+        },
+        'elisions': {
+            'title': ('as a ', 'as an '),
+        },
+    },
+    'FR': {
+        'template_file': LETTER_TEMPLATE_PATH_FR,
+        'placeholders': {
+            'NOM D’ENTREPRISE': 'company',
+            'TITRE DU POSTE': 'title',
         },
-        'FR': {
-            'template_file': LETTER_TEMPLATE_PATH_FR,
-            'replacements': {
-                'NOM D’ENTREPRISE': company,
-                'TITRE DU POSTE': title,
-            },
-            'article_before_title': ('en tant que ', "en tant qu'"),
-            'de_phrase': ('de ', "d'")
-        }
-    }
-    return configs
+        'elisions': {
+            'title': ('en tant que ', "en tant qu'"),
+            'company': ('de ', "d'"),
+        },
+    },
+}
+
 
+class LetterTemplate:
+    """A letter template pre-parsed into literal segments and slots.
+
+    Each slot holds the name of the value to insert and, if the template
+    puts an article right before it, the plain and vowel forms of that
+    article (e.g. 'as a ' and 'as an '). Rendering is then a single join,
+    with the elision resolved per slot.
+    """
+
+    def __init__(self, text: str, placeholders: dict, elisions: dict):
+        pattern = re.compile('|'.join(map(re.escape, placeholders)))
+        self.parts = []
+        position = 0
+        for match in pattern.finditer(text):
+            literal = text[position:match.start()]
+            name = placeholders[match.group()]
+            article = elisions.get(name)
+            if article and _ends_with_word(literal, article[0]):
+                literal = literal[:-len(article[0])]
+            else:
+                article = None
+            self.parts.append(literal)
+            self.parts.append((name, article))
+            position = match.end()
+        self.parts.append(text[position:])
+
+    def render(self, **values: str) -> str:
+        """Fill in the slots and return the letter text."""
+        pieces = []
+        for part in self.parts:
+            if isinstance(part, str):
+                pieces.append(part)
+                continue
+            name, article = part
+            value = values[name]
+            if article:
+                plain, vowel = article
+                pieces.append(vowel if starts_with_vowel(value) else plain)
+            pieces.append(value)
+        return ''.join(pieces)
+
+
+def _ends_with_word(text: str, word: str) -> bool:
+    """Return True if `text` ends with `word` starting on a word boundary."""
+    if not text.endswith(word):
+        return False
+    head = text[:-len(word)]
+    return not head or not head[-1].isalnum()
 
+
+_TEMPLATE_CACHE: dict[str, tuple[int, LetterTemplate]] = {}
+
+
+def load_template(lang: str) -> LetterTemplate:
+    """Return the parsed letter template of a language.
+
+    Templates are parsed once and cached; a template is parsed again only
+    when its file modification time changes.
+
+    Raises
+    ------
+    ValueError
+        If `lang` is not one of the supported values ('EN', 'FR').
+    """
+    if lang not in LETTER_CONFIGS:
+        raise ValueError(f"The language selected: '{lang}'."
+                         "Please select lang value from ['EN', 'FR'].")
+
+    config = LETTER_CONFIGS[lang]
+    mtime = os.stat(config['template_file']).st_mtime_ns
+    cached = _TEMPLATE_CACHE.get(lang)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    with open(config['template_file'], 'r', encoding='utf-8') as f:
+        template = LetterTemplate(f.read(), config['placeholders'],
+                                  config['elisions'])
+    _TEMPLATE_CACHE[lang] = (mtime, template)
+    return template
+
+
+@timed('build_letter')
 def build_letter(lang: str, company: str, title: str) -> str:
     """Build a personalized cover letter from a template.
 
@@ -72,33 +160,23 @@ def build_letter(lang: str, company: str, title: str) -> str:
     ValueError
         If `lang` is not one of the supported values ('EN', 'FR').
     """
-    configs = build_letter_config(company, title)
+    return load_template(lang).render(company=company, title=title)
 
-    if lang not in configs:
-        raise ValueError(f"The language selected: '{lang}'."
-                         "Please select lang value from ['EN', 'FR'].")
-
-    config = configs[lang]
-    template_file_path = configs[lang]['template_file']
-
-    with open(template_file_path, 'r', encoding='utf-8') as f:
-        letter = f.read()
-        for placeholder, value in config['replacements'].items():
-            letter = letter.replace(placeholder, value)
 
-    article, vowel_article = config['article_before_title']
-    title_phrase = f"{article}{title}"
-    if starts_with_vowel(title):
-        corrected_phrase = f"{vowel_article}{title}"
-        letter = letter.replace(title_phrase, corrected_phrase)
+@timed('render_many')
+def render_many(rows: Iterable[tuple[str, str, str]]) -> list[str]:
+    """Build cover letters for many (lang, company, title) rows.
 
-    if lang == 'FR' and starts_with_vowel(company):
-        de_phrase, de_contracted = config['de_phrase']
-        original_phrase = f"{de_phrase}{company}"
-        corrected_phrase = f"{de_contracted}{company}"
-        letter = letter.replace(original_phrase, corrected_phrase)
-
-    return letter
+    Each template is looked up once per language for the whole batch
+    rather than once per letter.
+    """
+    templates = {}
+    letters = []
+    for lang, company, title in rows:
+        if lang not in templates:
+            templates[lang] = load_template(lang)
+        letters.append(templates[lang].render(company=company, title=title))
+    return letters
 
 
 def build_cover_letter_prompt(base_prompt: str, company_website: str,
@@ -126,11 +204,14 @@ def build_cover_letter_prompt(base_prompt: str, company_website: str,
 # TODO: remove this function after it's not needed
 def add_cover_letters_csv(listings_init_csv: str,
                           listings_with_covers_csv: str) -> None:
+    import pandas as pd
+
     df_listings = pd.read_csv(DATA_PATH.joinpath(listings_init_csv))
-    df_listings['cover_letter'] = df_listings.apply(
-        lambda row: build_letter(row['language'], row['company_name'],
-                                 row['job_title']), axis=1
-    )
+    df_listings['cover_letter'] = render_many(zip(
+        df_listings['language'],
+        df_listings['company_name'],
+        df_listings['job_title']
+    ))
     df_listings.to_csv(DATA_PATH.joinpath(listings_with_covers_csv),
                        index=False)
 
@@ -1,13 +1,26 @@
+import hashlib
+import json
+import os
+import re
 import shutil
 import string
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
 
 import pandas as pd
-from nltk.tokenize import word_tokenize
 from unidecode import unidecode
 
-from jobapplier.api_requests import fetch_database_jsons
-from jobapplier.constants import CV_RAW_PATH, CV_RENAMED_PATH, DATA_PATH
-from jobapplier.data_preprocessing import build_dataframe
+from jobapplier.api_requests import fetch_database_jsons, property_ids
+from jobapplier.client import NotionClient
+from jobapplier.constants import (CV_RAW_PATH, CV_RENAMED_PATH, DATA_PATH,
+                                  CV_MANIFEST_FILE, CV_COPY_WORKERS)
+from jobapplier.data_preprocessing import (PROPERTY_SCHEMA, build_dataframe,
+                                           schema_properties)
+from jobapplier.instrumentation import count, span, timed
+from jobapplier.plan import Plan, FileCopy, client_rate
+from jobapplier.queries import (ACTIVE_APPLICATIONS_COLUMNS,
+                                active_applications_sorts, select_is_empty)
 
 
 def get_sep(lang: str):
@@ -20,42 +33,306 @@ def get_sep(lang: str):
                        " Please choose the language from ['EN', 'FR']")
 
 
+# Drops ASCII punctuation and digits, and turns '/' into a word break.
+SLUG_TABLE = str.maketrans(
+    {'/': ' ', **dict.fromkeys(string.punctuation.replace('/', '')
+                               + string.digits)}
+)
+# The rules of NLTK's `word_tokenize` (NLTKWordTokenizer), which CV names
+# were built with, applied in order. Transliteration runs after SLUG_TABLE,
+# so punctuation it introduces is tokenized: curly quotes become `` and '',
+# possessives and contractions are split ("senior's" -> senior 's, "can't"
+# -> ca n't, 'gonna' -> gon na). The text is ASCII by then, so the rules on
+# non-ASCII quotes are left out.
+STARTING_QUOTES = [
+    (re.compile(r"(`+)"), r" \1 "),
+    (re.compile(r'^"'), r"``"),
+    (re.compile(r"(``)"), r" \1 "),
+    (re.compile(r"""([ \(\[{<])("|'{2})"""), r"\1 `` "),
+    (re.compile(r"(?i)(')(?!re|ve|ll|m|t|s|d|n)(\w)\b"), r"\1 \2"),
+]
+PUNCTUATION = [
+    (re.compile(r"""([^\.])(\.)([\]\)}>"' ]*)\s*$"""), r"\1 \2 \3 "),
+    (re.compile(r"([:,])([^\d])"), r" \1 \2"),
+    (re.compile(r"([:,])$"), r" \1 "),
+    (re.compile(r"\.{2,}"), r" \g<0> "),
+    (re.compile(r"[;@#$%&]"), r" \g<0> "),
+    (re.compile(r"""([^\.])(\.)([\]\)}>"']*)\s*$"""), r"\1 \2\3 "),
+    (re.compile(r"[?!]"), r" \g<0> "),
+    (re.compile(r"([^'])' "), r"\1 ' "),
+    (re.compile(r"[*]"), r" \g<0> "),
+    (re.compile(r"[\]\[\(\)\{\}\<\>]"), r" \g<0> "),
+    (re.compile(r"--"), r" -- "),
+]
+ENDING_QUOTES = [
+    (re.compile(r"''"), " '' "),
+    (re.compile(r'"'), " '' "),
+    (re.compile(r"\s+"), " "),
+    (re.compile(r"([^' ])('[sS]|'[mM]|'[dD]|') "), r"\1 \2 "),
+    (re.compile(r"([^' ])('ll|'LL|'re|'RE|'ve|'VE|n't|N'T) "), r"\1 \2 "),
+]
+CONTRACTIONS = [
+    re.compile(pattern) for pattern in [
+        r"(?i)\b(can)(not)\b", r"(?i)\b(d)('ye)\b", r"(?i)\b(gim)(me)\b",
+        r"(?i)\b(gon)(na)\b", r"(?i)\b(got)(ta)\b", r"(?i)\b(lem)(me)\b",
+        r"(?i)\b(more)('n)\b", r"(?i)\b(wan)(na)(?=\s)",
+        r"(?i) ('t)(is)\b", r"(?i) ('t)(was)\b",
+    ]
+]
+
+
+def word_tokens(text: str) -> list[str]:
+    """Split ASCII text into words like NLTK's `word_tokenize`.
+
+    Unlike `word_tokenize`, the text is not first split into sentences,
+    which only matters around the periods, question and exclamation marks
+    that transliteration makes of e.g. '…', '。' or '？'.
+    """
+    for pattern, substitution in STARTING_QUOTES + PUNCTUATION:
+        text = pattern.sub(substitution, text)
+    text = f' {text} '
+    for pattern, substitution in ENDING_QUOTES:
+        text = pattern.sub(substitution, text)
+    for pattern in CONTRACTIONS:
+        text = pattern.sub(r' \1 \2 ', text)
+    return text.split()
+
+
+@lru_cache(maxsize=4096)
+def ascii_lower(text: str) -> str:
+    """Transliterate a string to lowercase ASCII."""
+    return unidecode(text).lower()
+
+
+@lru_cache(maxsize=4096)
 def cvfy(text: str, lang: str) -> str:
     """Make the string 'Data Scientist' look like 'cv-data-scientist'"""
-    text = text.replace('/', ' ')
-    for c in string.punctuation:
-        text = text.replace(c, '')
-    for c in string.digits:
-        text = text.replace(c, '')
-    text = unidecode(text)
-    text = text.lower()
-    tokens = word_tokenize(text)
     sep = get_sep(lang)
-    text = sep.join(tokens)
-    return f'cv{sep}{text}'
-
-
-def copy_and_rename_cvs(url: str, headers: dict):
-    """Take CVs named with only numbers, cvfy their names and save."""
-    all_pages = fetch_database_jsons(url=url,
-                                     headers=headers)
-    df_jobs = build_dataframe(all_pages)
-    df_active_apps = (df_jobs[df_jobs['stage'].isna()]
-                      .sort_values(by='position', ascending=False))
-    job_titles = df_active_apps['job_title'].to_list()
-    languages = df_active_apps['language'].to_list()
-    cv_filenames = [
-        cvfy(title, lang) + '.pdf' for (title, lang) in
-        zip(job_titles, languages)
-    ]
-    cv_paths_raw = sorted(CV_RAW_PATH.glob('*.pdf'))
+    tokens = word_tokens(ascii_lower(text.translate(SLUG_TABLE)))
+    return f'cv{sep}{sep.join(tokens)}'
+
+
+def cvfy_series(titles: pd.Series, languages: pd.Series) -> pd.Series:
+    """Vectorized `cvfy` over aligned series of job titles and languages."""
+    seps = languages.astype(object).map(get_sep)
+    tokens = (titles.astype(str).str.translate(SLUG_TABLE).map(ascii_lower)
+              .map(word_tokens))
+    return pd.Series(
+        [f'cv{sep}{sep.join(words)}' for sep, words in zip(seps, tokens)],
+        index=titles.index
+    )
+
+
+def file_digest(path: Path) -> str:
+    """Return the SHA-256 hex digest of a file's content."""
+    with open(path, 'rb') as f:
+        return hashlib.file_digest(f, 'sha256').hexdigest()
+
+
+def numeric_sort_key(path: Path) -> tuple:
+    """Sort CVs named with numbers numerically, so that '2.pdf' comes before
+    '10.pdf'."""
+    return (0, int(path.stem), '') if path.stem.isdigit() \
+        else (1, 0, path.stem)
+
+
+def reflink_copy(src: Path, dst: Path) -> None:
+    """Copy a file with `copy_file_range`, falling back to a regular copy.
+
+    On copy-on-write filesystems (Btrfs, XFS, ...) the kernel turns the copy
+    into a reflink sharing the data blocks, elsewhere it copies in-kernel
+    without going through user space.
+    """
+    try:
+        with open(src, 'rb') as f_src, open(dst, 'wb') as f_dst:
+            remaining = os.fstat(f_src.fileno()).st_size
+            while remaining > 0:
+                copied = os.copy_file_range(f_src.fileno(), f_dst.fileno(),
+                                            remaining)
+                if copied == 0:
+                    break
+                remaining -= copied
+        shutil.copystat(src, dst)
+    except (AttributeError, OSError):
+        shutil.copy2(src, dst)
+
+
+def place_cv(src: Path, dst: Path, src_digest: str,
+             hardlink: bool = False) -> str:
+    """Put a copy of `src` at `dst` unless an identical file is already there.
+
+    The file is written next to its target and moved in place, so a crash
+    never leaves a truncated CV behind.
+
+    Returns
+    -------
+    str
+        'skipped', 'linked' or 'copied'.
+    """
+    if dst.exists() and file_digest(dst) == src_digest:
+        return 'skipped'
+    tmp = dst.with_name(f'.{dst.name}.tmp')
+    tmp.unlink(missing_ok=True)
+    if hardlink:
+        try:
+            os.link(src, tmp)
+            os.replace(tmp, dst)
+            return 'linked'
+        except OSError:
+            pass
+    reflink_copy(src, tmp)
+    os.replace(tmp, dst)
+    return 'copied'
+
+
+@timed('plan_cvs')
+def plan_cvs(client: NotionClient, database_id: str,
+             hardlink: bool = False,
+             max_workers: int = CV_COPY_WORKERS,
+             pages: list[dict] | None = None,
+             schema: dict = PROPERTY_SCHEMA) -> Plan:
+    """Plan the copies of `copy_and_rename_cvs` without making them.
+
+    The raw CVs are hashed, in a thread pool, to tell which renamed CVs are
+    already up to date.
+    """
+    if pages is None:
+        pages = fetch_database_jsons(
+            client,
+            database_id,
+            filter=select_is_empty('stage', schema),
+            sorts=active_applications_sorts(schema),
+            filter_properties=property_ids(
+                client, database_id,
+                schema_properties(ACTIVE_APPLICATIONS_COLUMNS, schema)
+            )
+        )
+    df_active_apps = build_dataframe(pages, schema)
+    page_ids = df_active_apps['page_id'].to_list()
+    cv_filenames = (
+        cvfy_series(df_active_apps['job_title'], df_active_apps['language'])
+        + '.pdf'
+    ).to_list()
+    cv_paths_raw = sorted(CV_RAW_PATH.glob('*.pdf'), key=numeric_sort_key)
     cv_paths_to_rename = [
         CV_RENAMED_PATH.joinpath(filename) for filename in cv_filenames
     ]
-    for (cv_raw, cv_to_rename) in zip(cv_paths_raw, cv_paths_to_rename):
-        shutil.copy(cv_raw, cv_to_rename)
-        print(f'File {cv_raw} renamed to {cv_to_rename}')
+
+    def plan_copy(cv_raw, cv_to_rename, page_id):
+        digest = file_digest(cv_raw)
+        stat = cv_raw.stat()
+        return FileCopy(
+            src=str(cv_raw),
+            dst=str(cv_to_rename),
+            sha256=digest,
+            size=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            page_id=page_id,
+            hardlink=hardlink,
+            up_to_date=(cv_to_rename.exists()
+                        and file_digest(cv_to_rename) == digest),
+        )
+
+    plan = Plan(action='rename_cvs', database_id=database_id,
+                rate_limit=client_rate(client))
+    with span('cv_plan'), ThreadPoolExecutor(max_workers=max_workers) \
+            as executor:
+        plan.file_copies = list(executor.map(
+            plan_copy, cv_paths_raw, cv_paths_to_rename, page_ids
+        ))
+    plan.skipped = sum(copy.up_to_date for copy in plan.file_copies)
+    return plan
+
+
+def apply_cv_copies(copies: list[FileCopy],
+                    max_workers: int = CV_COPY_WORKERS) -> list[dict]:
+    """Make the planned CV copies and write their manifest.
+
+    Targets planned as up to date are skipped, and a raw CV whose size or
+    modification time changed since it was planned is not copied, so a
+    saved plan is only ever applied to the files it was computed from.
+
+    Returns
+    -------
+    list of dict
+        The manifest entries.
+    """
+    def process(copy):
+        src, dst = Path(copy.src), Path(copy.dst)
+        stat = src.stat()
+        if (stat.st_size, stat.st_mtime_ns) != (copy.size, copy.mtime_ns):
+            action = 'changed'
+        elif copy.up_to_date and dst.exists():
+            action = 'skipped'
+        else:
+            action = place_cv(src, dst, copy.sha256, hardlink=copy.hardlink)
+        count('cv_files', action=action)
+        count('cv_bytes', copy.size, action=action)
+        return {
+            'raw': copy.src,
+            'page_id': copy.page_id,
+            'renamed': copy.dst,
+            'sha256': copy.sha256,
+            'action': action,
+        }
+
+    CV_RENAMED_PATH.mkdir(parents=True, exist_ok=True)
+    with span('cv_copy'), ThreadPoolExecutor(max_workers=max_workers) \
+            as executor:
+        manifest = list(executor.map(process, copies))
+    for entry in manifest:
+        if entry['action'] == 'skipped':
+            print(f"File {entry['renamed']} is up to date")
+        elif entry['action'] == 'changed':
+            print(f"File {entry['raw']} changed since planned, not copied")
+        else:
+            print(f"File {entry['raw']} renamed to {entry['renamed']}")
+
+    with open(CV_RENAMED_PATH.joinpath(CV_MANIFEST_FILE), 'w',
+              encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
 
     print(f'CVs are renamed and put to {CV_RENAMED_PATH}.')
 
-    return None
+    return manifest
+
+
+@timed('copy_and_rename_cvs')
+def copy_and_rename_cvs(client: NotionClient, database_id: str,
+                        hardlink: bool = False,
+                        max_workers: int = CV_COPY_WORKERS,
+                        pages: list[dict] | None = None,
+                        schema: dict = PROPERTY_SCHEMA) -> list[dict]:
+    """Take CVs named with only numbers, cvfy their names and save.
+
+    The raw CVs, sorted by number, are paired with the active applications
+    sorted by descending position. Files are copied in a thread pool, and
+    targets whose content already matches are skipped, so reruns are
+    near-instant. A manifest mapping each raw file to its page and renamed
+    file is written next to the renamed CVs.
+
+    Parameters
+    ----------
+    client : NotionClient
+        The Notion API client used to query the database.
+    database_id : str
+        The ID of the Notion database.
+    hardlink : bool
+        If True, hard link the renamed CVs to the raw ones instead of
+        copying them, when the filesystem allows it.
+    max_workers : int
+        Number of files copied concurrently.
+    pages : list of dict or None
+        The active applications sorted by descending position, e.g. read
+        from the local mirror. They are queried from Notion if None.
+    schema : dict
+        The property schema of the database, see `PROPERTY_SCHEMA`.
+
+    Returns
+    -------
+    list of dict
+        The manifest entries.
+    """
+    plan = plan_cvs(client, database_id, hardlink=hardlink,
+                    max_workers=max_workers, pages=pages, schema=schema)
+    return apply_cv_copies(plan.file_copies, max_workers=max_workers)
@@ -0,0 +1,250 @@
+"""Long-running worker processing tracker changes as they happen.
+
+The tracker is polled with the incremental mirror sync, which only asks
+Notion for pages edited since the last poll. The poll interval shrinks
+back to its minimum whenever something changed and grows while the
+tracker is idle. A local webhook endpoint can also trigger a poll at once,
+e.g. when forwarded Notion webhook events.
+
+Changed pages go through a work queue to a worker thread running the
+letter stage (append a cover letter to new pending entries) and the CV
+stage (rename the CVs of the active applications, read from the mirror).
+"""
+import json
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from jobapplier.api_requests import sync_mirror, append_blocks
+from jobapplier.blocks import text_blocks
+from jobapplier.client import NotionClient
+from jobapplier.constants import (MIRROR_PATH, LEDGER_PATH,
+                                  WATCH_MIN_INTERVAL, WATCH_MAX_INTERVAL,
+                                  WATCH_BACKOFF)
+from jobapplier.cover_letter import build_letter
+from jobapplier.data_preprocessing import map_dict
+from jobapplier.instrumentation import count, span
+from jobapplier.ledger import (open_ledger, content_hash, is_recorded,
+                               record_letter)
+from jobapplier.mirror import open_mirror, load_pages, page_digest
+from jobapplier.queries import is_pending_letter
+
+STAGES = ['letters', 'cvs']
+
+# Queue item asking the worker to refresh the renamed CVs.
+CV_REFRESH = object()
+
+
+def changed_pages(pages: list[dict], seen: dict[str, str]) -> list[dict]:
+    """Return the pages whose content differs from when they were last
+    seen, and record their new digest in `seen`."""
+    changed = []
+    for page in pages:
+        digest = page_digest(page)
+        if seen.get(page['id']) != digest:
+            seen[page['id']] = digest
+            changed.append(page)
+    return changed
+
+
+def active_applications(pages: list[dict]) -> list[dict]:
+    """Same as the `select_is_empty('stage')` query with the
+    `active_applications_sorts`, evaluated on mirrored pages: no stage, by
+    descending position with empty positions last."""
+    rows = [(page, map_dict(page)) for page in pages]
+    active = [(page, row) for page, row in rows if row['stage'] is None]
+    active.sort(key=lambda item: (item[1]['position'] is None,
+                                  -(item[1]['position'] or 0)))
+    return [page for page, _ in active]
+
+
+def webhook_server(port: int, wake: threading.Event) -> ThreadingHTTPServer:
+    """Start a local HTTP endpoint that triggers a poll on every POST.
+
+    The body of a Notion webhook event is not trusted: it only tells the
+    watcher to sync now, and the changes themselves are read from the API.
+    The verification token sent by Notion when the subscription is created
+    is printed, to be pasted back in the integration settings.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            try:
+                event = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                event = {}
+            if 'verification_token' in event:
+                print(f"Webhook verification token: "
+                      f"{event['verification_token']}")
+            count('webhook_events', type=event.get('type', 'unknown'))
+            wake.set()
+            self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f'Listening for webhook events on http://127.0.0.1:{port}/')
+    return server
+
+
+def process_letter(client: NotionClient, ledger, page: dict,
+                   block_type: str | None) -> bool:
+    """Append a cover letter to a pending entry unless it already got this
+    letter. Returns True if a letter was appended."""
+    row = map_dict(page)
+    if not is_pending_letter(row):
+        return False
+    letter = build_letter(row['language'], row['company'], row['job_title'])
+    letter_hash = content_hash(letter)
+    if is_recorded(ledger, row['page_id'], letter_hash):
+        return False
+    blocks = append_blocks(client, row['page_id'],
+                           text_blocks(letter, block_type))
+    record_letter(ledger, row['page_id'], letter_hash,
+                  blocks[0]['id'] if blocks else None)
+    print(f"Cover letter added to {row['job_title']} at {row['company']}")
+    return True
+
+
+def run_worker(client: NotionClient, database_id: str, work: queue.Queue,
+               stages: list[str], block_type: str | None,
+               mirror_path: Path, ledger_path: Path,
+               cv_requested: threading.Event) -> None:
+    """Consume the work queue until a None item is received."""
+    from jobapplier.cv import copy_and_rename_cvs
+
+    ledger = open_ledger(ledger_path)
+    try:
+        while True:
+            item = work.get()
+            if item is None:
+                return
+            try:
+                if item is CV_REFRESH:
+                    cv_requested.clear()
+                    conn = open_mirror(mirror_path)
+                    try:
+                        pages = active_applications(
+                            load_pages(conn, database_id)
+                        )
+                    finally:
+                        conn.close()
+                    with span('watch_cvs'):
+                        copy_and_rename_cvs(client, database_id,
+                                            pages=pages)
+                elif 'letters' in stages:
+                    with span('watch_letter'):
+                        if process_letter(client, ledger, item, block_type):
+                            count('watch_letters')
+            except Exception as exc:
+                # A failing page must not stop the daemon; it is retried
+                # when it changes again or at the next start.
+                print(f'Failed to process a change: {exc}')
+                count('watch_errors')
+    finally:
+        ledger.close()
+
+
+def watch(
+        client: NotionClient,
+        database_id: str,
+        stages: list[str] = STAGES,
+        block_type: str | None = 'paragraph',
+        webhook_port: int | None = None,
+        min_interval: float = WATCH_MIN_INTERVAL,
+        max_interval: float = WATCH_MAX_INTERVAL,
+        mirror_path: Path = MIRROR_PATH,
+        ledger_path: Path = LEDGER_PATH,
+        stop: threading.Event | None = None
+) -> None:
+    """Watch the tracker and process new and changed entries until
+    interrupted.
+
+    Parameters
+    ----------
+    client : NotionClient
+        The Notion API client used for all requests.
+    database_id : str
+        The ID of the Notion tracker database.
+    stages : list of str
+        The stages to run on changes, among 'letters' and 'cvs'.
+    block_type : str or None
+        The Notion block type of the appended letters.
+    webhook_port : int or None
+        If given, also poll whenever a POST is received on this local port.
+    min_interval, max_interval : float
+        Bounds of the adaptive poll interval, in seconds.
+    mirror_path : Path
+        Location of the SQLite mirror file.
+    ledger_path : Path
+        Location of the SQLite ledger of appended letters.
+    stop : threading.Event or None
+        Set it to stop watching, e.g. from another thread.
+    """
+    stop = stop or threading.Event()
+    wake = threading.Event()
+    work = queue.Queue()
+    # Digest of the last seen content of each page: the sync filter is
+    # inclusive, so the latest pages come back at every poll.
+    seen = {}
+    # Set while a CV refresh is queued, so that a burst of changes renames
+    # the CVs once.
+    cv_requested = threading.Event()
+
+    def enqueue(pages):
+        changed = changed_pages(pages, seen)
+        for page in changed:
+            work.put(page)
+        if changed and 'cvs' in stages and not cv_requested.is_set():
+            cv_requested.set()
+            work.put(CV_REFRESH)
+        return len(changed)
+
+    print('Syncing the local mirror...')
+    sync_mirror(client, database_id, mirror_path=mirror_path, reconcile=True)
+    conn = open_mirror(mirror_path)
+    try:
+        # Catch up on what happened while the daemon was not running.
+        enqueue(load_pages(conn, database_id))
+    finally:
+        conn.close()
+
+    worker = threading.Thread(
+        target=run_worker,
+        args=(client, database_id, work, stages, block_type, mirror_path,
+              ledger_path, cv_requested),
+        daemon=True
+    )
+    worker.start()
+    server = webhook_server(webhook_port, wake) if webhook_port else None
+
+    interval = min_interval
+    print('Watching the tracker, press Ctrl+C to stop.')
+    try:
+        while not stop.is_set():
+            wake.wait(timeout=interval)
+            wake.clear()
+            if stop.is_set():
+                break
+            changed = []
+            try:
+                with span('watch_poll'):
+                    sync_mirror(client, database_id, mirror_path=mirror_path,
+                                on_pages=lambda pages: changed.append(
+                                    enqueue(pages)))
+            except Exception as exc:
+                print(f'Poll failed: {exc}')
+            changed = sum(changed)
+            interval = min_interval if changed \
+                else min(max_interval, interval * WATCH_BACKOFF)
+    except KeyboardInterrupt:
+        print('Stopping...')
+    finally:
+        if server:
+            server.shutdown()
+        work.put(None)
+        worker.join()
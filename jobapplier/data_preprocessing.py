@@ -1,62 +1,118 @@
-import pandas as pd
+from typing import TYPE_CHECKING
+
 from unidecode import unidecode
 
+from jobapplier.instrumentation import timed
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Column name -> (Notion property name, Notion property type, pandas dtype).
+# The column order is the column order of `build_dataframe`.
+PROPERTY_SCHEMA = {
+    'job_title': ('Job Title', 'title', 'object'),
+    'company': ('Company', 'rich_text', 'object'),
+    'language': ('Language', 'select', 'category'),
+    'date_applied': ('Date Applied', 'date', 'datetime64[ns]'),
+    'origin': ('Origin', 'select', 'category'),
+    'stage': ('Stage', 'select', 'category'),
+    'job_description': ('Job Description', 'rich_text', 'object'),
+    'cover_letter': ('Cover letter', 'select', 'object'),
+    'referral': ('Referral', 'rich_text', 'object'),
+    'position': ('Position', 'number', 'Int64'),
+}
+
 
 def is_cleaned_substring(substring: str, string: str) -> bool:
     return unidecode(str(substring).lower()) in unidecode(str(string).lower())
 
 
 def extract_text(obj: list[dict]):
-    """Extract text content from the first item of a Notion rich text list."""
-    return obj[0]['text']['content'] if obj else None
+    """Extract the text content of a Notion rich text list.
+
+    Long texts and texts with mixed formatting are split by Notion into
+    several items, which are joined back together.
+    """
+    if not obj:
+        return None
+    return ''.join(item['plain_text'] if 'plain_text' in item
+                   else item['text']['content'] for item in obj)
 
 
 def extract_select(column_name: str, props: dict):
     """Extract the option name from a Notion select property by column name."""
-    select_dict = props[column_name]['select']
+    select_dict = props.get(column_name, {}).get('select')
     return select_dict['name'] if select_dict else None
 
 
 def extract_number(column_name: str, props: dict):
-    return props[column_name]['number']
+    return props.get(column_name, {}).get('number')
 
 
-def map_dict(entry: dict) -> dict:
-    """Map a Notion API entry to a flattened dictionary format."""
-    _id = entry['id']
-    props = entry['properties']
+def extract_date(column_name: str, props: dict):
+    """Extract the start date string of a Notion date property."""
+    date = props.get(column_name, {}).get('date')
+    return date['start'] if date else None
 
-    company = extract_text(props['Company']['rich_text'])
-    job_title = extract_text(props['Job Title']['title'])
-    referral = extract_text(props['Referral']['rich_text'])
-    job_description = extract_text(props['Job Description']['rich_text'])
-
-    date = props['Date Applied']['date']
-    date_applied = date['start'] if date else None
-
-    origin = extract_select('Origin', props)
-    stage = extract_select('Stage', props)
-    language = extract_select('Language', props)
-    cover_letter = extract_select('Cover letter', props)
-    position = extract_number('Position', props)
-
-    result_dict = {
-        'page_id': _id,
-        'job_title': job_title,
-        'company': company,
-        'language': language,
-        'date_applied': date_applied,
-        'origin': origin,
-        'stage': stage,
-        'job_description': job_description,
-        'cover_letter': cover_letter,
-        'referral': referral,
-        'position': position,
-    }
+
+def extract_rich_text(column_name: str, props: dict):
+    """Extract the text of a Notion title or rich text property."""
+    prop = props.get(column_name)
+    return extract_text(prop[prop['type']]) if prop else None
+
+
+EXTRACTORS = {
+    'title': extract_rich_text,
+    'rich_text': extract_rich_text,
+    'select': extract_select,
+    'number': extract_number,
+    'date': extract_date,
+}
+
+
+def schema_properties(columns: list[str],
+                      schema: dict = PROPERTY_SCHEMA) -> list[str]:
+    """Return the Notion property names behind the given columns."""
+    return [schema[column][0] for column in columns]
+
+
+def map_dict(entry: dict, schema: dict = PROPERTY_SCHEMA) -> dict:
+    """Map a Notion API entry to a flattened dictionary format.
+
+    Properties left out of the entry, e.g. by a `filter_properties`
+    projection, are mapped to None.
+    """
+    props = entry['properties']
+    result_dict = {'page_id': entry['id']}
+    for column, (prop_name, prop_type, _) in schema.items():
+        result_dict[column] = EXTRACTORS[prop_type](prop_name, props)
     return result_dict
 
 
-def build_dataframe(results: list[dict]) -> pd.DataFrame:
-    """Build a dataframe from Notion API raw entries."""
-    entries_list = list(map(map_dict, results))
-    return pd.DataFrame(entries_list)
+@timed('build_dataframe')
+def build_dataframe(results: list[dict],
+                    schema: dict = PROPERTY_SCHEMA) -> 'pd.DataFrame':
+    """Build a dataframe from Notion API raw entries.
+
+    Each column is extracted in a single pass over the entries and cast to
+    the dtype declared in the schema: categories for select properties,
+    datetimes for dates and nullable integers for numbers.
+    """
+    import pandas as pd
+
+    props = [entry['properties'] for entry in results]
+    columns = {
+        'page_id': pd.Series([entry['id'] for entry in results],
+                             dtype='object')
+    }
+    for column, (prop_name, prop_type, dtype) in schema.items():
+        extract = EXTRACTORS[prop_type]
+        values = [extract(prop_name, entry_props) for entry_props in props]
+        if dtype.startswith('datetime'):
+            columns[column] = pd.to_datetime(
+                pd.Series(values, dtype='object'), format='ISO8601',
+                utc=True, errors='coerce'
+            ).dt.tz_localize(None)
+        else:
+            columns[column] = pd.Series(values, dtype='object').astype(dtype)
+    return pd.DataFrame(columns)
@@ -0,0 +1,328 @@
+"""Duplicate and near-duplicate entries of the tracker.
+
+An entry is described by the character trigrams of its normalized company
+and job title, so that 'Data Engineer (H/F)' at 'Société Générale' and
+'Data engineer' at 'Societe Generale SA' share most of them. Comparing
+every pair of entries would be quadratic; instead, MinHash signatures are
+bucketed by locality-sensitive hashing (LSH), so that only entries likely
+to be similar are compared. Numbers in company names are significant:
+'Studio 54' and 'Studio 71' are never duplicates. Candidate pairs are then
+scored by the exact Jaccard similarity of their trigrams and linked into
+clusters:
+
+    pages = fetch_mirrored_pages(client, database_id)
+    for cluster in find_duplicates(pages):
+        print(cluster.tag, cluster.score, len(cluster.entries))
+
+With 64 permutations in 16 bands of 4, a pair with a similarity of 0.7
+becomes a candidate with a probability above 99%.
+"""
+import zlib
+from dataclasses import dataclass
+from itertools import combinations, product
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterator
+
+from jobapplier.company_index import normalize_company, trigrams
+from jobapplier.constants import (MIRROR_PATH, DEDUP_THRESHOLD,
+                                  DEDUP_NUM_PERM, DEDUP_BANDS)
+from jobapplier.data_preprocessing import (PROPERTY_SCHEMA, map_dict,
+                                           extract_rich_text)
+from jobapplier.instrumentation import count, span, timed
+from jobapplier.plan import Plan, PageUpdate, client_rate
+
+if TYPE_CHECKING:
+    import numpy as np
+    from jobapplier.client import NotionClient
+
+# Largest prime below 2 ** 32, so that a * hash + b fits in 64 bits.
+HASH_PRIME = 4294967291
+
+DUPLICATE_COLUMNS = ['tag', 'score', 'job_title', 'company', 'date_applied',
+                     'stage', 'page_id']
+
+
+@dataclass
+class DuplicateCluster:
+    """Entries that look like the same application.
+
+    `entries` are `map_dict` rows, oldest first, each with the 'score' of
+    its closest match in the cluster. `score` is the lowest of them.
+    """
+    tag: str
+    score: float
+    entries: list[dict]
+
+
+def normalize_title(title: str) -> str:
+    """Normalize a job title like a company name, dropping one-letter
+    tokens such as the 'H/F' gender markers of French listings."""
+    return ' '.join(token for token in normalize_company(title).split()
+                    if len(token) > 1)
+
+
+def entry_shingles(row: dict) -> set[str]:
+    """Return the company and title trigrams of an entry, prefixed so that
+    a company trigram never matches a title one."""
+    shingles = set()
+    if row['company']:
+        shingles |= {f'c{gram}'
+                     for gram in trigrams(normalize_company(row['company']))}
+    if row['job_title']:
+        shingles |= {f't{gram}'
+                     for gram in trigrams(normalize_title(row['job_title']))}
+    return shingles
+
+
+def hash_shingles(shingles: set[str]) -> frozenset[int]:
+    """Return the 32-bit hashes of shingles, which are faster to compare
+    than the strings and what MinHash permutes."""
+    return frozenset(zlib.crc32(shingle.encode('utf-8'))
+                     for shingle in shingles)
+
+
+def company_numbers(row: dict) -> frozenset[str]:
+    return frozenset(token for token
+                     in normalize_company(row['company'] or '').split()
+                     if token.isdigit())
+
+
+def minhash_signatures(shingle_sets: list[frozenset[int]],
+                       num_perm: int = DEDUP_NUM_PERM,
+                       seed: int = 0) -> 'np.ndarray':
+    """Return the MinHash signature of each non-empty set of shingle
+    hashes, one row per set, computed with `num_perm` universal hash
+    functions."""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, HASH_PRIME, num_perm, dtype=np.uint64)
+    b = rng.integers(0, HASH_PRIME, num_perm, dtype=np.uint64)
+    signatures = np.empty((len(shingle_sets), num_perm), dtype=np.uint64)
+    # Sets are hashed by chunks, to bound the memory used by the
+    # (shingles x permutations) matrix.
+    chunk = 1000
+    for start in range(0, len(shingle_sets), chunk):
+        sets = shingle_sets[start:start + chunk]
+        hashes = np.fromiter(
+            (shingle for shingles in sets for shingle in shingles),
+            dtype=np.uint64
+        )
+        offsets = np.cumsum([0] + [len(shingles) for shingles in sets[:-1]])
+        values = (hashes[:, None] * a + b) % HASH_PRIME
+        signatures[start:start + len(sets)] = np.minimum.reduceat(
+            values, offsets, axis=0
+        )
+    return signatures
+
+
+def bucket_pairs(members: list[int],
+                 exclusive: list | None = None) -> Iterator[tuple[int, int]]:
+    """Yield the pairs of a bucket of row indices, in increasing order,
+    leaving out the rows whose `exclusive` keys are both set and differ."""
+    if exclusive is None:
+        yield from combinations(members, 2)
+        return
+    groups = {}
+    for idx in members:
+        groups.setdefault(exclusive[idx], []).append(idx)
+    unkeyed = groups.pop(frozenset(), [])
+    yield from combinations(unkeyed, 2)
+    for group in groups.values():
+        yield from combinations(group, 2)
+        for first, second in product(unkeyed, group):
+            yield (first, second) if first < second else (second, first)
+
+
+def lsh_candidates(signatures: 'np.ndarray',
+                   bands: int = DEDUP_BANDS,
+                   exclusive: list[frozenset] | None = None
+                   ) -> set[tuple[int, int]]:
+    """Return the pairs of rows whose signatures are equal on at least one
+    band, i.e. the pairs likely to be similar.
+
+    Rows with different non-empty `exclusive` keys are never paired, which
+    keeps buckets of entries only told apart by such a key, e.g. the
+    numbered agencies of a same company, from growing quadratically.
+    """
+    rows_per_band = signatures.shape[1] // bands
+    pairs = set()
+    for band in range(bands):
+        buckets = {}
+        keys = signatures[:, band * rows_per_band:(band + 1) * rows_per_band]
+        for idx, key in enumerate(keys):
+            buckets.setdefault(key.tobytes(), []).append(idx)
+        for members in buckets.values():
+            if len(members) > 1:
+                pairs.update(bucket_pairs(members, exclusive))
+    return pairs
+
+
+def jaccard(first: frozenset, second: frozenset) -> float:
+    common = len(first & second)
+    return common / (len(first) + len(second) - common)
+
+
+@timed('find_duplicates')
+def find_duplicates(pages: list[dict],
+                    threshold: float = DEDUP_THRESHOLD,
+                    schema: dict = PROPERTY_SCHEMA,
+                    num_perm: int = DEDUP_NUM_PERM,
+                    bands: int = DEDUP_BANDS) -> list[DuplicateCluster]:
+    """Find the clusters of entries that look like the same application.
+
+    Parameters
+    ----------
+    pages : list of dict
+        The database entries, e.g. from `fetch_mirrored_pages`.
+    threshold : float
+        Minimum Jaccard similarity of the company and title trigrams of two
+        entries to put them in the same cluster.
+    schema : dict
+        The property schema of the database, see `PROPERTY_SCHEMA`.
+    num_perm : int
+        Number of MinHash permutations.
+    bands : int
+        Number of LSH bands; `num_perm / bands` signature rows per band.
+        More bands find less similar candidate pairs, at a higher cost.
+
+    Returns
+    -------
+    list of DuplicateCluster
+        The clusters of at least two entries, largest first.
+    """
+    rows = []
+    shingle_sets = []
+    created = {}
+    for page in pages:
+        row = map_dict(page, schema)
+        shingles = entry_shingles(row)
+        if shingles:
+            rows.append(row)
+            shingle_sets.append(hash_shingles(shingles))
+            created[row['page_id']] = page['created_time']
+    if len(rows) < 2:
+        return []
+
+    with span('dedup_minhash'):
+        signatures = minhash_signatures(shingle_sets, num_perm=num_perm)
+    numbers = [company_numbers(row) for row in rows]
+    with span('dedup_lsh'):
+        candidates = lsh_candidates(signatures, bands=bands,
+                                    exclusive=numbers)
+    count('dedup_candidate_pairs', len(candidates))
+
+    # Union-find over the pairs above the threshold.
+    parents = list(range(len(rows)))
+    best = {}
+
+    def root(idx):
+        while parents[idx] != idx:
+            parents[idx] = parents[parents[idx]]
+            idx = parents[idx]
+        return idx
+
+    sizes = [len(shingles) for shingles in shingle_sets]
+    with span('dedup_verify'):
+        for first, second in candidates:
+            # The similarity is at most the ratio of the sizes, a cheap
+            # bound ruling out most candidates before the exact Jaccard.
+            small, large = sorted((sizes[first], sizes[second]))
+            if small < threshold * large:
+                continue
+            score = jaccard(shingle_sets[first], shingle_sets[second])
+            if score < threshold:
+                continue
+            for idx in (first, second):
+                best[idx] = max(best.get(idx, 0.0), score)
+            parents[root(first)] = root(second)
+
+    groups = {}
+    for idx in best:
+        groups.setdefault(root(idx), []).append(idx)
+    clusters = []
+    for members in groups.values():
+        entries = [{**rows[idx], 'score': round(best[idx], 3)}
+                   for idx in members]
+        entries.sort(key=lambda entry: created[entry['page_id']])
+        clusters.append(DuplicateCluster(
+            # Named after the oldest entry, so that the tag of a cluster
+            # does not change when a new duplicate joins it.
+            tag=f"dup-{entries[0]['page_id'].replace('-', '')[:8]}",
+            score=min(entry['score'] for entry in entries),
+            entries=entries,
+        ))
+    clusters.sort(key=lambda cluster: (-len(cluster.entries), cluster.score))
+    return clusters
+
+
+def duplicate_rows(clusters: list[DuplicateCluster]) -> list[dict]:
+    """Flatten clusters into table rows with `DUPLICATE_COLUMNS`."""
+    return [{column: cluster.tag if column == 'tag' else entry[column]
+             for column in DUPLICATE_COLUMNS}
+            for cluster in clusters for entry in cluster.entries]
+
+
+def plan_duplicate_tags(client: 'NotionClient | None', database_id: str,
+                        clusters: list[DuplicateCluster], pages: list[dict],
+                        tag_property: str = 'Duplicate') -> Plan:
+    """Plan the updates writing the tag of its cluster to each duplicate.
+
+    Entries already holding their tag are skipped, so that tagging again
+    after a sync only writes to the new duplicates.
+
+    Parameters
+    ----------
+    client : NotionClient or None
+        The client the plan will be applied with, for its rate limit.
+    database_id : str
+        The ID of the Notion database.
+    clusters : list of DuplicateCluster
+        The clusters returned by `find_duplicates`.
+    pages : list of dict
+        The entries the clusters were found in, to read their current tags.
+    tag_property : str
+        The name of the rich text property receiving the tag. It must
+        exist in the database.
+    """
+    current = {page['id']: extract_rich_text(tag_property, page['properties'])
+               for page in pages}
+    plan = Plan(action='tag_duplicates', database_id=database_id,
+                rate_limit=client_rate(client))
+    for cluster in clusters:
+        for entry in cluster.entries:
+            if current.get(entry['page_id']) == cluster.tag:
+                plan.skipped += 1
+                continue
+            plan.page_updates.append(PageUpdate(
+                page_id=entry['page_id'],
+                properties={tag_property: {'rich_text': [
+                    {'type': 'text', 'text': {'content': cluster.tag}}
+                ]}},
+                label=f"{cluster.tag} ← {entry['job_title']} @ "
+                      f"{entry['company']}"
+            ))
+    return plan
+
+
+def duplicate_entries(client: 'NotionClient', database_id: str,
+                      threshold: float = DEDUP_THRESHOLD,
+                      mirror_path: Path = MIRROR_PATH,
+                      schema: dict = PROPERTY_SCHEMA
+                      ) -> tuple[list[DuplicateCluster], list[dict]]:
+    """Sync the local mirror and find the duplicates of the whole tracker.
+
+    Returns
+    -------
+    tuple of (list of DuplicateCluster, list of dict)
+        The clusters and the mirrored pages they were found in.
+    """
+    from jobapplier.api_requests import fetch_mirrored_pages
+
+    pages = fetch_mirrored_pages(client, database_id,
+                                 mirror_path=mirror_path, reconcile=True)
+    clusters = find_duplicates(pages, threshold=threshold, schema=schema)
+    duplicates = sum(len(cluster.entries) for cluster in clusters)
+    print(f'{duplicates} entries in {len(clusters)} clusters of duplicates '
+          f'among {len(pages)} entries.')
+    return clusters, pages
@@ -0,0 +1,125 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from typing import Callable, Iterable
+
+import requests
+
+from jobapplier.client import NotionClient
+from jobapplier.constants import NOTION_MAX_CONCURRENCY
+from jobapplier.instrumentation import count, timed
+
+
+@dataclass
+class Job:
+    """A single Notion write request to be dispatched."""
+    key: str
+    method: str
+    path: str
+    payload: dict
+    label: str = ''
+
+
+@dataclass
+class DispatchResult:
+    """Outcome of a dispatched Notion request."""
+    key: str
+    label: str
+    ok: bool
+    status_code: int | None = None
+    attempts: int = 0
+    elapsed: float = 0.0
+    error: str | None = None
+    data: dict = field(default_factory=dict)
+
+
+def run_job(job: Job, client: NotionClient) -> DispatchResult:
+    """Send a job and convert its outcome into a `DispatchResult`."""
+    start = time.perf_counter()
+    try:
+        response, attempts = client.send(job.method, job.path, job.payload)
+    except requests.RequestException as exc:
+        return DispatchResult(key=job.key, label=job.label, ok=False,
+                              elapsed=time.perf_counter() - start,
+                              error=str(exc))
+    result = DispatchResult(
+        key=job.key,
+        label=job.label,
+        ok=response.ok,
+        status_code=response.status_code,
+        attempts=attempts,
+        elapsed=time.perf_counter() - start,
+    )
+    try:
+        result.data = response.json()
+    except ValueError:
+        result.data = {}
+    if not response.ok:
+        result.error = result.data.get('message', response.reason)
+    return result
+
+
+@timed('dispatch')
+def dispatch(
+        jobs: Iterable[Job],
+        client: NotionClient,
+        max_concurrency: int = NOTION_MAX_CONCURRENCY,
+        on_result: Callable[[DispatchResult], None] | None = None
+) -> list[DispatchResult]:
+    """Send Notion write requests concurrently under the client's rate limit.
+
+    Jobs are consumed lazily, so `jobs` may be a generator that is still
+    producing work while earlier requests are in flight. If it raises, the
+    requests in flight are completed and reported before the error is
+    raised again.
+
+    Parameters
+    ----------
+    jobs : iterable of Job
+        The requests to send.
+    client : NotionClient
+        The client whose pooled session and rate limiter are used.
+    max_concurrency : int
+        Maximum number of requests in flight at the same time.
+    on_result : callable or None
+        Called with each `DispatchResult` as soon as it is available.
+
+    Returns
+    -------
+    list of DispatchResult
+        One result per job, in completion order.
+    """
+    results = []
+    pending = set()
+
+    def collect(done):
+        for future in done:
+            result = future.result()
+            count('dispatch_results', ok=result.ok)
+            results.append(result)
+            if on_result:
+                on_result(result)
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        try:
+            for job in jobs:
+                if len(pending) >= max_concurrency:
+                    done, pending = wait(pending,
+                                         return_when=FIRST_COMPLETED)
+                    collect(done)
+                pending.add(executor.submit(run_job, job, client))
+        finally:
+            # Also when `jobs` raises: the requests already sent are
+            # reported, so that e.g. their letters are recorded.
+            done, _ = wait(pending)
+            collect(done)
+
+    return results
+
+
+def summarize(results: list[DispatchResult]) -> str:
+    """Return a one-line summary of a list of dispatch results."""
+    succeeded = sum(result.ok for result in results)
+    retried = sum(result.attempts > 1 for result in results)
+    return (f'{succeeded}/{len(results)} requests succeeded, '
+            f'{retried} needed retries.')
@@ -0,0 +1,475 @@
+"""An in-process stand-in for the Notion API, to run and measure the
+package offline.
+
+`FakeNotion` serves synthetic databases through a requests transport
+adapter mounted on a `NotionClient`, with cursor pagination, server-side
+filters, sorts and property projections, optional latency and 429
+throttling, injected error responses, and a record of every write.
+
+    fake = FakeNotion(latency=0.05, rate=3)
+    fake.add_database('db', n_rows=10_000)
+    client = fake.client()
+    pages = fetch_database_jsons(client, 'db')
+"""
+import json
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlsplit, parse_qs
+
+from requests.adapters import BaseAdapter
+from requests.models import PreparedRequest, Response
+
+from jobapplier.client import NotionClient, TokenBucket
+from jobapplier.constants import (NOTION_API_URL, NOTION_MAX_TEXT_LENGTH,
+                                  NOTION_MAX_BLOCKS_PER_REQUEST,
+                                  NOTION_MAX_PAYLOAD_BYTES)
+from jobapplier.data_preprocessing import PROPERTY_SCHEMA
+
+COMPANIES = ['Acme', 'Société Générale', "L'Oréal", 'Globex', 'Initech',
+             'Umbrella', 'Hooli', 'Stark Industries', 'Wayne Enterprises',
+             'Dunder Mifflin', 'Aperture Science', 'Cyberdyne Systems']
+JOB_TITLES = ['Data Scientist', 'Machine Learning Engineer', 'Data Analyst',
+              'Ingénieur Data', 'Data Engineer (H/F)', 'MLOps Engineer',
+              'Research Scientist – NLP', 'Analytics Engineer']
+STAGES = ['Applied', 'Interview', 'Rejected', 'Offer']
+ORIGINS = ['LinkedIn', 'Welcome to the Jungle', 'Indeed', 'Referral']
+LANGUAGES = ['EN', 'FR']
+
+EPOCH = datetime(2023, 1, 1, tzinfo=timezone.utc)
+
+
+def notion_time(moment: datetime) -> str:
+    """Format a datetime like Notion timestamps, e.g.
+    '2023-01-01T00:00:00.000Z'."""
+    return moment.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+
+def rich_text(text: str | None) -> list[dict]:
+    """Return a Notion rich text array as returned by the API."""
+    if not text:
+        return []
+    return [{"type": "text", "text": {"content": text, "link": None},
+             "plain_text": text, "href": None}]
+
+
+def property_id(name: str) -> str:
+    """Return the ID of a fake database property; titles are always
+    'title', as in Notion."""
+    for prop_name, prop_type, _ in PROPERTY_SCHEMA.values():
+        if prop_name == name and prop_type == 'title':
+            return 'title'
+    return f'{zlib.crc32(name.encode()) % 10_000:04d}'
+
+
+def property_value(prop_type: str, value) -> dict:
+    """Return a Notion property value object of a given type."""
+    if prop_type in ('title', 'rich_text'):
+        content = rich_text(value)
+    elif prop_type == 'select':
+        content = {"name": value, "color": "default"} if value else None
+    elif prop_type == 'date':
+        content = {"start": value, "end": None} if value else None
+    else:
+        content = value
+    return {"type": prop_type, prop_type: content}
+
+
+def synthetic_page(database_id: str, idx: int, rng: random.Random,
+                   schema: dict = PROPERTY_SCHEMA) -> dict:
+    """Return a realistic job tracker entry; entries with a higher `idx`
+    are created later."""
+    created = EPOCH + timedelta(minutes=idx)
+    stage = rng.choice(STAGES) if rng.random() > 0.3 else None
+    values = {
+        'job_title': rng.choice(JOB_TITLES),
+        'company': f'{rng.choice(COMPANIES)} {idx % 997}',
+        'language': rng.choice(LANGUAGES),
+        'date_applied': created.date().isoformat() if stage else None,
+        'origin': rng.choice(ORIGINS),
+        'stage': stage,
+        'job_description': ' '.join(rng.choices(JOB_TITLES, k=20)),
+        'cover_letter': None,
+        'referral': None,
+        'position': idx + 1,
+    }
+    properties = {}
+    for column, (prop_name, prop_type, _) in schema.items():
+        properties[prop_name] = {"id": property_id(prop_name),
+                                 **property_value(prop_type, values[column])}
+    return {
+        "object": "page",
+        "id": f'{database_id}-{idx:08d}',
+        "created_time": notion_time(created),
+        "last_edited_time": notion_time(created),
+        "archived": False,
+        "in_trash": False,
+        "parent": {"type": "database_id", "database_id": database_id},
+        "properties": properties,
+    }
+
+
+def plain_value(prop: dict | None):
+    """Return the comparable value of a property: its text, select name,
+    start date or number, or None if empty."""
+    if not prop:
+        return None
+    value = prop[prop['type']]
+    if prop['type'] in ('title', 'rich_text'):
+        return ''.join(item['plain_text'] for item in value) or None
+    if prop['type'] == 'select':
+        return value and value['name']
+    if prop['type'] == 'date':
+        return value and value['start']
+    return value
+
+
+def property_filter_matches(condition: dict, prop: dict | None) -> bool:
+    """Evaluate a single property filter condition on a property value."""
+    value = plain_value(prop)
+    for operator, operand in condition.items():
+        if operator == 'is_empty':
+            return (value is None) == operand
+        if operator == 'is_not_empty':
+            return (value is not None) == operand
+        if operator == 'equals':
+            return value == operand
+        if operator == 'does_not_equal':
+            return value != operand
+        if operator == 'contains':
+            return value is not None and operand in value
+        if value is None:
+            return False
+        if operator in ('after', 'greater_than'):
+            return value > operand
+        if operator in ('on_or_after', 'greater_than_or_equal_to'):
+            return value >= operand
+        if operator in ('before', 'less_than'):
+            return value < operand
+        if operator in ('on_or_before', 'less_than_or_equal_to'):
+            return value <= operand
+    raise ValueError(f'Unsupported filter condition: {condition}')
+
+
+def filter_matches(query_filter: dict | None, page: dict) -> bool:
+    """Evaluate a Notion database query filter on a page."""
+    if not query_filter:
+        return True
+    if 'and' in query_filter:
+        return all(filter_matches(sub, page) for sub in query_filter['and'])
+    if 'or' in query_filter:
+        return any(filter_matches(sub, page) for sub in query_filter['or'])
+    if 'timestamp' in query_filter:
+        timestamp = query_filter['timestamp']
+        prop = {"type": "date", "date": {"start": page[timestamp]}}
+        return property_filter_matches(query_filter[timestamp], prop)
+    prop = page['properties'].get(query_filter['property'])
+    condition = next(value for key, value in query_filter.items()
+                     if key != 'property')
+    return property_filter_matches(condition, prop)
+
+
+def sort_key(sort: dict):
+    """Return a key function for one entry of a Notion sorts payload."""
+    if 'timestamp' in sort:
+        return lambda page: page[sort['timestamp']]
+
+    def key(page):
+        value = plain_value(page['properties'].get(sort['property']))
+        # Empty values sort last in both directions, as in Notion.
+        return (value is None) != (sort.get('direction') == 'descending'), \
+            value if value is not None else 0
+    return key
+
+
+class FakeNotion:
+    """In-memory Notion workspace serving synthetic databases.
+
+    Parameters
+    ----------
+    latency : float
+        Seconds added to every request, to mimic network round trips.
+    rate : float or None
+        Average number of requests per second allowed before answering
+        429 with a Retry-After header, like Notion does. No throttling if
+        None.
+    burst : int
+        Number of requests allowed at once before throttling starts.
+    """
+
+    def __init__(self, latency: float = 0.0, rate: float | None = None,
+                 burst: int = 3):
+        self.latency = latency
+        self.rate = rate
+        self.burst = burst
+        self.allowance = float(burst)
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+        self.databases: dict[str, dict[str, dict]] = {}
+        self.schemas: dict[str, dict] = {}
+        self.children: dict[str, list[dict]] = {}
+        self.clock = EPOCH
+        self.block_count = 0
+        self.requests: list[tuple[str, str]] = []
+        self.writes: list[tuple[str, str, dict]] = []
+        self.throttled = 0
+        # (status, headers) of the responses to answer the next requests
+        # with, see `inject_errors`.
+        self.errors: list[tuple[int, dict]] = []
+        # Matching pages of each (database, filter, sorts), cleared on any
+        # write, so that paginating a large query stays linear.
+        self.query_cache: dict[tuple, list[dict]] = {}
+
+    def add_database(self, database_id: str, n_rows: int, seed: int = 0,
+                     schema: dict = PROPERTY_SCHEMA) -> list[dict]:
+        """Create a database of `n_rows` synthetic entries, whose properties
+        are named after `schema`."""
+        rng = random.Random(seed)
+        pages = [synthetic_page(database_id, idx, rng, schema)
+                 for idx in range(n_rows)]
+        self.databases[database_id] = {page['id']: page for page in pages}
+        self.schemas[database_id] = schema
+        self.query_cache.clear()
+        self.clock = max(self.clock, EPOCH + timedelta(minutes=n_rows))
+        return pages
+
+    def inject_errors(self, status: int, times: int = 1,
+                      retry_after: float | None = None) -> None:
+        """Answer the next `times` requests with an error `status`, e.g.
+        429 with a `Retry-After` header or a 502, before serving again."""
+        headers = {'Retry-After': str(retry_after)} \
+            if retry_after is not None else {}
+        with self.lock:
+            self.errors.extend([(status, headers)] * times)
+
+    def client(self, rate: float | None = None, **kwargs) -> NotionClient:
+        """Return a `NotionClient` whose requests are served by this fake.
+
+        The client's own rate limiter is set to `rate` requests per second,
+        or effectively disabled if None.
+        """
+        limiter = TokenBucket(rate=rate or 1e9,
+                              capacity=self.burst if rate else 10 ** 9)
+        client = NotionClient(headers={}, limiter=limiter, **kwargs)
+        client.session.mount(NOTION_API_URL, FakeNotionAdapter(self))
+        return client
+
+    def tick(self) -> str:
+        """Advance the fake clock and return the new Notion timestamp."""
+        self.clock += timedelta(seconds=1)
+        return notion_time(self.clock)
+
+    def is_throttled(self) -> bool:
+        """Consume a request token, returning True if none is available."""
+        if self.rate is None:
+            return False
+        now = time.monotonic()
+        self.allowance = min(self.burst, self.allowance
+                             + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+        if self.allowance < 1:
+            self.throttled += 1
+            return True
+        self.allowance -= 1
+        return False
+
+    def handle(self, method: str, path: str, params: dict,
+               body: dict | None, size: int) -> tuple[int, dict, dict]:
+        """Serve one API call.
+
+        Returns
+        -------
+        tuple of (int, dict, dict)
+            The status code, JSON body and extra headers of the response.
+        """
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            self.requests.append((method, path))
+            if self.errors:
+                status, headers = self.errors.pop(0)
+                code = 'rate_limited' if status == 429 else 'internal_error'
+                return status, error_body(code, 'Injected error.'), headers
+            if self.is_throttled():
+                retry_after = str(max(1, round(1 / self.rate)))
+                return 429, error_body('rate_limited', 'Rate limited.'), \
+                    {'Retry-After': retry_after}
+            parts = path.strip('/').split('/')
+            route = (method, parts[0], parts[-1] if len(parts) > 2 else None)
+            if route == ('GET', 'databases', None):
+                return self.retrieve_database(parts[1])
+            if route == ('POST', 'databases', 'query'):
+                return self.query_database(parts[1], params, body or {})
+            if route == ('GET', 'blocks', 'children'):
+                return self.list_children(parts[1], params)
+            if method == 'PATCH':
+                self.query_cache.clear()
+            if route == ('PATCH', 'blocks', 'children'):
+                self.writes.append((method, path, body))
+                return self.append_children(parts[1], body or {}, size)
+            if route == ('PATCH', 'pages', None):
+                self.writes.append((method, path, body))
+                return self.update_page(parts[1], body or {})
+            return 400, error_body('invalid_request_url',
+                                   'Invalid request URL.'), {}
+
+    def find_page(self, page_id: str) -> dict | None:
+        for pages in self.databases.values():
+            if page_id in pages:
+                return pages[page_id]
+        return None
+
+    def retrieve_database(self, database_id):
+        if database_id not in self.databases:
+            return not_found(database_id)
+        properties = {
+            prop_name: {"id": property_id(prop_name), "name": prop_name,
+                        "type": prop_type, prop_type: {}}
+            for prop_name, prop_type, _ in self.schemas[database_id].values()
+        }
+        return 200, {"object": "database", "id": database_id,
+                     "properties": properties}, {}
+
+    def query_database(self, database_id, params, body):
+        if database_id not in self.databases:
+            return not_found(database_id)
+        sorts = body.get('sorts') or [
+            {"timestamp": "created_time", "direction": "descending"}
+        ]
+        key = (database_id, json.dumps(body.get('filter'), sort_keys=True),
+               json.dumps(sorts, sort_keys=True))
+        if key not in self.query_cache:
+            pages = [page for page in self.databases[database_id].values()
+                     if filter_matches(body.get('filter'), page)]
+            for sort in reversed(sorts):
+                pages.sort(key=sort_key(sort),
+                           reverse=sort.get('direction') == 'descending')
+            self.query_cache[key] = pages
+        pages = self.query_cache[key]
+        results, has_more, cursor = paginate(pages, body)
+        projection = params.get('filter_properties')
+        if projection:
+            results = [
+                {**page, "properties": {
+                    name: prop for name, prop in page['properties'].items()
+                    if prop['id'] in projection
+                }}
+                for page in results
+            ]
+        return 200, {"object": "list", "results": results,
+                     "has_more": has_more, "next_cursor": cursor}, {}
+
+    def list_children(self, block_id, params):
+        body = {key: values[0] for key, values in params.items()}
+        results, has_more, cursor = paginate(
+            self.children.get(block_id, []), body
+        )
+        return 200, {"object": "list", "results": results,
+                     "has_more": has_more, "next_cursor": cursor}, {}
+
+    def append_children(self, block_id, body, size):
+        children = body.get('children', [])
+        if size > NOTION_MAX_PAYLOAD_BYTES:
+            return 413, error_body('payload_too_large',
+                                   'Request payload too large.'), {}
+        if len(children) > NOTION_MAX_BLOCKS_PER_REQUEST:
+            return 400, error_body(
+                'validation_error',
+                f'body.children.length should be ≤ '
+                f'{NOTION_MAX_BLOCKS_PER_REQUEST}.'
+            ), {}
+        appended = []
+        for child in children:
+            content = child[child['type']]
+            items = content.get('rich_text', [])
+            if any(len(item['text']['content']) > NOTION_MAX_TEXT_LENGTH
+                   for item in items):
+                return 400, error_body(
+                    'validation_error',
+                    f'text.content.length should be ≤ '
+                    f'{NOTION_MAX_TEXT_LENGTH}.'
+                ), {}
+            self.block_count += 1
+            appended.append({
+                "object": "block",
+                "id": f'block-{self.block_count:08d}',
+                "type": child['type'],
+                child['type']: {
+                    **content,
+                    "rich_text": [
+                        {**item, "plain_text": item['text']['content']}
+                        for item in items
+                    ],
+                },
+            })
+        self.children.setdefault(block_id, []).extend(appended)
+        page = self.find_page(block_id)
+        if page:
+            page['last_edited_time'] = self.tick()
+        return 200, {"object": "list", "results": appended}, {}
+
+    def update_page(self, page_id, body):
+        page = self.find_page(page_id)
+        if page is None:
+            return not_found(page_id)
+        for name, value in body.get('properties', {}).items():
+            prop = page['properties'].setdefault(
+                name, {"id": property_id(name), "type": next(iter(value))}
+            )
+            prop[prop['type']] = value[prop['type']]
+        page['last_edited_time'] = self.tick()
+        return 200, page, {}
+
+
+def paginate(items: list, body: dict) -> tuple[list, bool, str | None]:
+    """Return one page of `items` given the 'start_cursor' and 'page_size'
+    of a request."""
+    start = int(body.get('start_cursor') or 0)
+    page_size = min(int(body.get('page_size', 100)), 100)
+    end = start + page_size
+    has_more = end < len(items)
+    return items[start:end], has_more, str(end) if has_more else None
+
+
+def error_body(code: str, message: str) -> dict:
+    return {"object": "error", "code": code, "message": message}
+
+
+def not_found(object_id: str) -> tuple[int, dict, dict]:
+    return 404, error_body('object_not_found',
+                           f'Could not find object with ID: {object_id}.'), {}
+
+
+class FakeNotionAdapter(BaseAdapter):
+    """Requests transport adapter answering Notion API calls from a
+    `FakeNotion` instead of the network."""
+
+    def __init__(self, fake: FakeNotion):
+        super().__init__()
+        self.fake = fake
+
+    def send(self, request: PreparedRequest, **kwargs) -> Response:
+        url = urlsplit(request.url)
+        path = url.path[len(urlsplit(NOTION_API_URL).path):]
+        params = parse_qs(url.query)
+        raw = request.body or b''
+        if isinstance(raw, str):
+            raw = raw.encode('utf-8')
+        body = json.loads(raw) if raw else None
+        status, data, headers = self.fake.handle(request.method, path, params,
+                                                 body, len(raw))
+        response = Response()
+        response.status_code = status
+        response.reason = 'OK' if status < 400 else 'Error'
+        response.headers.update({'Content-Type': 'application/json',
+                                 **headers})
+        response._content = json.dumps(data).encode('utf-8')
+        response.url = request.url
+        response.request = request
+        response.encoding = 'utf-8'
+        return response
+
+    def close(self) -> None:
+        pass
@@ -0,0 +1,190 @@
+"""Lightweight timing and request instrumentation.
+
+Spans time a block of code, counters count events and histograms record
+distributions such as request latencies. Recording is off by default and
+costs a single flag check per call until `enable` is called, e.g. by the
+`--profile` flag of the CLI.
+
+    with span('fetch_database_jsons'):
+        ...
+    count('notion_requests', method='GET', status=200)
+    observe('notion_request_seconds', 0.21, method='GET')
+
+At the end of a run, `write_report` dumps everything to a JSON file and
+`write_prometheus` to a Prometheus textfile collector file.
+"""
+import json
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+
+# Upper bounds of the histogram buckets, in seconds for durations.
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+           10.0, 30.0, float('inf'))
+METRIC_PREFIX = 'jobapplier_'
+
+_enabled = False
+_lock = threading.Lock()
+_started = time.time()
+_counters: dict[tuple, float] = {}
+_histograms: dict[tuple, list] = {}
+
+
+def enable() -> None:
+    """Start recording, discarding whatever was recorded before."""
+    global _enabled, _started
+    reset()
+    _started = time.time()
+    _enabled = True
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset() -> None:
+    """Discard all recorded counters and histograms."""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def metric_key(name: str, labels: dict) -> tuple:
+    return (name, *sorted((key, str(value)) for key, value in labels.items()))
+
+
+def count(name: str, value: float = 1, **labels) -> None:
+    """Add `value` to a counter."""
+    if not _enabled:
+        return
+    key = metric_key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name: str, value: float, **labels) -> None:
+    """Record a value, e.g. a duration in seconds, in a histogram."""
+    if not _enabled:
+        return
+    key = metric_key(name, labels)
+    with _lock:
+        # Bucket counts, then sum, count and max of the observed values.
+        histogram = _histograms.setdefault(key,
+                                           [0] * len(BUCKETS) + [0, 0, 0])
+        histogram[bisect_left(BUCKETS, value)] += 1
+        histogram[-3] += value
+        histogram[-2] += 1
+        histogram[-1] = max(histogram[-1], value)
+
+
+@contextmanager
+def span(name: str, **labels):
+    """Time a block of code into the 'span_seconds' histogram."""
+    if not _enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe('span_seconds', time.perf_counter() - start, span=name,
+                **labels)
+
+
+def timed(name: str):
+    """Decorator timing every call of a function as a span."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def report() -> dict:
+    """Return everything recorded so far as a JSON-serializable dict."""
+    with _lock:
+        counters = [
+            {'name': key[0], 'labels': dict(key[1:]), 'value': value}
+            for key, value in sorted(_counters.items())
+        ]
+        histograms = [
+            {
+                'name': key[0],
+                'labels': dict(key[1:]),
+                'count': histogram[-2],
+                'sum': histogram[-3],
+                'mean': histogram[-3] / histogram[-2],
+                'max': histogram[-1],
+                'buckets': {str(bound): bucket for bound, bucket
+                            in zip(BUCKETS, histogram) if bucket},
+            }
+            for key, histogram in sorted(_histograms.items())
+        ]
+    return {
+        'started': _started,
+        'elapsed': time.time() - _started,
+        'counters': counters,
+        'histograms': histograms,
+    }
+
+
+def write_report(path: Path) -> None:
+    """Write the JSON run report."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report(), indent=2))
+
+
+def escape_label(value) -> str:
+    return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def prometheus_labels(labels: dict) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{escape_label(value)}"'
+                          for key, value in labels.items()) + '}'
+
+
+def write_prometheus(path: Path) -> None:
+    """Write the recorded metrics in the Prometheus text format.
+
+    The file is written next to its target and moved in place, as expected
+    by the node exporter's textfile collector.
+    """
+    data = report()
+    lines = []
+    typed = set()
+    for counter in data['counters']:
+        name = f"{METRIC_PREFIX}{counter['name']}_total"
+        if name not in typed:
+            lines.append(f'# TYPE {name} counter')
+            typed.add(name)
+        lines.append(f"{name}{prometheus_labels(counter['labels'])} "
+                     f"{counter['value']}")
+    for histogram in data['histograms']:
+        name = f"{METRIC_PREFIX}{histogram['name']}"
+        if name not in typed:
+            lines.append(f'# TYPE {name} histogram')
+            typed.add(name)
+        cumulative = 0
+        for bound in BUCKETS:
+            cumulative += histogram['buckets'].get(str(bound), 0)
+            le = '+Inf' if bound == float('inf') else str(bound)
+            labels = prometheus_labels({**histogram['labels'], 'le': le})
+            lines.append(f'{name}_bucket{labels} {cumulative}')
+        labels = prometheus_labels(histogram['labels'])
+        lines.append(f"{name}_sum{labels} {histogram['sum']}")
+        lines.append(f"{name}_count{labels} {histogram['count']}")
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f'.{path.name}.tmp')
+    tmp.write_text('\n'.join(lines) + '\n')
+    tmp.replace(path)
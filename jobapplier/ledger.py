@@ -0,0 +1,104 @@
+import hashlib
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS appended_letters (
+    page_id TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    block_id TEXT,
+    appended_at TEXT NOT NULL,
+    PRIMARY KEY (page_id, content_hash)
+);
+CREATE TABLE IF NOT EXISTS partial_letters (
+    page_id TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    batches INTEGER NOT NULL,
+    block_id TEXT,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (page_id, content_hash)
+);
+"""
+
+
+def open_ledger(path: Path) -> sqlite3.Connection:
+    """Open (and create if needed) the ledger of appended cover letters."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def content_hash(text: str) -> str:
+    """Return the SHA-256 hex digest of a letter text."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def is_recorded(conn: sqlite3.Connection, page_id: str,
+                text_hash: str) -> bool:
+    """Return True if this letter was already appended to the page."""
+    row = conn.execute(
+        "SELECT 1 FROM appended_letters "
+        "WHERE page_id = ? AND content_hash = ?",
+        (page_id, text_hash)
+    ).fetchone()
+    return row is not None
+
+
+def has_letter(conn: sqlite3.Connection, page_id: str) -> bool:
+    """Return True if any letter was already appended to the page."""
+    row = conn.execute(
+        "SELECT 1 FROM appended_letters WHERE page_id = ?", (page_id,)
+    ).fetchone()
+    return row is not None
+
+
+def record_letter(conn: sqlite3.Connection, page_id: str, text_hash: str,
+                  block_id: str | None) -> None:
+    """Durably record a letter appended to a page.
+
+    Each record is committed on its own, so a crash in the middle of a run
+    keeps every append that already succeeded.
+    """
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO appended_letters "
+            "(page_id, content_hash, block_id, appended_at) "
+            "VALUES (?, ?, ?, ?)",
+            (page_id, text_hash, block_id,
+             datetime.now(timezone.utc).isoformat())
+        )
+        conn.execute(
+            "DELETE FROM partial_letters "
+            "WHERE page_id = ? AND content_hash = ?",
+            (page_id, text_hash)
+        )
+
+
+def appended_batches(conn: sqlite3.Connection, page_id: str,
+                     text_hash: str) -> tuple[int, str | None]:
+    """Return how many batches of a letter sent in several requests were
+    already appended, and the ID of its first block."""
+    row = conn.execute(
+        "SELECT batches, block_id FROM partial_letters "
+        "WHERE page_id = ? AND content_hash = ?",
+        (page_id, text_hash)
+    ).fetchone()
+    return (row[0], row[1]) if row else (0, None)
+
+
+def record_batches(conn: sqlite3.Connection, page_id: str, text_hash: str,
+                   batches: int, block_id: str | None) -> None:
+    """Durably record that the first `batches` batches of a letter were
+    appended, so that an interrupted letter is resumed instead of being
+    appended again from its start. `record_letter` clears the record."""
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO partial_letters "
+            "(page_id, content_hash, batches, block_id, updated_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (page_id, text_hash, batches, block_id,
+             datetime.now(timezone.utc).isoformat())
+        )
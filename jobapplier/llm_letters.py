@@ -0,0 +1,234 @@
+"""Cover letters tailored to each job description by an LLM.
+
+Prompts are built with `build_cover_letter_prompt` from the letter template
+of the entry's language and its job description, and sent concurrently to
+an OpenAI-compatible chat completions endpoint. Completions are cached on
+disk by hash of (prompt, model), so a rerun never pays twice for the same
+letter. When a completion fails, the letter falls back to the plain
+template rendered by `build_letter`.
+
+Point `base_url` (or `base_url` in the [openai] section of config.ini) to a
+local server to run against a stub instead of the OpenAI API.
+"""
+import asyncio
+import hashlib
+import sqlite3
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+
+from jobapplier import constants
+from jobapplier.constants import (LLM_CACHE_PATH, LLM_MAX_CONCURRENCY,
+                                  LLM_PROMPT_PATH)
+from jobapplier.cover_letter import build_letter, build_cover_letter_prompt
+from jobapplier.instrumentation import count, span
+
+DEFAULT_PROMPT = (
+    "You write cover letters. Adapt the letter below to the job description "
+    "and the company, keeping its language, tone, length and structure. "
+    "Answer with the letter text only."
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS completions (
+    prompt_hash TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    completion TEXT NOT NULL,
+    prompt_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL,
+    created_at TEXT NOT NULL
+);
+"""
+
+
+@dataclass
+class TokenUsage:
+    """Tokens spent on completions, and how many letters came from where."""
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached: int = 0
+    generated: int = 0
+    fallbacks: int = 0
+    errors: list[str] = field(default_factory=list)
+
+    def __str__(self):
+        return (f'{self.generated} letters generated, {self.cached} from '
+                f'cache, {self.fallbacks} template fallbacks; '
+                f'{self.prompt_tokens} prompt and {self.completion_tokens} '
+                f'completion tokens.')
+
+
+def open_cache(path: Path) -> sqlite3.Connection:
+    """Open (and create if needed) the cache of LLM completions."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def prompt_hash(prompt: str, model: str) -> str:
+    """Return the cache key of a prompt sent to a model."""
+    return hashlib.sha256(f'{model}\0{prompt}'.encode('utf-8')).hexdigest()
+
+
+def load_base_prompt(path: Path = LLM_PROMPT_PATH) -> str:
+    """Return the instructions of the prompt, from `path` if it exists."""
+    path = Path(path)
+    if path.exists():
+        return path.read_text(encoding='utf-8')
+    return DEFAULT_PROMPT
+
+
+def build_prompt(base_prompt: str, lang: str, company: str, title: str,
+                 job_description: str | None) -> str:
+    """Build the prompt of one letter, starting from its template letter."""
+    return build_cover_letter_prompt(
+        base_prompt=base_prompt,
+        company_website='',
+        job_title=title or '',
+        job_description=job_description or '',
+        letter_template=build_letter(lang, company, title),
+    )
+
+
+def openai_client(api_key: str | None = None, base_url: str | None = None):
+    """Return an `openai.AsyncOpenAI` client.
+
+    The key and endpoint default to the [secrets] openai_key and [openai]
+    base_url entries of config.ini.
+    """
+    from openai import AsyncOpenAI
+
+    return AsyncOpenAI(
+        api_key=api_key or constants.OPENAI_KEY,
+        base_url=base_url or constants.OPENAI_BASE_URL,
+    )
+
+
+async def generate_letters(
+        rows: list[tuple[str, str, str, str | None]],
+        model: str | None = None,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        cache_path: Path = LLM_CACHE_PATH,
+        client=None,
+        usage: TokenUsage | None = None
+) -> list[str]:
+    """Generate tailored cover letters concurrently.
+
+    Parameters
+    ----------
+    rows : list of tuple
+        (lang, company, title, job_description) per letter.
+    model : str or None
+        The chat model, [openai] model in config.ini by default.
+    max_concurrency : int
+        Maximum number of completions requested at the same time.
+    cache_path : Path
+        Location of the SQLite cache of completions.
+    client : openai.AsyncOpenAI or None
+        The client to use, `openai_client()` by default. If that one cannot
+        be created, the letters not cached fall back to their template.
+    usage : TokenUsage or None
+        Updated with the tokens spent and where each letter came from.
+
+    Returns
+    -------
+    list of str
+        One letter per row, in order.
+    """
+    model = model or constants.OPENAI_MODEL
+    usage = usage if usage is not None else TokenUsage()
+    base_prompt = load_base_prompt()
+    semaphore = asyncio.Semaphore(max_concurrency)
+    cache = open_cache(cache_path)
+
+    def fallback(lang, company, title, exc):
+        usage.fallbacks += 1
+        usage.errors.append(f'{title} at {company}: {exc}')
+        count('llm_letters', source='template')
+        return build_letter(lang, company, title)
+
+    async def generate(lang, company, title, prompt, key):
+        try:
+            async with semaphore:
+                response = await client.chat.completions.create(
+                    model=model,
+                    messages=[{"role": "user", "content": prompt}],
+                )
+            letter = response.choices[0].message.content.strip()
+            if not letter:
+                raise ValueError('empty completion')
+        except Exception as exc:
+            # Any failure (network, quota, malformed answer) must not cost
+            # the letter: the plain template is used instead.
+            return fallback(lang, company, title, exc)
+
+        prompt_tokens = response.usage.prompt_tokens if response.usage else 0
+        completion_tokens = response.usage.completion_tokens \
+            if response.usage else 0
+        usage.prompt_tokens += prompt_tokens
+        usage.completion_tokens += completion_tokens
+        usage.generated += 1
+        count('llm_letters', source='model')
+        count('llm_tokens', prompt_tokens, kind='prompt')
+        count('llm_tokens', completion_tokens, kind='completion')
+        with cache:
+            cache.execute(
+                "INSERT OR REPLACE INTO completions (prompt_hash, model, "
+                "completion, prompt_tokens, completion_tokens, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, letter, prompt_tokens, completion_tokens,
+                 datetime.now(timezone.utc).isoformat())
+            )
+        return letter
+
+    letters = [None] * len(rows)
+    misses = []
+    owns_client = False
+    try:
+        for idx, (lang, company, title, job_description) in enumerate(rows):
+            prompt = build_prompt(base_prompt, lang, company, title,
+                                  job_description)
+            key = prompt_hash(prompt, model)
+            row = cache.execute(
+                "SELECT completion FROM completions WHERE prompt_hash = ?",
+                (key,)
+            ).fetchone()
+            if row:
+                usage.cached += 1
+                count('llm_letters', source='cache')
+                letters[idx] = row[0]
+            else:
+                misses.append((idx, (lang, company, title, prompt, key)))
+
+        # The client is only needed, and the API key only read, on cache
+        # misses. Without one (openai not installed, no API key), the
+        # letters not cached fall back to their template.
+        if client is None and misses:
+            try:
+                client = openai_client()
+                owns_client = True
+            except Exception as exc:
+                for idx, (lang, company, title, _, _) in misses:
+                    letters[idx] = fallback(lang, company, title, exc)
+                return letters
+
+        with span('generate_letters'):
+            generated = await asyncio.gather(
+                *(generate(*args) for _, args in misses)
+            )
+    finally:
+        cache.close()
+        if owns_client:
+            await client.close()
+    for (idx, _), letter in zip(misses, generated):
+        letters[idx] = letter
+    return letters
+
+
+def render_llm_letters(rows: list[tuple[str, str, str, str | None]],
+                       usage: TokenUsage | None = None, **kwargs) -> list[str]:
+    """Blocking version of `generate_letters`, for the synchronous
+    pipeline."""
+    return asyncio.run(generate_letters(rows, usage=usage, **kwargs))
@@ -1,30 +1,284 @@
 import argparse
-from cv import copy_and_rename_cvs
-from api_requests import add_cover_letters, company_substring_entries
-from constants import (LISTINGS_INIT_FILE, URL_TEST_DATABASE,
-                       API_HEADERS, URL_JOB_TRACKER_2_DATABASE)
-from tabulate import tabulate
+import sys
 
-if __name__ == '__main__':
-    parser = argparse.ArgumentParser()
-    choices = ['rename_cvs', 'fill_cover_letters', 'if_applied']
+from jobapplier.constants import (DATA_PATH, LISTINGS_INIT_FILE,
+                                  LISTINGS_SCREENED_FILE, RUN_REPORT_FILE,
+                                  DEDUP_THRESHOLD)
+
+# Heavy modules (pandas, requests, tabulate, ...) are imported inside each
+# action, so that an action only pays for what it uses. `make check_startup`
+# guards against regressions.
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='jobapplier')
+    choices = ['rename_cvs', 'fill_cover_letters', 'if_applied',
+               'export_snapshot', 'watch', 'apply_plan', 'find_duplicates']
     parser.add_argument('-a', '--action', choices=choices)
     parser.add_argument('-c', '--company')
-    args = parser.parse_args()
-
-    if vars(args)['action'] == 'rename_cvs':
-        copy_and_rename_cvs(url=URL_JOB_TRACKER_2_DATABASE, headers=API_HEADERS)
-
-    if vars(args)['action'] == 'fill_cover_letters':
-        responses = add_cover_letters(database_url=URL_JOB_TRACKER_2_DATABASE,
-                                      headers=API_HEADERS,
-                                      block_type='paragraph')
-
-    if vars(args)['action'] == 'if_applied':
-        company = vars(args)['company']
-        df_applied = company_substring_entries(
-            substring=company,
-            url=URL_JOB_TRACKER_2_DATABASE,
-            headers=API_HEADERS
-        )
-        print(tabulate(df_applied, headers='keys', tablefmt='psql'))
+    parser.add_argument('-t', '--trackers', nargs='+',
+                        help='names of the [tracker:<name>] sections of '
+                             'config.ini to run on, all of them by default')
+    parser.add_argument('--fuzzy', action='store_true',
+                        help='also match near-duplicate company names')
+    parser.add_argument('-l', '--listings', nargs='?',
+                        const=DATA_PATH.joinpath(LISTINGS_INIT_FILE),
+                        help='screen a CSV or JSONL file of listings instead '
+                             'of a single company')
+    parser.add_argument('-o', '--output',
+                        default=DATA_PATH.joinpath(LISTINGS_SCREENED_FILE),
+                        help='where to write the screened listings')
+    parser.add_argument('--check-existing', action='store_true',
+                        help='read page contents to skip letters appended '
+                             'outside of the ledger')
+    parser.add_argument('--hardlink', action='store_true',
+                        help='hard link renamed CVs instead of copying them')
+    parser.add_argument('--llm', action='store_true',
+                        help='tailor cover letters to the job descriptions '
+                             'with an LLM')
+    parser.add_argument('--stages', nargs='+', choices=['letters', 'cvs'],
+                        default=['letters', 'cvs'],
+                        help='for watch, the stages run on new entries')
+    parser.add_argument('--webhook-port', type=int,
+                        help='for watch, also poll on POSTs to this local '
+                             'port')
+    parser.add_argument('--threshold', type=float, default=DEDUP_THRESHOLD,
+                        help='for find_duplicates, the minimum similarity '
+                             'of two entries, between 0 and 1')
+    parser.add_argument('--tag', action='store_true',
+                        help='for find_duplicates, write the tag of its '
+                             'cluster to the Duplicate property of each '
+                             'duplicate')
+    parser.add_argument('--plan',
+                        help='for rename_cvs, fill_cover_letters and '
+                             'find_duplicates --tag, write the planned '
+                             'changes to this JSON file instead of applying '
+                             'them; for apply_plan, the plan to apply')
+    parser.add_argument('--offline', action='store_true',
+                        help='for if_applied, use the local mirror without '
+                             'syncing it with Notion')
+    parser.add_argument('--profile', nargs='?',
+                        const=DATA_PATH.joinpath(RUN_REPORT_FILE),
+                        help='record timings and request metrics to a JSON '
+                             'run report')
+    parser.add_argument('--prometheus',
+                        help='with --profile, also write the metrics to this '
+                             'Prometheus textfile')
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Run an action and return the exit status: 1 if it failed on any
+    of the trackers it fanned out to, 0 otherwise."""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if vars(args)['profile']:
+        from jobapplier import instrumentation
+
+        instrumentation.enable()
+
+    from jobapplier.trackers import (load_trackers, select_trackers,
+                                     tracker_clients, run_trackers,
+                                     failed_trackers)
+
+    if vars(args)['action'] == 'apply_plan' and not vars(args)['plan']:
+        parser.error('apply_plan needs the plan to apply, given with --plan')
+    plan = None
+    if vars(args)['action'] == 'apply_plan':
+        from jobapplier.plan import Plan
+
+        plan = Plan.load(vars(args)['plan'])
+
+    try:
+        trackers = select_trackers(load_trackers(), vars(args)['trackers'])
+    except ValueError as exc:
+        parser.error(str(exc))
+    if plan is not None:
+        # A plan is applied with the tracker it was computed from.
+        trackers = [tracker for tracker in trackers
+                    if tracker.database_id == plan.database_id]
+        if not trackers:
+            parser.error(f'No tracker reads the database {plan.database_id} '
+                         f'of the plan')
+
+    # Letters and snapshots run on all the selected trackers in parallel,
+    # the other actions, and planning, on a single one.
+    fan_out = vars(args)['action'] in ('fill_cover_letters',
+                                       'export_snapshot') \
+        and not vars(args)['plan']
+    if not fan_out and len(trackers) > 1:
+        parser.error(f"{vars(args)['action']} runs on a single tracker, "
+                     f"choose one with --trackers")
+    tracker = trackers[0]
+    if vars(args)['action'] in ('watch', 'if_applied') and tracker.properties:
+        parser.error(f"{vars(args)['action']} does not support renamed "
+                     f"properties yet")
+    database_id = tracker.database_id
+
+    results = {}
+    client = None
+    if not fan_out and not (vars(args)['action'] == 'if_applied'
+                            and vars(args)['offline']):
+        client = tracker_clients([tracker])[tracker.api_key]
+
+    try:
+        if vars(args)['action'] == 'rename_cvs' and vars(args)['plan']:
+            from jobapplier.cv import plan_cvs
+
+            plan_cvs(client=client, database_id=database_id,
+                     hardlink=vars(args)['hardlink'],
+                     schema=tracker.schema).save(vars(args)['plan'])
+            print(f"Plan written to {vars(args)['plan']}.")
+
+        elif vars(args)['action'] == 'rename_cvs':
+            from jobapplier.cv import copy_and_rename_cvs
+
+            copy_and_rename_cvs(client=client,
+                                database_id=database_id,
+                                hardlink=vars(args)['hardlink'],
+                                schema=tracker.schema)
+
+        if vars(args)['action'] == 'fill_cover_letters' \
+                and vars(args)['plan']:
+            from jobapplier.api_requests import plan_cover_letters
+
+            plan_cover_letters(
+                client=client,
+                database_id=database_id,
+                block_type='paragraph',
+                ledger_path=tracker.ledger_path,
+                check_existing=vars(args)['check_existing'],
+                llm=vars(args)['llm'],
+                mirror_path=tracker.mirror_path,
+                schema=tracker.schema
+            ).save(vars(args)['plan'])
+            print(f"Plan written to {vars(args)['plan']}.")
+
+        elif vars(args)['action'] == 'fill_cover_letters':
+            from jobapplier.api_requests import add_cover_letters
+
+            results = run_trackers(
+                trackers,
+                lambda tracker, client: add_cover_letters(
+                    client=client,
+                    database_id=tracker.database_id,
+                    block_type='paragraph',
+                    ledger_path=tracker.ledger_path,
+                    check_existing=vars(args)['check_existing'],
+                    llm=vars(args)['llm'],
+                    mirror_path=tracker.mirror_path,
+                    schema=tracker.schema
+                )
+            )
+
+        if vars(args)['action'] == 'export_snapshot':
+            from jobapplier.snapshot import export_snapshot
+
+            results = run_trackers(
+                trackers,
+                lambda tracker, client: export_snapshot(
+                    client=client,
+                    database_id=tracker.database_id,
+                    snapshot_path=tracker.snapshot_path,
+                    mirror_path=tracker.mirror_path,
+                    schema=tracker.schema
+                )
+            )
+
+        if vars(args)['action'] == 'find_duplicates':
+            from tabulate import tabulate
+            from jobapplier.dedup import (duplicate_entries, duplicate_rows,
+                                          plan_duplicate_tags)
+
+            clusters, pages = duplicate_entries(
+                client=client,
+                database_id=database_id,
+                threshold=vars(args)['threshold'],
+                mirror_path=tracker.mirror_path,
+                schema=tracker.schema
+            )
+            print(tabulate(duplicate_rows(clusters), headers='keys',
+                           tablefmt='psql'))
+            if vars(args)['tag']:
+                tags = plan_duplicate_tags(client, database_id, clusters,
+                                           pages)
+                if vars(args)['plan']:
+                    tags.save(vars(args)['plan'])
+                    print(f"Plan written to {vars(args)['plan']}.")
+                else:
+                    from jobapplier.plan import execute_plan
+
+                    execute_plan(tags, client)
+
+        if vars(args)['action'] == 'apply_plan':
+            from jobapplier.plan import execute_plan
+
+            execute_plan(plan, client, ledger_path=tracker.ledger_path)
+
+        if vars(args)['action'] == 'watch':
+            from jobapplier.daemon import watch
+
+            watch(client=client,
+                  database_id=database_id,
+                  stages=vars(args)['stages'],
+                  webhook_port=vars(args)['webhook_port'],
+                  mirror_path=tracker.mirror_path,
+                  ledger_path=tracker.ledger_path)
+
+        if vars(args)['action'] == 'if_applied' and vars(args)['listings']:
+            from jobapplier.screening import screen_listings
+
+            screen_listings(
+                client=client,
+                database_id=database_id,
+                listings_path=vars(args)['listings'],
+                output_path=vars(args)['output'],
+                fuzzy=vars(args)['fuzzy'],
+                mirror_path=tracker.mirror_path
+            )
+
+        elif vars(args)['action'] == 'if_applied':
+            from tabulate import tabulate
+            from jobapplier.company_index import company_entries
+
+            entries = company_entries(
+                substring=vars(args)['company'],
+                client=client,
+                database_id=database_id,
+                fuzzy=vars(args)['fuzzy'],
+                mirror_path=tracker.mirror_path
+            )
+            if entries:
+                print(tabulate(entries, headers='keys', tablefmt='psql'))
+            else:
+                print(f"No entry found for company {vars(args)['company']!r}.")
+            if not entries and client is None:
+                from jobapplier.mirror import open_mirror, page_count
+
+                conn = open_mirror(tracker.mirror_path)
+                try:
+                    empty = page_count(conn, database_id) == 0
+                finally:
+                    conn.close()
+                if empty:
+                    print('The local mirror is empty, run without --offline '
+                          'to sync it with Notion.')
+    finally:
+        if client is not None:
+            client.close()
+        if vars(args)['profile']:
+            instrumentation.write_report(vars(args)['profile'])
+            print(f"Run report written to {vars(args)['profile']}.")
+            if vars(args)['prometheus']:
+                instrumentation.write_prometheus(vars(args)['prometheus'])
+
+    failed = failed_trackers(results)
+    if failed:
+        print(f"{len(failed)}/{len(results)} trackers failed: "
+              f"{', '.join(failed)}.")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,292 @@
+import hashlib
+import json
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Page IDs per `IN (...)` query, to stay below SQLite's limit on the number
+# of query parameters.
+QUERY_CHUNK_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    database_key TEXT NOT NULL,
+    page_id TEXT NOT NULL,
+    created_time TEXT,
+    last_edited_time TEXT,
+    archived INTEGER NOT NULL DEFAULT 0,
+    json TEXT NOT NULL,
+    query_rank INTEGER,
+    PRIMARY KEY (database_key, page_id)
+);
+CREATE INDEX IF NOT EXISTS pages_last_edited
+    ON pages (database_key, last_edited_time);
+CREATE TABLE IF NOT EXISTS mirror_state (
+    database_key TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    reconciled_at TEXT
+);
+CREATE TABLE IF NOT EXISTS block_trees (
+    page_id TEXT PRIMARY KEY,
+    last_edited_time TEXT NOT NULL,
+    json TEXT NOT NULL
+);
+"""
+
+
+def open_mirror(path: Path) -> sqlite3.Connection:
+    """Open (and create if needed) the SQLite mirror of Notion databases."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    # Columns added after the first mirrors were created.
+    for table, column, column_type in [('pages', 'query_rank', 'INTEGER'),
+                                       ('mirror_state', 'reconciled_at',
+                                        'TEXT')]:
+        columns = {row[1] for row
+                   in conn.execute(f"PRAGMA table_info({table})")}
+        if column not in columns:
+            conn.execute(
+                f"ALTER TABLE {table} ADD COLUMN {column} {column_type}"
+            )
+    return conn
+
+
+def page_digest(page: dict) -> str:
+    """Return a hash of the content of a page.
+
+    `last_edited_time` is rounded to the minute by Notion, so it does not
+    change when a page is edited again within the same minute.
+    """
+    return hashlib.sha256(
+        json.dumps(page, sort_keys=True).encode('utf-8')
+    ).hexdigest()
+
+
+def last_edited_watermark(conn: sqlite3.Connection,
+                          database_key: str) -> str | None:
+    """Return the latest `last_edited_time` stored for a database."""
+    row = conn.execute(
+        "SELECT MAX(last_edited_time) FROM pages WHERE database_key = ?",
+        (database_key,)
+    ).fetchone()
+    return row[0]
+
+
+def upsert_pages(conn: sqlite3.Connection, database_key: str,
+                 pages: list[dict]) -> int:
+    """Insert or update raw Notion pages in the mirror.
+
+    Pages flagged by Notion as archived or trashed are kept, but marked as
+    archived so that they are not returned by `load_pages`. Pages identical
+    to the stored copy are left untouched.
+
+    Returns
+    -------
+    int
+        The number of pages that were inserted or actually changed.
+    """
+    rows = [
+        (
+            database_key,
+            page['id'],
+            page.get('created_time'),
+            page.get('last_edited_time'),
+            int(bool(page.get('archived') or page.get('in_trash'))),
+            json.dumps(page),
+        )
+        for page in pages
+    ]
+    with conn:
+        changes_before = conn.total_changes
+        conn.executemany(
+            "INSERT INTO pages (database_key, page_id, created_time, "
+            "last_edited_time, archived, json) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (database_key, page_id) DO UPDATE SET "
+            "created_time = excluded.created_time, "
+            "last_edited_time = excluded.last_edited_time, "
+            "archived = excluded.archived, json = excluded.json "
+            "WHERE pages.json != excluded.json "
+            "OR pages.archived != excluded.archived",
+            rows
+        )
+        changed = conn.total_changes - changes_before
+        if changed:
+            bump_version(conn, database_key)
+    return changed
+
+
+def bump_version(conn: sqlite3.Connection, database_key: str) -> None:
+    """Increment the version of a database mirror after a change."""
+    conn.execute(
+        "INSERT INTO mirror_state (database_key, version) VALUES (?, 1) "
+        "ON CONFLICT (database_key) DO UPDATE SET version = version + 1",
+        (database_key,)
+    )
+
+
+def mirror_version(conn: sqlite3.Connection, database_key: str) -> int:
+    """Return the version of a database mirror.
+
+    The version is incremented whenever a live page is added, changed or
+    removed. Indexes derived from the mirror store it to know when they
+    must be rebuilt.
+    """
+    row = conn.execute(
+        "SELECT version FROM mirror_state WHERE database_key = ?",
+        (database_key,)
+    ).fetchone()
+    return row[0] if row else 0
+
+
+def reconciled_at(conn: sqlite3.Connection,
+                  database_key: str) -> datetime | None:
+    """Return when the mirror of a database was last reconciled."""
+    row = conn.execute(
+        "SELECT reconciled_at FROM mirror_state WHERE database_key = ?",
+        (database_key,)
+    ).fetchone()
+    return datetime.fromisoformat(row[0]) if row and row[0] else None
+
+
+def mark_reconciled(conn: sqlite3.Connection, database_key: str) -> None:
+    """Record that the mirror of a database was just reconciled."""
+    with conn:
+        conn.execute(
+            "INSERT INTO mirror_state (database_key, version, reconciled_at) "
+            "VALUES (?, 0, ?) ON CONFLICT (database_key) "
+            "DO UPDATE SET reconciled_at = excluded.reconciled_at",
+            (database_key, datetime.now(timezone.utc).isoformat())
+        )
+
+
+def mark_missing_as_archived(conn: sqlite3.Connection, database_key: str,
+                             live_ids: set[str]) -> int:
+    """Mark every stored page whose ID is not in `live_ids` as archived.
+
+    Notion database queries never return archived or deleted pages, so a
+    page that disappears from a full listing has been removed from the
+    database.
+    """
+    stored_ids = {
+        page_id for (page_id,) in conn.execute(
+            "SELECT page_id FROM pages "
+            "WHERE database_key = ? AND archived = 0",
+            (database_key,)
+        )
+    }
+    missing = stored_ids - live_ids
+    with conn:
+        conn.executemany(
+            "UPDATE pages SET archived = 1 "
+            "WHERE database_key = ? AND page_id = ?",
+            [(database_key, page_id) for page_id in missing]
+        )
+        if missing:
+            bump_version(conn, database_key)
+    return len(missing)
+
+
+def store_query_ranks(conn: sqlite3.Connection, database_key: str,
+                      page_ids: list[str]) -> None:
+    """Store the rank of each page in a full listing of the database, in
+    the default order of a Notion database query."""
+    with conn:
+        conn.execute("UPDATE pages SET query_rank = NULL "
+                     "WHERE database_key = ?", (database_key,))
+        conn.executemany(
+            "UPDATE pages SET query_rank = ? "
+            "WHERE database_key = ? AND page_id = ?",
+            [(rank, database_key, page_id)
+             for rank, page_id in enumerate(page_ids)]
+        )
+
+
+def page_count(conn: sqlite3.Connection, database_key: str) -> int:
+    """Return the number of live pages stored for a database."""
+    row = conn.execute(
+        "SELECT COUNT(*) FROM pages WHERE database_key = ? AND archived = 0",
+        (database_key,)
+    ).fetchone()
+    return row[0]
+
+
+def load_pages(conn: sqlite3.Connection, database_key: str,
+               page_ids: list[str] | None = None) -> list[dict]:
+    """Return the live raw pages of a database in query order.
+
+    Pages are ordered by their rank in the last full listing of the
+    database, stored by `store_query_ranks` when the mirror is reconciled,
+    which is the order Notion returns them in and the one `plan_positions`
+    numbers. Timestamps only have a minute resolution, so they cannot tell
+    apart entries created in the same minute. Pages added since the last
+    reconcile have no rank yet and come first, newest first. If `page_ids`
+    is given, only those pages are returned.
+    """
+    if page_ids is None:
+        rows = conn.execute(
+            "SELECT json FROM pages WHERE database_key = ? AND archived = 0 "
+            "ORDER BY query_rank IS NOT NULL, query_rank, "
+            "created_time DESC, page_id",
+            (database_key,)
+        )
+        return [json.loads(raw) for (raw,) in rows]
+
+    rows = []
+    page_ids = list(dict.fromkeys(page_ids))
+    for start in range(0, len(page_ids), QUERY_CHUNK_SIZE):
+        chunk = page_ids[start:start + QUERY_CHUNK_SIZE]
+        rows.extend(conn.execute(
+            "SELECT query_rank, created_time, page_id, json FROM pages "
+            "WHERE database_key = ? AND archived = 0 "
+            f"AND page_id IN ({', '.join('?' * len(chunk))})",
+            [database_key, *chunk]
+        ))
+    # The chunks are merged in the order above, with one stable sort per
+    # key from the last to the first.
+    rows.sort(key=lambda row: row[2])
+    rows.sort(key=lambda row: row[1] or '', reverse=True)
+    rows.sort(key=lambda row: (row[0] is not None, row[0] or 0))
+    return [json.loads(raw) for *_, raw in rows]
+
+
+def cached_block_trees(conn: sqlite3.Connection,
+                       edited_times: dict[str, str]) -> dict[str, list]:
+    """Return the stored block trees of pages that were not edited since.
+
+    Parameters
+    ----------
+    edited_times : dict
+        The current `last_edited_time` of each page, by page ID.
+
+    Returns
+    -------
+    dict
+        The block tree of each page whose stored copy is up to date.
+    """
+    trees = {}
+    page_ids = list(edited_times)
+    for start in range(0, len(page_ids), QUERY_CHUNK_SIZE):
+        chunk = page_ids[start:start + QUERY_CHUNK_SIZE]
+        rows = conn.execute(
+            "SELECT page_id, last_edited_time, json FROM block_trees "
+            f"WHERE page_id IN ({', '.join('?' * len(chunk))})",
+            chunk
+        )
+        for page_id, last_edited_time, raw in rows:
+            if last_edited_time == edited_times[page_id]:
+                trees[page_id] = json.loads(raw)
+    return trees
+
+
+def store_block_trees(conn: sqlite3.Connection,
+                      trees: list[tuple[str, str, list]]) -> None:
+    """Store (page_id, last_edited_time, blocks) block trees."""
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO block_trees "
+            "(page_id, last_edited_time, json) VALUES (?, ?, ?)",
+            [(page_id, last_edited_time, json.dumps(blocks))
+             for page_id, last_edited_time, blocks in trees]
+        )
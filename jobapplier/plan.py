@@ -0,0 +1,348 @@
+"""Change plans: every write of an action, computed before any is sent.
+
+Planning reads the tracker (and the CV files) but never writes, so a large
+operation can be previewed for free. A plan lists the page updates, block
+appends and file copies of an action, with its payload sizes and the
+number of requests and time it takes at the client's rate limit:
+
+    plan = plan_cover_letters(client, database_id, 'paragraph')
+    print(plan.summary())
+    plan.save('letters_plan.json')
+    ...
+    execute_plan(Plan.load('letters_plan.json'), client)
+
+A saved plan is replayed exactly as it was computed: the payloads are
+stored, not recomputed.
+"""
+import json
+from dataclasses import dataclass, field, asdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Iterable
+
+import requests
+
+from jobapplier.blocks import dumps, payload_size, validate_children
+from jobapplier.client import NotionClient
+from jobapplier.constants import NOTION_MAX_CONCURRENCY, NOTION_RATE_LIMIT
+from jobapplier.dispatcher import Job, DispatchResult, dispatch, summarize
+from jobapplier.instrumentation import count
+from jobapplier.ledger import (open_ledger, is_recorded, record_letter,
+                               appended_batches, record_batches)
+
+
+@dataclass
+class PageUpdate:
+    """Properties to set on a page, in one request."""
+    page_id: str
+    properties: dict
+    label: str = ''
+
+    @property
+    def requests(self) -> int:
+        return 1
+
+    @property
+    def payload_bytes(self) -> int:
+        return len(dumps({'properties': self.properties}))
+
+
+@dataclass
+class BlockAppend:
+    """Blocks to append to a page, one request per batch, in order."""
+    page_id: str
+    batches: list[list[dict]]
+    label: str = ''
+    # Recorded in the ledger once appended, for cover letters.
+    letter_hash: str | None = None
+
+    @property
+    def requests(self) -> int:
+        return len(self.batches)
+
+    @property
+    def payload_bytes(self) -> int:
+        return sum(payload_size(batch) for batch in self.batches)
+
+
+@dataclass
+class FileCopy:
+    """A local file to copy, or link, to its target."""
+    src: str
+    dst: str
+    sha256: str
+    # Size and modification time of `src` when planned.
+    size: int
+    mtime_ns: int
+    page_id: str | None = None
+    hardlink: bool = False
+    # True if the target already holds the same content.
+    up_to_date: bool = False
+
+
+@dataclass
+class Plan:
+    """All the writes of an action.
+
+    Parameters
+    ----------
+    action : str
+        The planned action, e.g. 'fill_cover_letters'.
+    database_id : str
+        The ID of the Notion database the plan was computed from.
+    rate_limit : float
+        Requests per second of the client, to estimate the duration.
+    """
+    action: str
+    database_id: str
+    rate_limit: float = NOTION_RATE_LIMIT
+    created_at: str = field(
+        default_factory=lambda: datetime.now(timezone.utc).isoformat()
+    )
+    page_updates: list[PageUpdate] = field(default_factory=list)
+    block_appends: list[BlockAppend] = field(default_factory=list)
+    file_copies: list[FileCopy] = field(default_factory=list)
+    # Entries left out of the plan because they are already up to date.
+    skipped: int = 0
+
+    @property
+    def requests(self) -> int:
+        """Number of API requests needed to apply the plan."""
+        return sum(op.requests for op in self.writes())
+
+    @property
+    def payload_bytes(self) -> int:
+        return sum(op.payload_bytes for op in self.writes())
+
+    @property
+    def estimated_seconds(self) -> float:
+        """Duration of the writes at the rate limit, the bottleneck of any
+        batch of Notion requests."""
+        return self.requests / self.rate_limit
+
+    def writes(self) -> list[PageUpdate | BlockAppend]:
+        return [*self.page_updates, *self.block_appends]
+
+    def summary(self) -> str:
+        copies = sum(not copy.up_to_date for copy in self.file_copies)
+        return (f'Plan for {self.action}: {len(self.page_updates)} page '
+                f'updates, {len(self.block_appends)} block appends, {copies} '
+                f'file copies, {self.skipped} entries up to date. '
+                f'{self.requests} requests, '
+                f'{self.payload_bytes / 1e3:.1f} kB, '
+                f'about {self.estimated_seconds:.0f}s at '
+                f'{self.rate_limit:g} requests/s.')
+
+    def save(self, path: Path) -> None:
+        """Write the plan to a JSON file."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(asdict(self), indent=1,
+                                   ensure_ascii=False), encoding='utf-8')
+
+    @classmethod
+    def load(cls, path: Path) -> 'Plan':
+        """Read a plan written by `save`."""
+        data = json.loads(Path(path).read_text(encoding='utf-8'))
+        data['page_updates'] = [PageUpdate(**op)
+                                for op in data['page_updates']]
+        data['block_appends'] = [BlockAppend(**op)
+                                 for op in data['block_appends']]
+        data['file_copies'] = [FileCopy(**op) for op in data['file_copies']]
+        return cls(**data)
+
+
+def client_rate(client: NotionClient | None) -> float:
+    return client.limiter.rate if client is not None else NOTION_RATE_LIMIT
+
+
+def apply_writes(
+        client: NotionClient,
+        writes: Iterable[PageUpdate | BlockAppend],
+        max_concurrency: int = NOTION_MAX_CONCURRENCY,
+        ledger=None,
+        on_result: Callable[[DispatchResult], None] | None = None
+) -> list[DispatchResult]:
+    """Send page updates and block appends concurrently.
+
+    `writes` may be a generator still producing work, as with the streamed
+    cover letters. The first batch of an append is dispatched like any
+    other request; the rare following batches are sent right after it,
+    since the batches of a page must be appended in order. Appends breaking
+    Notion's request limits fail without being sent.
+
+    The progress of letters appended in several batches is recorded in the
+    ledger, so that a letter interrupted by a failed batch is resumed from
+    that batch by the next run.
+
+    Parameters
+    ----------
+    client : NotionClient
+        The client whose pooled session and rate limiter are used.
+    writes : iterable of PageUpdate or BlockAppend
+        The writes to send.
+    max_concurrency : int
+        Maximum number of requests in flight at the same time.
+    ledger : sqlite3.Connection or None
+        Ledger recording the appends carrying a `letter_hash`.
+    on_result : callable or None
+        Called with each `DispatchResult` once its write is complete.
+
+    Returns
+    -------
+    list of DispatchResult
+        One result per write, in completion order.
+    """
+    # Appends in flight by job key, with the number of their batches
+    # already appended and the ID of their first block. Keys are unique per
+    # write, as a page may get several writes.
+    appends = {}
+    rejected = []
+
+    def jobs():
+        for idx, op in enumerate(writes):
+            key = f'{idx}:{op.page_id}'
+            if isinstance(op, PageUpdate):
+                yield Job(key=key, method='PATCH',
+                          path=f'pages/{op.page_id}',
+                          payload={'properties': op.properties},
+                          label=op.label)
+                continue
+            try:
+                for batch in op.batches:
+                    validate_children(batch)
+            except ValueError as exc:
+                result = DispatchResult(key=key, label=op.label,
+                                        ok=False, error=str(exc))
+                count('dispatch_results', ok=False)
+                rejected.append(result)
+                if on_result:
+                    on_result(result)
+                continue
+            sent, block_id = 0, None
+            if op.letter_hash and ledger is not None:
+                sent, block_id = appended_batches(ledger, op.page_id,
+                                                  op.letter_hash)
+            appends[key] = (op, sent, block_id)
+            yield Job(key=key, method='PATCH',
+                      path=f'blocks/{op.page_id}/children',
+                      payload={'children': op.batches[sent]},
+                      label=op.label)
+
+    def report(result: DispatchResult):
+        op, sent, block_id = appends.pop(result.key, (None, 0, None))
+        tracked = op is not None and op.letter_hash and ledger is not None
+        if op is not None and result.ok:
+            if sent == 0:
+                blocks = result.data.get('results') or [{}]
+                block_id = blocks[0].get('id')
+            sent += 1
+            try:
+                for batch in op.batches[sent:]:
+                    if tracked:
+                        record_batches(ledger, op.page_id, op.letter_hash,
+                                       sent, block_id)
+                    client.append_children(op.page_id, batch)
+                    sent += 1
+            except requests.RequestException as exc:
+                result.ok = False
+                result.error = (f'{sent}/{len(op.batches)} batches '
+                                f'appended: {exc}')
+        if tracked and result.ok:
+            record_letter(ledger, op.page_id, op.letter_hash, block_id)
+        if on_result:
+            on_result(result)
+
+    results = dispatch(jobs(), client=client,
+                       max_concurrency=max_concurrency, on_result=report)
+    return results + rejected
+
+
+def ordered_writes(plan: Plan) -> list[PageUpdate | BlockAppend]:
+    """Return the writes of a plan in the order they are best sent.
+
+    Updates of a same page are merged into a single request, and the
+    writes needing the most requests go first, so that the sequential
+    batches of long appends overlap with the rest instead of trailing at
+    the end of the run.
+    """
+    updates = {}
+    for op in plan.page_updates:
+        if op.page_id in updates:
+            merged = updates[op.page_id]
+            updates[op.page_id] = PageUpdate(
+                op.page_id, {**merged.properties, **op.properties},
+                merged.label
+            )
+        else:
+            updates[op.page_id] = op
+    writes = [*updates.values(), *plan.block_appends]
+    # sorted is stable, so the planned order is kept among equals.
+    return sorted(writes, key=lambda op: -op.requests)
+
+
+def execute_plan(
+        plan: Plan,
+        client: NotionClient,
+        max_concurrency: int = NOTION_MAX_CONCURRENCY,
+        ledger_path: Path | None = None
+) -> list[DispatchResult]:
+    """Apply a plan: copy its files, then send its writes.
+
+    Parameters
+    ----------
+    plan : Plan
+        The plan, e.g. loaded from a file with `Plan.load`.
+    client : NotionClient
+        The Notion API client used for all requests.
+    max_concurrency : int
+        Maximum number of requests in flight at the same time.
+    ledger_path : Path or None
+        Location of the SQLite ledger of appended letters. Letters already
+        recorded there are not appended again, so replaying a plan after a
+        partial failure only sends what is missing.
+
+    Returns
+    -------
+    list of DispatchResult
+        One result per write.
+    """
+    print(plan.summary())
+    if plan.file_copies:
+        from jobapplier.cv import apply_cv_copies
+
+        apply_cv_copies(plan.file_copies)
+
+    ledger = open_ledger(ledger_path) if ledger_path else None
+    writes = ordered_writes(plan)
+    if ledger is not None:
+        pending = [op for op in writes if not (
+            isinstance(op, BlockAppend) and op.letter_hash
+            and is_recorded(ledger, op.page_id, op.letter_hash)
+        )]
+        if len(pending) < len(writes):
+            print(f'{len(writes) - len(pending)} appends already recorded '
+                  f'in the ledger, skipped.')
+        writes = pending
+    done = 0
+
+    def report(result: DispatchResult):
+        nonlocal done
+        done += 1
+        count('plan_writes', ok=result.ok)
+        if result.ok:
+            print(f'[{done}/{len(writes)}] Done: {result.label}')
+        else:
+            print(f'[{done}/{len(writes)}] Failed: {result.label}: '
+                  f'{result.status_code} {result.error}')
+
+    try:
+        results = apply_writes(client, writes,
+                               max_concurrency=max_concurrency,
+                               ledger=ledger, on_result=report)
+    finally:
+        if ledger is not None:
+            ledger.close()
+    if results:
+        print(summarize(results))
+    return results
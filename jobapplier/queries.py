@@ -0,0 +1,41 @@
+"""Notion database query predicates and property projections per action.
+
+Predicates are built from a property schema, so that they also apply to
+trackers whose properties are named differently (see `trackers`).
+
+Reference: https://developers.notion.com/reference/post-database-query-filter
+"""
+from jobapplier.data_preprocessing import PROPERTY_SCHEMA
+
+PENDING_LETTERS_COLUMNS = ['job_title', 'company', 'language']
+PENDING_LLM_LETTERS_COLUMNS = PENDING_LETTERS_COLUMNS + ['job_description']
+ACTIVE_APPLICATIONS_COLUMNS = ['job_title', 'language', 'position']
+
+
+def select_is_empty(column: str, schema: dict = PROPERTY_SCHEMA,
+                    empty: bool = True) -> dict:
+    """Return the filter matching entries whose select `column` is empty,
+    or not empty if `empty` is False."""
+    condition = "is_empty" if empty else "is_not_empty"
+    return {"property": schema[column][0], "select": {condition: True}}
+
+
+def pending_letters_filter(schema: dict = PROPERTY_SCHEMA) -> dict:
+    """Entries without a stage but with a language, waiting for a letter."""
+    return {"and": [select_is_empty('stage', schema),
+                    select_is_empty('language', schema, empty=False)]}
+
+
+def is_pending_letter(row: dict) -> bool:
+    """Same predicate as `pending_letters_filter`, evaluated locally.
+
+    Entries without a company or a job title are left out until both are
+    filled in, as their letter cannot be built yet.
+    """
+    return row['stage'] is None and row['language'] is not None \
+        and bool(row['company']) and bool(row['job_title'])
+
+
+def active_applications_sorts(schema: dict = PROPERTY_SCHEMA) -> list[dict]:
+    return [{"property": schema['position'][0], "direction": "descending"}]
+
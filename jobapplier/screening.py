@@ -0,0 +1,123 @@
+from pathlib import Path
+
+import pandas as pd
+
+from jobapplier.api_requests import sync_mirror
+from jobapplier.client import NotionClient
+from jobapplier.company_index import build_company_index, normalize_company
+from jobapplier.constants import MIRROR_PATH, MIRROR_RECONCILE_HOURS
+from jobapplier.data_preprocessing import map_dict
+from jobapplier.mirror import open_mirror, load_pages
+
+
+def read_listings(path: Path) -> pd.DataFrame:
+    """Read scraped listings from a CSV or JSONL file.
+
+    The company column may be named either 'company_name' (as in the
+    listings CSV used by `add_cover_letters_csv`) or 'company'.
+    """
+    path = Path(path)
+    if path.suffix == '.jsonl':
+        df_listings = pd.read_json(path, lines=True)
+    else:
+        df_listings = pd.read_csv(path)
+    if 'company_name' not in df_listings and 'company' in df_listings:
+        df_listings = df_listings.rename(columns={'company': 'company_name'})
+    return df_listings
+
+
+def write_listings(df_listings: pd.DataFrame, path: Path) -> None:
+    """Write annotated listings to a CSV or JSONL file."""
+    path = Path(path)
+    if path.suffix == '.jsonl':
+        df_listings.to_json(path, orient='records', lines=True,
+                            force_ascii=False)
+    else:
+        df_listings.to_csv(path, index=False)
+
+
+def screen_listings(
+        client: NotionClient | None,
+        database_id: str,
+        listings_path: Path,
+        output_path: Path,
+        fuzzy: bool = False,
+        mirror_path: Path = MIRROR_PATH
+) -> pd.DataFrame:
+    """Flag the listings of a file whose company was already applied to.
+
+    The tracker is synced once, and reconciled if it was not in the last
+    `MIRROR_RECONCILE_HOURS`, so that removed entries are not reported.
+    Then every listing is matched against the in-memory company index.
+    The output file has the listing columns plus:
+
+    - `already_applied`: whether any tracker entry matches the company;
+    - `same_title`: whether one of those entries has the same job title;
+    - `matched_entries`: the matching entries as 'title @ company (stage)';
+    - `matched_page_ids`: the Notion page IDs of the matching entries.
+
+    Parameters
+    ----------
+    client : NotionClient or None
+        The Notion API client used to sync the mirror. If None, the mirror
+        is used as is, and may still hold entries removed since its last
+        reconcile.
+    database_id : str
+        The ID of the Notion tracker database.
+    listings_path : Path
+        CSV or JSONL file with 'company_name' and 'job_title' columns.
+    output_path : Path
+        CSV or JSONL file to write the annotated listings to.
+    fuzzy : bool
+        If True, also match near-duplicate company names.
+    mirror_path : Path
+        Location of the SQLite mirror file.
+
+    Returns
+    -------
+    pd.DataFrame
+        The annotated listings.
+    """
+    if client is not None:
+        sync_mirror(client, database_id, mirror_path=mirror_path,
+                    reconcile_after=MIRROR_RECONCILE_HOURS)
+    conn = open_mirror(mirror_path)
+    try:
+        index = build_company_index(conn, database_id)
+        rows = {page['id']: map_dict(page)
+                for page in load_pages(conn, database_id)}
+    finally:
+        conn.close()
+
+    df_listings = read_listings(listings_path)
+    titles = (df_listings['job_title'] if 'job_title' in df_listings
+              else pd.Series('', index=df_listings.index))
+    already_applied = []
+    same_title = []
+    matched_entries = []
+    matched_page_ids = []
+    for company, title in zip(df_listings['company_name'], titles):
+        matches = index.search(company, fuzzy=fuzzy) if pd.notna(company) \
+            else []
+        matched = [rows[match.page_id] for match in matches]
+        normalized_title = normalize_company(title) if pd.notna(title) else ''
+        already_applied.append(bool(matched))
+        same_title.append(any(
+            normalize_company(row['job_title'] or '') == normalized_title
+            for row in matched
+        ))
+        matched_entries.append('; '.join(
+            f"{row['job_title']} @ {row['company']} ({row['stage']})"
+            for row in matched
+        ))
+        matched_page_ids.append('; '.join(row['page_id'] for row in matched))
+
+    df_listings['already_applied'] = already_applied
+    df_listings['same_title'] = same_title
+    df_listings['matched_entries'] = matched_entries
+    df_listings['matched_page_ids'] = matched_page_ids
+    write_listings(df_listings, output_path)
+
+    print(f'{sum(already_applied)}/{len(df_listings)} listings match an '
+          f'existing application. Results written to {output_path}.')
+    return df_listings
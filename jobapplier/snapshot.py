@@ -0,0 +1,204 @@
+"""Columnar Parquet snapshots of the tracker, for local analytics.
+
+The snapshot is a Hive-partitioned Parquet dataset with one partition per
+application month (`month=2024-05/data.parquet`). Each export syncs the
+local mirror and rewrites only the partitions holding pages added, edited
+or removed since the previous export, so it grows incrementally:
+
+    export_snapshot(client, database_id)
+    df = load_snapshot(columns=['stage', 'origin'])
+    stage_conversion(df, by='origin')
+"""
+import json
+import shutil
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from jobapplier.api_requests import sync_mirror
+from jobapplier.client import NotionClient
+from jobapplier.constants import MIRROR_PATH, SNAPSHOT_PATH
+from jobapplier.data_preprocessing import (PROPERTY_SCHEMA, build_dataframe,
+                                           map_dict)
+from jobapplier.instrumentation import timed
+from jobapplier.mirror import (open_mirror, load_pages, mirror_version,
+                               page_digest)
+
+if TYPE_CHECKING:
+    import pandas as pd
+    import pyarrow as pa
+
+STATE_FILE = '_state.json'
+PARTITION_FILE = 'data.parquet'
+
+
+def arrow_schema() -> 'pa.Schema':
+    """Return the Arrow schema of the snapshot, derived from the pandas
+    dtypes of `PROPERTY_SCHEMA`."""
+    import pyarrow as pa
+
+    arrow_types = {
+        'object': pa.string(),
+        'category': pa.dictionary(pa.int32(), pa.string()),
+        'datetime64[ns]': pa.timestamp('ns'),
+        'Int64': pa.int64(),
+    }
+    fields = [pa.field('page_id', pa.string(), nullable=False)]
+    fields += [pa.field(column, arrow_types[dtype])
+               for column, (_, _, dtype) in PROPERTY_SCHEMA.items()]
+    fields += [pa.field('created_time', pa.timestamp('ms', tz='UTC')),
+               pa.field('last_edited_time', pa.timestamp('ms', tz='UTC'))]
+    return pa.schema(fields)
+
+
+def application_month(page: dict, row: dict) -> str:
+    """Return the 'YYYY-MM' partition of an entry: the month of its
+    application date, or of its creation if it has none."""
+    return (row['date_applied'] or page['created_time'])[:7]
+
+
+def write_partition(path: Path, pages: list[dict],
+                    schema: dict = PROPERTY_SCHEMA) -> None:
+    """Write the pages of one month to a Parquet file, atomically."""
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    df = build_dataframe(pages, schema)
+    for column in ('created_time', 'last_edited_time'):
+        df[column] = pd.to_datetime(
+            pd.Series([page[column] for page in pages], dtype='object'),
+            format='ISO8601', utc=True
+        )
+    table = pa.Table.from_pandas(df, schema=arrow_schema(),
+                                 preserve_index=False)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f'.{path.name}.tmp')
+    pq.write_table(table, tmp, compression='zstd')
+    tmp.replace(path)
+
+
+@timed('export_snapshot')
+def export_snapshot(
+        client: NotionClient | None,
+        database_id: str,
+        snapshot_path: Path = SNAPSHOT_PATH,
+        mirror_path: Path = MIRROR_PATH,
+        schema: dict = PROPERTY_SCHEMA
+) -> list[str]:
+    """Export the tracker to a Parquet snapshot partitioned by month.
+
+    Parameters
+    ----------
+    client : NotionClient or None
+        The Notion API client used to sync the mirror. If None, the mirror
+        is exported as is.
+    database_id : str
+        The ID of the Notion tracker database.
+    snapshot_path : Path
+        Directory of the Parquet dataset.
+    mirror_path : Path
+        Location of the SQLite mirror file.
+    schema : dict
+        The property schema of the database, see `PROPERTY_SCHEMA`.
+
+    Returns
+    -------
+    list of str
+        The months whose partition was rewritten or removed.
+    """
+    if client is not None:
+        sync_mirror(client, database_id, mirror_path=mirror_path,
+                    reconcile=True)
+    snapshot_path = Path(snapshot_path)
+    state_path = snapshot_path.joinpath(STATE_FILE)
+    state = {}
+    if state_path.exists():
+        state = json.loads(state_path.read_text())
+        if state['database_id'] != database_id:
+            state = {}
+    previous = state.get('pages', {})
+
+    conn = open_mirror(mirror_path)
+    try:
+        version = mirror_version(conn, database_id)
+        if previous and state['mirror_version'] == version:
+            print(f'Snapshot {snapshot_path} is up to date.')
+            return []
+        pages = load_pages(conn, database_id)
+    finally:
+        conn.close()
+
+    current = {}
+    by_month = {}
+    for page in pages:
+        month = application_month(page, map_dict(page, schema))
+        # Pages are compared by content, as an edit in the minute of the
+        # previous export keeps the same `last_edited_time`.
+        current[page['id']] = [month, page_digest(page)]
+        by_month.setdefault(month, []).append(page)
+
+    changed = {month for page_id, (month, _) in previous.items()
+               if current.get(page_id) != previous[page_id]}
+    changed |= {month for page_id, (month, _) in current.items()
+                if previous.get(page_id) != current[page_id]}
+    if not previous:
+        shutil.rmtree(snapshot_path, ignore_errors=True)
+        changed = set(by_month)
+
+    for month in sorted(changed):
+        partition = snapshot_path.joinpath(f'month={month}', PARTITION_FILE)
+        if month in by_month:
+            write_partition(partition, by_month[month], schema)
+        else:
+            shutil.rmtree(partition.parent, ignore_errors=True)
+
+    snapshot_path.mkdir(parents=True, exist_ok=True)
+    tmp = state_path.with_name(f'.{STATE_FILE}.tmp')
+    tmp.write_text(json.dumps({'database_id': database_id,
+                               'mirror_version': version,
+                               'pages': current}))
+    tmp.replace(state_path)
+    print(f'Snapshot of {len(pages)} entries written to {snapshot_path}, '
+          f'{len(changed)}/{len(by_month)} monthly partitions updated.')
+    return sorted(changed)
+
+
+def load_snapshot(snapshot_path: Path = SNAPSHOT_PATH,
+                  columns: list[str] | None = None,
+                  months: list[str] | None = None) -> 'pd.DataFrame':
+    """Load a Parquet snapshot into a dataframe.
+
+    Files are memory-mapped, and only the requested columns and monthly
+    partitions are read. Select properties come back as categoricals.
+
+    Parameters
+    ----------
+    snapshot_path : Path
+        Directory of the Parquet dataset.
+    columns : list of str or None
+        The columns to read, all of them if None.
+    months : list of str or None
+        The 'YYYY-MM' partitions to read, all of them if None.
+    """
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(
+        snapshot_path,
+        columns=columns,
+        filters=[('month', 'in', months)] if months else None,
+        partitioning='hive',
+        memory_map=True,
+    )
+    return table.to_pandas()
+
+
+def stage_conversion(df: 'pd.DataFrame', by: str = 'origin') -> 'pd.DataFrame':
+    """Return the share of entries of each group that reached each stage,
+    with the number of entries of the group, e.g. per origin."""
+    import pandas as pd
+
+    groups = df[by].astype('object').fillna('Unknown')
+    stages = df['stage'].astype('object').fillna('No answer')
+    table = pd.crosstab(groups, stages, normalize='index')
+    table['entries'] = groups.value_counts()
+    return table
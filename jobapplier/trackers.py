@@ -0,0 +1,212 @@
+"""Several job trackers, e.g. one per candidate and market, in one run.
+
+Trackers are declared in config.ini, one `[tracker:<name>]` section each:
+
+    [tracker:alice-fr]
+    database_id = 0123...
+    ; The [secrets] api_key is used if left out.
+    api_key = secret_...
+    ; Requests per second allowed to this integration.
+    rate_limit = 3
+    ; Notion property read for a column of `PROPERTY_SCHEMA`.
+    property.job_title = Poste
+
+Without any tracker section, the database of [databases]
+job_tracker_2_database_id is the only tracker.
+
+Notion rate limits each integration, not each database, so trackers sharing
+an API key share one client: one rate limiter and one connection pool.
+`run_trackers` runs an action on all the trackers in parallel.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from configparser import ConfigParser
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, TYPE_CHECKING
+
+from jobapplier import constants
+from jobapplier.constants import (DATA_PATH, TRACKERS_PATH, MIRROR_PATH,
+                                  LEDGER_PATH, SNAPSHOT_PATH,
+                                  NOTION_RATE_LIMIT, TRACKER_SECTION_PREFIX,
+                                  TRACKER_MAX_WORKERS, api_headers,
+                                  get_config)
+from jobapplier.data_preprocessing import PROPERTY_SCHEMA
+from jobapplier.instrumentation import count, span
+
+if TYPE_CHECKING:
+    from jobapplier.client import NotionClient
+
+PROPERTY_OPTION_PREFIX = 'property.'
+
+
+@dataclass
+class Tracker:
+    """A Notion job tracker database and the integration reading it."""
+    name: str
+    database_id: str
+    api_key: str
+    rate_limit: float = NOTION_RATE_LIMIT
+    # Column -> Notion property name, for properties not named as in
+    # `PROPERTY_SCHEMA`.
+    properties: dict[str, str] = field(default_factory=dict)
+    data_path: Path = DATA_PATH
+
+    @property
+    def schema(self) -> dict:
+        """`PROPERTY_SCHEMA` with the property names of this tracker."""
+        return {
+            column: (self.properties.get(column, prop_name), prop_type, dtype)
+            for column, (prop_name, prop_type, dtype)
+            in PROPERTY_SCHEMA.items()
+        }
+
+    @property
+    def mirror_path(self) -> Path:
+        return self.data_path.joinpath(MIRROR_PATH.name)
+
+    @property
+    def ledger_path(self) -> Path:
+        return self.data_path.joinpath(LEDGER_PATH.name)
+
+    @property
+    def snapshot_path(self) -> Path:
+        return self.data_path.joinpath(SNAPSHOT_PATH.name)
+
+
+def load_trackers(config: ConfigParser | None = None) -> list[Tracker]:
+    """Return the trackers declared in config.ini, in declaration order.
+
+    Raises
+    ------
+    ValueError
+        If a `property.<column>` option names an unknown column.
+    """
+    config = config or get_config()
+    trackers = []
+    for section in config.sections():
+        if not section.startswith(TRACKER_SECTION_PREFIX):
+            continue
+        name = section[len(TRACKER_SECTION_PREFIX):]
+        options = config[section]
+        properties = {
+            key[len(PROPERTY_OPTION_PREFIX):]: value
+            for key, value in options.items()
+            if key.startswith(PROPERTY_OPTION_PREFIX)
+        }
+        unknown = set(properties) - set(PROPERTY_SCHEMA)
+        if unknown:
+            raise ValueError(f"Unknown columns in [{section}]: "
+                             f"{', '.join(sorted(unknown))}")
+        trackers.append(Tracker(
+            name=name,
+            database_id=options['database_id'],
+            api_key=options.get('api_key') or config['secrets']['api_key'],
+            rate_limit=options.getfloat('rate_limit', NOTION_RATE_LIMIT),
+            properties=properties,
+            # Each tracker gets its own mirror, ledger and snapshot.
+            data_path=TRACKERS_PATH.joinpath(name),
+        ))
+    if not trackers:
+        trackers.append(Tracker(name='default',
+                                database_id=constants.JOB_TRACKER_2_DATABASE_ID,
+                                api_key=constants.NOTION_API_KEY))
+    return trackers
+
+
+def select_trackers(trackers: list[Tracker],
+                    names: list[str] | None) -> list[Tracker]:
+    """Return the trackers with the given names, all of them if None.
+
+    Raises
+    ------
+    ValueError
+        If a name is not the name of a tracker.
+    """
+    if not names:
+        return trackers
+    by_name = {tracker.name: tracker for tracker in trackers}
+    unknown = [name for name in names if name not in by_name]
+    if unknown:
+        raise ValueError(f"Unknown trackers: {', '.join(unknown)}. "
+                         f"Known trackers: {', '.join(by_name)}")
+    return [by_name[name] for name in names]
+
+
+def tracker_clients(trackers: list[Tracker]) -> dict[str, 'NotionClient']:
+    """Return one client per integration, keyed by API key.
+
+    Trackers sharing an integration share its client, limited to the
+    lowest `rate_limit` among them.
+    """
+    from jobapplier.client import NotionClient, TokenBucket
+
+    rates = {}
+    for tracker in trackers:
+        rates[tracker.api_key] = min(rates.get(tracker.api_key, float('inf')),
+                                     tracker.rate_limit)
+    return {
+        api_key: NotionClient(headers=api_headers(api_key),
+                              limiter=TokenBucket(rate=rate))
+        for api_key, rate in rates.items()
+    }
+
+
+def run_trackers(
+        trackers: list[Tracker],
+        action: Callable[[Tracker, 'NotionClient'], Any],
+        clients: dict[str, 'NotionClient'] | None = None,
+        max_workers: int = TRACKER_MAX_WORKERS
+) -> dict[str, Any]:
+    """Run an action on several trackers in parallel.
+
+    A failing tracker does not stop the others; its error is printed. See
+    `failed_trackers` to tell whether any failed.
+
+    Parameters
+    ----------
+    trackers : list of Tracker
+        The trackers to run the action on.
+    action : callable
+        Called with each tracker and the client of its integration.
+    clients : dict or None
+        Clients keyed by API key, `tracker_clients(trackers)` if None, in
+        which case they are closed at the end.
+    max_workers : int
+        Maximum number of trackers processed at the same time.
+
+    Returns
+    -------
+    dict
+        The result of the action per tracker name, the exception raised
+        for failed trackers.
+    """
+    owns_clients = clients is None
+    if owns_clients:
+        clients = tracker_clients(trackers)
+
+    def run(tracker):
+        with span('tracker', tracker=tracker.name):
+            try:
+                result = action(tracker, clients[tracker.api_key])
+            except Exception as exc:
+                print(f'Tracker {tracker.name} failed: {exc}')
+                count('tracker_errors', tracker=tracker.name)
+                return exc
+        print(f'Tracker {tracker.name} done.')
+        return result
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(run, trackers))
+    finally:
+        if owns_clients:
+            for client in clients.values():
+                client.close()
+    return {tracker.name: result
+            for tracker, result in zip(trackers, results)}
+
+
+def failed_trackers(results: dict[str, Any]) -> list[str]:
+    """Return the names of the trackers that failed in `run_trackers`."""
+    return [name for name, result in results.items()
+            if isinstance(result, Exception)]
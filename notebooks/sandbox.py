@@ -2,19 +2,19 @@ import pandas as pd
 from openai import OpenAI
 
 from jobapplier.constants import (
-    URL_JOB_TRACKER_2_DATABASE, API_HEADERS, OPENAI_KEY, CV_RAW_PATH,
-    CV_RENAMED_PATH, DATA_PATH, API_HEADERS, URL_JOB_TRACKER_2_DATABASE
+    JOB_TRACKER_2_DATABASE_ID, API_HEADERS, OPENAI_KEY, CV_RAW_PATH,
+    CV_RENAMED_PATH, DATA_PATH
 )
 from jobapplier.api_requests import fetch_database_jsons
-from jobapplier.constants import API_HEADERS, URL_JOB_TRACKER_2_DATABASE
+from jobapplier.client import NotionClient
 from jobapplier.data_preprocessing import build_dataframe
 from jobapplier.cv import cvfy
 import shutil
 from pathlib import Path
 import requests
 
-results = fetch_database_jsons(url=URL_JOB_TRACKER_2_DATABASE,
-                               headers=API_HEADERS)
+notion = NotionClient(headers=API_HEADERS)
+results = fetch_database_jsons(notion, JOB_TRACKER_2_DATABASE_ID)
 
 client = OpenAI(api_key=OPENAI_KEY)
 
@@ -27,6 +27,5 @@ response = client.responses.create(
 # print(response.output_text)
 
 
-database = fetch_database_jsons(url=URL_JOB_TRACKER_2_DATABASE,
-                                headers=API_HEADERS)
+database = fetch_database_jsons(notion, JOB_TRACKER_2_DATABASE_ID)
 df = build_dataframe(database)
@@ -9,5 +9,10 @@ setup(
     name='jobapplier',
     version='0.1',
     install_requires=requirements,
-    packages=find_packages()
+    packages=find_packages(),
+    extras_require={'llm': ['openai>=1.0'], 'snapshot': ['pyarrow>=14'],
+                    'fast': ['orjson>=3'], 'test': ['pytest', 'nltk']},
+    entry_points={
+        'console_scripts': ['jobapplier=jobapplier.main:main'],
+    },
 )
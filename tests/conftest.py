@@ -0,0 +1,30 @@
+import pytest
+
+from jobapplier import cover_letter
+from jobapplier.fake_notion import FakeNotion
+
+
+@pytest.fixture
+def fake():
+    fake = FakeNotion()
+    fake.add_database('db', 50)
+    return fake
+
+
+@pytest.fixture
+def client(fake):
+    client = fake.client()
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def templates(tmp_path, monkeypatch):
+    """Letter templates, which are not part of the repository."""
+    for lang, text in [('EN', 'Dear COMPANY NAME, as a JOB TITLE...'),
+                       ('FR', 'Chère NOM D’ENTREPRISE, TITRE DU POSTE...')]:
+        path = tmp_path / f'{lang.lower()}_template.txt'
+        path.write_text(text, encoding='utf-8')
+        monkeypatch.setitem(cover_letter.LETTER_CONFIGS[lang],
+                            'template_file', path)
+    monkeypatch.setattr(cover_letter, '_TEMPLATE_CACHE', {})
@@ -0,0 +1,10 @@
+from benchmarks.bench import BENCHMARKS, run_benchmarks
+
+
+def test_every_benchmark_runs(templates):
+    rows = run_benchmarks(list(BENCHMARKS), sizes=[20], repeat=1,
+                          latency=0.0, rate=None)
+    assert [row['benchmark'] for row in rows] == list(BENCHMARKS)
+    by_name = {row['benchmark']: row for row in rows}
+    assert by_name['fetch_database_jsons']['requests'] >= 1
+    assert by_name['add_cover_letters']['writes'] >= 1
@@ -0,0 +1,64 @@
+import pytest
+
+from jobapplier.blocks import (batch_children, build_block, payload_size,
+                               split_text, text_blocks, utf16_length,
+                               validate_children)
+from jobapplier.constants import (NOTION_MAX_BLOCKS_PER_REQUEST,
+                                  NOTION_MAX_TEXT_LENGTH)
+
+
+def test_batches_hold_at_most_the_block_limit():
+    blocks = [build_block(f'Line {idx}') for idx in range(250)]
+    batches = batch_children(blocks)
+    assert [len(batch) for batch in batches] == [100, 100, 50]
+    assert [block for batch in batches for block in batch] == blocks
+
+
+def test_batches_fit_the_payload_size_limit():
+    blocks = [build_block('x' * 900) for _ in range(30)]
+    batches = batch_children(blocks, max_bytes=5000)
+    assert len(batches) > 1
+    assert all(payload_size(batch) <= 5000 for batch in batches)
+    # Filled as much as possible: the next block never fit.
+    for batch, following in zip(batches, batches[1:]):
+        assert payload_size(batch + following[:1]) > 5000
+    assert [block for batch in batches for block in batch] == blocks
+
+
+def test_batching_rejects_a_block_larger_than_the_limit():
+    with pytest.raises(ValueError):
+        batch_children([build_block('x' * 900)], max_bytes=500)
+
+
+def test_validate_accepts_batched_long_text():
+    text = '\n\n'.join(['Intro 😀 ' * 400, 'é' * 5000] * 60)
+    batches = batch_children(text_blocks(text))
+    for batch in batches:
+        validate_children(batch)
+
+
+@pytest.mark.parametrize('children', [
+    [build_block('a')] * (NOTION_MAX_BLOCKS_PER_REQUEST + 1),
+    [{'type': 'paragraph', 'paragraph': {'rich_text': [
+        {'type': 'text', 'text': {'content': 'a'}}
+    ] * 101}}],
+    [{'type': 'paragraph', 'paragraph': {'rich_text': [
+        {'type': 'text', 'text': {'content': '😀' * 1001}}
+    ]}}],
+])
+def test_validate_rejects_payloads_over_the_limits(children):
+    with pytest.raises(ValueError):
+        validate_children(children)
+
+
+def test_validate_rejects_payloads_over_the_size_limit():
+    with pytest.raises(ValueError):
+        validate_children([build_block('x' * 900)] * 10, max_bytes=5000)
+
+
+@pytest.mark.parametrize('text', ['😀' * 3000, 'word ' * 1000, 'é' * 4001])
+def test_split_text_counts_utf16_units(text):
+    chunks = split_text(text)
+    assert ''.join(chunks) == text
+    assert all(0 < utf16_length(chunk) <= NOTION_MAX_TEXT_LENGTH
+               for chunk in chunks)
@@ -0,0 +1,83 @@
+import pytest
+
+from jobapplier.api_requests import sync_mirror
+from jobapplier.company_index import (CompanyIndex, build_company_index,
+                                      company_entries, normalize_company)
+from jobapplier.mirror import open_mirror, upsert_pages, load_pages
+
+COMPANIES = ["L'Oréal", 'Société Générale, S.A.', 'Generali', 'Acme Corp']
+
+
+@pytest.fixture
+def index():
+    return CompanyIndex([(f'page-{idx}', company, normalize_company(company))
+                         for idx, company in enumerate(COMPANIES)])
+
+
+def found(matches):
+    return {match.company: (match.kind, match.score) for match in matches}
+
+
+def test_normalize_company():
+    assert normalize_company('Société Générale, S.A.') == \
+        'societe generale s a'
+
+
+def test_substring_ignores_accents_punctuation_and_spaces(index):
+    assert found(index.search('loreal')) == {"L'Oréal": ('substring', 1.0)}
+    assert found(index.search('SOCIETEGENERALE')) == \
+        {'Société Générale, S.A.': ('substring', 1.0)}
+
+
+def test_prefix_matches_each_query_token(index):
+    assert found(index.search('soc gen')) == \
+        {'Société Générale, S.A.': ('prefix', 1.0)}
+    assert index.search('soc acme') == []
+
+
+def test_fuzzy_matches_misspellings_only_when_asked(index):
+    assert index.search('Societe Generalle') == []
+    matches = found(index.search('Societe Generalle', fuzzy=True))
+    kind, score = matches['Société Générale, S.A.']
+    assert kind == 'fuzzy' and 0.6 <= score < 1
+    assert 'Acme Corp' not in matches
+
+
+def test_fuzzy_threshold(index):
+    loose = index.search('Generale', fuzzy=True, threshold=0.3)
+    strict = index.search('Generale', fuzzy=True, threshold=0.9)
+    assert len(strict) < len(loose)
+    # Exact matches come first.
+    assert loose[0].score == 1.0
+
+
+def test_index_is_rebuilt_when_the_mirror_changes(fake, client, tmp_path):
+    path = tmp_path / 'mirror.sqlite'
+    sync_mirror(client, 'db', mirror_path=path)
+    conn = open_mirror(path)
+    try:
+        assert len(build_company_index(conn, 'db').entries) == 50
+        page = load_pages(conn, 'db')[0]
+        page['properties']['Company']['rich_text'][0]['plain_text'] = \
+            'Initrode'
+        upsert_pages(conn, 'db', [page])
+        index = build_company_index(conn, 'db')
+    finally:
+        conn.close()
+    assert [match.page_id for match in index.search('initrode')] == \
+        [page['id']]
+
+
+def test_company_entries_reads_the_mirror_without_a_client(
+        fake, client, tmp_path):
+    path = tmp_path / 'mirror.sqlite'
+    sync_mirror(client, 'db', mirror_path=path)
+    page = next(iter(fake.databases['db'].values()))
+    company = page['properties']['Company']['rich_text'][0]['plain_text']
+    requests = len(fake.requests)
+
+    entries = company_entries(company, None, 'db', fuzzy=True,
+                              mirror_path=path)
+    assert len(fake.requests) == requests
+    assert company in [entry['company'] for entry in entries]
+    assert {'match', 'score'} <= set(entries[0])
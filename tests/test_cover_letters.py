@@ -0,0 +1,42 @@
+from jobapplier.api_requests import add_cover_letters, plan_cover_letters
+from jobapplier.data_preprocessing import map_dict
+from jobapplier.queries import is_pending_letter
+
+
+def pending_rows(fake):
+    rows = [map_dict(page) for page in fake.databases['db'].values()]
+    return [row for row in rows
+            if row['stage'] is None and row['language'] is not None]
+
+
+def blank_companies(fake, n):
+    rows = pending_rows(fake)[:n]
+    for row in rows:
+        page = fake.databases['db'][row['page_id']]
+        page['properties']['Company']['rich_text'] = []
+    return {row['page_id'] for row in rows}
+
+
+def test_plan_skips_and_reports_incomplete_entries(
+        fake, client, templates, tmp_path, capsys):
+    blanked = blank_companies(fake, 2)
+    complete = {row['page_id'] for row in pending_rows(fake)
+                if is_pending_letter(row)}
+
+    plan = plan_cover_letters(client, 'db', 'paragraph',
+                              ledger_path=tmp_path / 'ledger.sqlite',
+                              mirror_path=tmp_path / 'mirror.sqlite')
+    assert {op.page_id for op in plan.block_appends} == complete
+    out = capsys.readouterr().out
+    assert '2 pending entries have no company or job title yet' in out
+    assert all(page_id in out for page_id in blanked)
+
+
+def test_add_cover_letters_skips_incomplete_entries(
+        fake, client, templates, tmp_path):
+    blanked = blank_companies(fake, 1)
+    results = add_cover_letters(client, 'db', 'paragraph',
+                                ledger_path=tmp_path / 'ledger.sqlite',
+                                mirror_path=tmp_path / 'mirror.sqlite')
+    assert results and all(result.ok for result in results)
+    assert not blanked & set(fake.children)
@@ -0,0 +1,51 @@
+import string
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from unidecode import unidecode
+
+from jobapplier.cv import cvfy, cvfy_series, get_sep
+
+nltk = pytest.importorskip('nltk')
+
+TITLES = Path(__file__).parent.joinpath('data', 'job_titles.txt') \
+    .read_text(encoding='utf-8').splitlines()
+
+
+def nltk_cvfy(text: str, lang: str) -> str:
+    """The NLTK implementation CV names were built with. Sentence splitting
+    is skipped, as its punkt data are a separate download."""
+    text = text.replace('/', ' ')
+    for c in string.punctuation:
+        text = text.replace(c, '')
+    for c in string.digits:
+        text = text.replace(c, '')
+    text = unidecode(text).lower()
+    sep = get_sep(lang)
+    return f'cv{sep}' + sep.join(nltk.word_tokenize(text, preserve_line=True))
+
+
+@pytest.mark.parametrize('lang', ['EN', 'FR'])
+@pytest.mark.parametrize('title', TITLES)
+def test_cvfy_matches_nltk(title, lang):
+    assert cvfy(title, lang) == nltk_cvfy(title, lang)
+
+
+@pytest.mark.parametrize('title, lang, expected', [
+    ('Data Scientist', 'FR', 'cv-data-scientist'),
+    ('Front‑end dev', 'EN', 'cv_front-end_dev'),
+    ('Senior’s Assistant', 'EN', "cv_senior_'s_assistant"),
+    ('Can’t wait', 'EN', "cv_ca_n't_wait"),
+    ('Data Scientist “Senior”', 'EN', "cv_data_scientist_``_senior_''"),
+    ('Gonna', 'FR', 'cv-gon-na'),
+])
+def test_cvfy_examples(title, lang, expected):
+    assert cvfy(title, lang) == expected
+
+
+def test_cvfy_series_matches_cvfy():
+    languages = ['EN', 'FR'] * (len(TITLES) // 2) + ['EN'] * (len(TITLES) % 2)
+    slugs = cvfy_series(pd.Series(TITLES), pd.Series(languages))
+    assert slugs.tolist() == [cvfy(title, lang)
+                              for title, lang in zip(TITLES, languages)]
@@ -0,0 +1,73 @@
+import copy
+import random
+import threading
+import time
+
+from jobapplier import daemon
+from jobapplier.data_preprocessing import map_dict
+from jobapplier.fake_notion import synthetic_page
+from jobapplier.queries import is_pending_letter
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+def test_changed_pages_compares_content(fake):
+    pages = list(fake.databases['db'].values())
+    seen = {}
+    assert daemon.changed_pages(pages, seen) == pages
+    assert daemon.changed_pages(pages, seen) == []
+
+    # Edited within the same minute: last_edited_time does not change.
+    edited = copy.deepcopy(pages[0])
+    edited['properties']['Language']['select'] = {'name': 'FR'}
+    assert daemon.changed_pages([edited, pages[1]], seen) == [edited]
+
+
+def test_rows_without_company_or_title_are_not_pending(fake):
+    page = copy.deepcopy(next(iter(fake.databases['db'].values())))
+    page['properties']['Stage']['select'] = None
+    page['properties']['Language']['select'] = {'name': 'EN'}
+    assert is_pending_letter(map_dict(page))
+    page['properties']['Company']['rich_text'] = []
+    assert not is_pending_letter(map_dict(page))
+
+
+def test_watch_appends_a_letter_set_in_the_minute_of_creation(
+        fake, client, tmp_path):
+    for page in fake.databases['db'].values():
+        page['properties']['Stage']['select'] = {'name': 'Applied'}
+    stop = threading.Event()
+    watcher = threading.Thread(target=daemon.watch, kwargs=dict(
+        client=client, database_id='db', stages=['letters'],
+        min_interval=0.05, max_interval=0.05,
+        mirror_path=tmp_path / 'mirror.sqlite',
+        ledger_path=tmp_path / 'ledger.sqlite', stop=stop
+    ))
+    watcher.start()
+    try:
+        page = synthetic_page('db', 1000, random.Random(0))
+        page['properties']['Stage']['select'] = None
+        page['properties']['Language']['select'] = None
+        page['created_time'] = page['last_edited_time'] = fake.tick()
+        with fake.lock:
+            fake.databases['db'][page['id']] = page
+            fake.query_cache.clear()
+        polls = len(fake.requests)
+        assert wait_for(lambda: len(fake.requests) > polls + 2)
+
+        # Same last_edited_time, as Notion rounds it to the minute.
+        with fake.lock:
+            page['properties']['Language']['select'] = {'name': 'EN'}
+            fake.query_cache.clear()
+        assert wait_for(lambda: page['id'] in fake.children)
+    finally:
+        stop.set()
+        watcher.join()
+    assert len(fake.writes) == 1
@@ -0,0 +1,65 @@
+import copy
+
+import pytest
+
+from jobapplier.dedup import (duplicate_rows, find_duplicates,
+                              plan_duplicate_tags)
+
+pytest.importorskip('numpy')
+
+
+def entry(fake, idx, company, title):
+    page = copy.deepcopy(fake.databases['db'][f'db-{idx:08d}'])
+    page['id'] = f'dup-{idx:08d}'
+    page['properties']['Company']['rich_text'][0]['plain_text'] = company
+    page['properties']['Job Title']['title'][0]['plain_text'] = title
+    page['properties']['Duplicate'] = {'type': 'rich_text', 'rich_text': []}
+    return page
+
+
+@pytest.fixture
+def pages(fake):
+    return [
+        entry(fake, 0, 'Société Générale', 'Data Engineer (H/F)'),
+        entry(fake, 1, 'Societe Generale SA', 'Data engineer'),
+        entry(fake, 2, 'Studio 54', 'Data Scientist'),
+        entry(fake, 3, 'Studio 71', 'Data Scientist'),
+        entry(fake, 4, 'Acme', 'Data Scientist'),
+    ]
+
+
+def test_near_duplicates_are_clustered(pages):
+    [cluster] = find_duplicates(pages)
+    assert [row['page_id'] for row in cluster.entries] == \
+        ['dup-00000000', 'dup-00000001']
+    # Named after the oldest entry.
+    assert cluster.tag == 'dup-dup00000'
+    assert 0.7 <= cluster.score < 1
+    assert [row['tag'] for row in duplicate_rows([cluster])] == \
+        [cluster.tag] * 2
+
+
+def test_numbers_in_company_names_are_significant(pages):
+    for cluster in find_duplicates(pages, threshold=0.5):
+        companies = {row['company'] for row in cluster.entries}
+        assert not {'Studio 54', 'Studio 71'} <= companies
+
+
+def test_synthetic_tracker_has_no_duplicates(fake):
+    assert find_duplicates(list(fake.databases['db'].values())) == []
+
+
+def test_tags_are_only_written_once(pages):
+    clusters = find_duplicates(pages)
+    plan = plan_duplicate_tags(None, 'db', clusters, pages)
+    assert [op.page_id for op in plan.page_updates] == \
+        ['dup-00000000', 'dup-00000001']
+    assert plan.skipped == 0
+
+    pages[0]['properties']['Duplicate']['rich_text'] = [
+        {'type': 'text', 'plain_text': clusters[0].tag,
+         'text': {'content': clusters[0].tag}}
+    ]
+    plan = plan_duplicate_tags(None, 'db', clusters, pages)
+    assert [op.page_id for op in plan.page_updates] == ['dup-00000001']
+    assert plan.skipped == 1
@@ -0,0 +1,83 @@
+import time
+
+import pytest
+
+from jobapplier.dispatcher import Job, dispatch
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record the retry delays instead of waiting for them."""
+    delays = []
+    monkeypatch.setattr(time, 'sleep', delays.append)
+    return delays
+
+
+def position_job(fake, number=1):
+    page_id = next(iter(fake.databases['db']))
+    return Job(key=page_id, method='PATCH', path=f'pages/{page_id}',
+               payload={'properties': {'Position': {'number': number}}})
+
+
+def test_retries_throttled_request_after_retry_after(fake, client, sleeps):
+    fake.inject_errors(429, retry_after=2)
+    [result] = dispatch([position_job(fake)], client)
+    assert result.ok
+    assert result.attempts == 2
+    assert sleeps == [2.0]
+    assert len(fake.writes) == 1
+
+
+@pytest.mark.parametrize('status', [500, 502, 503])
+def test_retries_server_errors_with_backoff(fake, client, sleeps, status):
+    fake.inject_errors(status, times=2)
+    [result] = dispatch([position_job(fake)], client)
+    assert result.ok
+    assert result.attempts == 3
+    assert len(sleeps) == 2
+    assert all(0 <= delay <= 0.5 * 2 ** attempt
+               for attempt, delay in enumerate(sleeps))
+
+
+def test_gives_up_after_max_retries(fake, sleeps):
+    client = fake.client(max_retries=2)
+    fake.inject_errors(503, times=5)
+    [result] = dispatch([position_job(fake)], client)
+    assert not result.ok
+    assert result.status_code == 503
+    assert result.attempts == 3
+    assert fake.writes == []
+
+
+def test_does_not_retry_client_errors(fake, client, sleeps):
+    job = position_job(fake)
+    job.path = 'pages/missing'
+    [result] = dispatch([job], client)
+    assert not result.ok
+    assert result.status_code == 404
+    assert result.attempts == 1
+    assert sleeps == []
+
+
+def test_dispatches_every_job_under_throttling(fake, sleeps):
+    fake.rate, fake.burst, fake.allowance = 1000.0, 2, 2.0
+    client = fake.client()
+    jobs = [position_job(fake, number) for number in range(20)]
+    results = dispatch(jobs, client, max_concurrency=4)
+    assert len(results) == 20
+    assert all(result.ok for result in results)
+
+
+def test_reports_requests_in_flight_when_jobs_fail(fake, client):
+    def jobs():
+        for number in range(10):
+            yield position_job(fake, number)
+        raise RuntimeError('next result page failed')
+
+    reported = []
+    with pytest.raises(RuntimeError):
+        dispatch(jobs(), client, max_concurrency=4,
+                 on_result=reported.append)
+    assert len(reported) == 10
+    assert all(result.ok for result in reported)
+    assert len(fake.writes) == 10
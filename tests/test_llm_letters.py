@@ -0,0 +1,92 @@
+from types import SimpleNamespace
+
+import pytest
+
+from jobapplier import llm_letters
+from jobapplier.cover_letter import build_letter
+from jobapplier.llm_letters import TokenUsage, render_llm_letters
+
+ROWS = [
+    ('EN', 'Acme', 'Data Scientist', 'Models and dashboards.'),
+    ('FR', 'Initech', 'Ingénieur', 'Pipelines de données.'),
+]
+
+
+class StubClient:
+    """Stands in for `openai.AsyncOpenAI`: answers each prompt with a
+    letter naming its company, or fails for the companies in `failing`."""
+
+    def __init__(self, failing=(), content='Letter for {}'):
+        self.failing = set(failing)
+        self.content = content
+        self.prompts = []
+        self.chat = SimpleNamespace(
+            completions=SimpleNamespace(create=self.create))
+
+    async def create(self, model, messages):
+        prompt = messages[0]['content']
+        self.prompts.append(prompt)
+        company = next(row[1] for row in ROWS if row[1] in prompt)
+        if company in self.failing:
+            raise ConnectionError('stub is down')
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(
+                content=self.content.format(company)))],
+            usage=SimpleNamespace(prompt_tokens=10, completion_tokens=5),
+        )
+
+
+@pytest.fixture(autouse=True)
+def use_templates(templates):
+    pass
+
+
+def generate(tmp_path, client, usage):
+    return render_llm_letters(ROWS, usage=usage, model='stub',
+                              cache_path=tmp_path / 'llm.sqlite',
+                              client=client)
+
+
+def test_completions_are_cached(tmp_path):
+    usage = TokenUsage()
+    letters = generate(tmp_path, StubClient(), usage)
+    assert letters == ['Letter for Acme', 'Letter for Initech']
+    assert (usage.generated, usage.cached, usage.fallbacks) == (2, 0, 0)
+    assert (usage.prompt_tokens, usage.completion_tokens) == (20, 10)
+
+    client, usage = StubClient(), TokenUsage()
+    assert generate(tmp_path, client, usage) == letters
+    assert client.prompts == []
+    assert (usage.generated, usage.cached, usage.fallbacks) == (0, 2, 0)
+    assert (usage.prompt_tokens, usage.completion_tokens) == (0, 0)
+
+
+@pytest.mark.parametrize('client', [
+    StubClient(failing={'Initech'}),
+    StubClient(content=' '),
+])
+def test_failed_completion_falls_back_to_the_template(tmp_path, client):
+    usage = TokenUsage()
+    letters = generate(tmp_path, client, usage)
+    assert letters[1] == build_letter('FR', 'Initech', 'Ingénieur')
+    assert usage.fallbacks == len(usage.errors) >= 1
+    assert 'Ingénieur at Initech' in usage.errors[-1]
+    # Fallbacks are not cached, the next run asks the model again.
+    client = StubClient()
+    generate(tmp_path, client, TokenUsage())
+    assert len(client.prompts) == usage.fallbacks
+
+
+def test_missing_client_falls_back_to_the_template(tmp_path, monkeypatch):
+    def openai_client():
+        raise ModuleNotFoundError("No module named 'openai'")
+
+    monkeypatch.setattr(llm_letters, 'openai_client', openai_client)
+    generate(tmp_path, StubClient(failing={'Initech'}), TokenUsage())
+
+    usage = TokenUsage()
+    letters = generate(tmp_path, None, usage)
+    assert letters == ['Letter for Acme',
+                       build_letter('FR', 'Initech', 'Ingénieur')]
+    assert (usage.generated, usage.cached, usage.fallbacks) == (0, 1, 1)
+    assert "No module named 'openai'" in usage.errors[0]
@@ -0,0 +1,112 @@
+import random
+import sqlite3
+
+from jobapplier import mirror
+from jobapplier.api_requests import fetch_database_jsons, sync_mirror
+from jobapplier.fake_notion import synthetic_page
+from jobapplier.mirror import open_mirror, load_pages
+
+
+def mirrored(path, database_id='db'):
+    conn = open_mirror(path)
+    try:
+        return load_pages(conn, database_id)
+    finally:
+        conn.close()
+
+
+def test_first_sync_downloads_the_whole_database(fake, client, tmp_path):
+    path = tmp_path / 'mirror.sqlite'
+    assert sync_mirror(client, 'db', mirror_path=path) == 50
+    assert len(mirrored(path)) == 50
+
+
+def test_sync_only_brings_edited_pages(fake, client, tmp_path):
+    path = tmp_path / 'mirror.sqlite'
+    sync_mirror(client, 'db', mirror_path=path)
+    assert sync_mirror(client, 'db', mirror_path=path) == 0
+
+    page_id = next(iter(fake.databases['db']))
+    client.update_page(page_id, {'Position': {'number': 1234}})
+    seen = []
+    changed = sync_mirror(client, 'db', mirror_path=path,
+                          on_pages=seen.extend)
+    assert changed == 1
+    # The watermark filter is inclusive, so the latest page of the previous
+    # sync comes back with the edited one.
+    assert len(seen) == 2
+    assert seen[-1]['id'] == page_id
+    [page] = [page for page in mirrored(path) if page['id'] == page_id]
+    assert page['properties']['Position']['number'] == 1234
+
+
+def test_reconcile_detects_deleted_pages(fake, client, tmp_path):
+    path = tmp_path / 'mirror.sqlite'
+    sync_mirror(client, 'db', mirror_path=path)
+    page_id = next(iter(fake.databases['db']))
+    del fake.databases['db'][page_id]
+    fake.query_cache.clear()
+
+    sync_mirror(client, 'db', mirror_path=path)
+    assert page_id in {page['id'] for page in mirrored(path)}
+    sync_mirror(client, 'db', mirror_path=path, reconcile=True)
+    assert page_id not in {page['id'] for page in mirrored(path)}
+    assert len(mirrored(path)) == 49
+
+
+def test_reconcile_after_only_reconciles_stale_mirrors(fake, client,
+                                                       tmp_path):
+    path = tmp_path / 'mirror.sqlite'
+    sync_mirror(client, 'db', mirror_path=path, reconcile_after=24)
+    page_id = next(iter(fake.databases['db']))
+    del fake.databases['db'][page_id]
+    fake.query_cache.clear()
+
+    sync_mirror(client, 'db', mirror_path=path, reconcile_after=24)
+    assert len(mirrored(path)) == 50
+    with sqlite3.connect(path) as conn:
+        conn.execute("UPDATE mirror_state "
+                     "SET reconciled_at = '2020-01-01T00:00:00+00:00'")
+    sync_mirror(client, 'db', mirror_path=path, reconcile_after=24)
+    assert len(mirrored(path)) == 49
+
+
+def test_pages_keep_the_notion_query_order(fake, client, tmp_path):
+    path = tmp_path / 'mirror.sqlite'
+    pages = list(fake.databases['db'].values())
+    # Created in the same minute, so only Notion knows their order.
+    for page in pages:
+        page['created_time'] = '2024-01-01T10:00:00.000Z'
+    fake.databases['db'] = {page['id']: page for page in reversed(pages)}
+    fake.query_cache.clear()
+
+    sync_mirror(client, 'db', mirror_path=path, reconcile=True)
+    assert [page['id'] for page in mirrored(path)] \
+        == [page['id'] for page in fetch_database_jsons(client, 'db')]
+
+
+def test_pages_by_id_are_read_in_chunks_in_query_order(
+        fake, client, tmp_path, monkeypatch):
+    path = tmp_path / 'mirror.sqlite'
+    sync_mirror(client, 'db', mirror_path=path, reconcile=True)
+    # Added since the last reconcile: no query rank yet.
+    rng = random.Random(0)
+    for idx in range(50, 60):
+        page = synthetic_page('db', idx, rng)
+        fake.databases['db'][page['id']] = page
+    fake.query_cache.clear()
+    sync_mirror(client, 'db', mirror_path=path)
+
+    monkeypatch.setattr(mirror, 'QUERY_CHUNK_SIZE', 7)
+    conn = open_mirror(path)
+    try:
+        conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 8)
+        expected = load_pages(conn, 'db')
+        page_ids = [page['id'] for page in expected]
+        random.Random(1).shuffle(page_ids)
+        pages = load_pages(conn, 'db',
+                           page_ids=page_ids + page_ids[:5] + ['missing'])
+    finally:
+        conn.close()
+    assert len(expected) == 60
+    assert pages == expected
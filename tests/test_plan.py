@@ -0,0 +1,57 @@
+import requests
+
+from jobapplier.blocks import build_block
+from jobapplier.ledger import open_ledger, is_recorded, appended_batches
+from jobapplier.plan import PageUpdate, BlockAppend, apply_writes
+
+
+def letter_batches(n_batches):
+    return [[build_block(f'Batch {idx}, line {line}') for line in range(2)]
+            for idx in range(n_batches)]
+
+
+def appended_texts(fake, page_id):
+    return [block['paragraph']['rich_text'][0]['text']['content']
+            for block in fake.children.get(page_id, [])]
+
+
+def test_update_and_append_to_the_same_page(fake, client, tmp_path):
+    page_id = next(iter(fake.databases['db']))
+    ledger = open_ledger(tmp_path / 'ledger.sqlite')
+    append = BlockAppend(page_id, letter_batches(2), label='letter',
+                         letter_hash='hash')
+    results = apply_writes(client, [
+        PageUpdate(page_id, {'Position': {'number': 7}}, label='position'),
+        append,
+    ], ledger=ledger)
+    assert all(result.ok for result in results)
+    assert len(appended_texts(fake, page_id)) == 4
+    [(block_id,)] = ledger.execute(
+        "SELECT block_id FROM appended_letters").fetchall()
+    assert block_id == fake.children[page_id][0]['id']
+
+
+def test_interrupted_append_resumes_from_the_failed_batch(
+        fake, client, tmp_path, monkeypatch):
+    page_id = next(iter(fake.databases['db']))
+    ledger = open_ledger(tmp_path / 'ledger.sqlite')
+    append = BlockAppend(page_id, letter_batches(3), label='letter',
+                         letter_hash='hash')
+    append_children = client.append_children
+
+    def failing_append(block_id, children):
+        raise requests.ConnectionError('connection reset')
+
+    monkeypatch.setattr(client, 'append_children', failing_append)
+    [result] = apply_writes(client, [append], ledger=ledger)
+    assert not result.ok
+    assert appended_batches(ledger, page_id, 'hash')[0] == 1
+    assert not is_recorded(ledger, page_id, 'hash')
+
+    monkeypatch.setattr(client, 'append_children', append_children)
+    [result] = apply_writes(client, [append], ledger=ledger)
+    assert result.ok
+    assert is_recorded(ledger, page_id, 'hash')
+    assert appended_texts(fake, page_id) \
+        == [block['paragraph']['rich_text'][0]['text']['content']
+            for batch in append.batches for block in batch]
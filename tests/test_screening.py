@@ -0,0 +1,72 @@
+import pandas as pd
+import pytest
+
+from jobapplier.api_requests import sync_mirror
+from jobapplier.data_preprocessing import map_dict
+from jobapplier.screening import screen_listings
+
+
+@pytest.fixture
+def mirror_path(client, tmp_path):
+    path = tmp_path / 'mirror.sqlite'
+    sync_mirror(client, 'db', mirror_path=path)
+    return path
+
+
+@pytest.fixture
+def entry(fake):
+    return map_dict(next(iter(fake.databases['db'].values())))
+
+
+def test_listings_are_flagged_against_the_tracker(
+        fake, mirror_path, entry, tmp_path):
+    listings = tmp_path / 'listings.csv'
+    pd.DataFrame({
+        'company_name': [entry['company'].upper(), entry['company'],
+                         'Nowhere Inc', None],
+        'job_title': [entry['job_title'], 'Astronaut', 'Data Scientist',
+                      'Data Scientist'],
+    }).to_csv(listings, index=False)
+    output = tmp_path / 'screened.csv'
+
+    requests = len(fake.requests)
+    df = screen_listings(None, 'db', listings, output, mirror_path=mirror_path)
+    assert len(fake.requests) == requests
+    assert df['already_applied'].tolist() == [True, True, False, False]
+    assert df['same_title'].tolist() == [True, False, False, False]
+    assert entry['page_id'] in df.loc[0, 'matched_page_ids'].split('; ')
+    assert f"{entry['job_title']} @ {entry['company']}" \
+        in df.loc[0, 'matched_entries']
+    assert pd.read_csv(output)['already_applied'].tolist() == \
+        df['already_applied'].tolist()
+
+
+def test_jsonl_listings_with_a_company_column(
+        mirror_path, entry, tmp_path):
+    listings = tmp_path / 'listings.jsonl'
+    pd.DataFrame({'company': [entry['company']]}).to_json(
+        listings, orient='records', lines=True)
+    output = tmp_path / 'screened.jsonl'
+
+    df = screen_listings(None, 'db', listings, output, mirror_path=mirror_path)
+    assert df['already_applied'].tolist() == [True]
+    assert not df['same_title'].any()
+    assert pd.read_json(output, lines=True)['company_name'].tolist() == \
+        [entry['company']]
+
+
+def test_fuzzy_screening_matches_misspelled_companies(
+        mirror_path, entry, tmp_path):
+    listings = tmp_path / 'listings.csv'
+    # A doubled letter: neither a substring nor a token prefix.
+    misspelled = entry['company'][:3] + entry['company'][2:]
+    pd.DataFrame({'company_name': [misspelled]}).to_csv(listings,
+                                                        index=False)
+    output = tmp_path / 'screened.csv'
+
+    exact = screen_listings(None, 'db', listings, output,
+                            mirror_path=mirror_path)
+    fuzzy = screen_listings(None, 'db', listings, output, fuzzy=True,
+                            mirror_path=mirror_path)
+    assert entry['page_id'] not in str(exact.loc[0, 'matched_page_ids'])
+    assert entry['page_id'] in fuzzy.loc[0, 'matched_page_ids']
@@ -0,0 +1,58 @@
+import copy
+
+import pytest
+
+from jobapplier.api_requests import sync_mirror
+from jobapplier.data_preprocessing import map_dict
+from jobapplier.mirror import open_mirror, load_pages, upsert_pages
+from jobapplier.snapshot import (application_month, export_snapshot,
+                                 load_snapshot)
+
+pytest.importorskip('pyarrow')
+
+
+@pytest.fixture
+def paths(client, tmp_path):
+    mirror_path = tmp_path / 'mirror.sqlite'
+    sync_mirror(client, 'db', mirror_path=mirror_path)
+    return tmp_path / 'snapshot', mirror_path
+
+
+def export(paths):
+    snapshot_path, mirror_path = paths
+    return export_snapshot(None, 'db', snapshot_path=snapshot_path,
+                           mirror_path=mirror_path)
+
+
+def test_first_export_writes_every_partition(paths):
+    months = export(paths)
+    assert months
+    df = load_snapshot(paths[0])
+    assert len(df) == 50
+    assert sorted(df['month'].astype(str).unique()) == months
+
+
+def test_export_is_skipped_when_the_mirror_is_unchanged(paths):
+    export(paths)
+    assert export(paths) == []
+
+
+def test_edit_keeping_last_edited_time_rewrites_its_partition(paths):
+    snapshot_path, mirror_path = paths
+    export(paths)
+
+    conn = open_mirror(mirror_path)
+    try:
+        page = copy.deepcopy(load_pages(conn, 'db')[0])
+        # Notion rounds `last_edited_time` to the minute: an edit in the
+        # minute of the previous export does not change it.
+        page['properties']['Position']['number'] = 1234
+        upsert_pages(conn, 'db', [page])
+    finally:
+        conn.close()
+
+    month = application_month(page, map_dict(page))
+    assert export(paths) == [month]
+    df = load_snapshot(snapshot_path, columns=['page_id', 'position'],
+                       months=[month])
+    assert df.set_index('page_id').loc[page['id'], 'position'] == 1234
@@ -0,0 +1,124 @@
+from configparser import ConfigParser
+from pathlib import Path
+
+import pytest
+
+from jobapplier import constants, trackers as trackers_module
+from jobapplier.api_requests import fetch_database_jsons
+from jobapplier.main import main
+from jobapplier.trackers import (Tracker, failed_trackers, load_trackers,
+                                 run_trackers, select_trackers,
+                                 tracker_clients)
+
+CONFIG = """
+[secrets]
+api_key = secret_shared
+
+[tracker:alice]
+database_id = db-alice
+rate_limit = 3
+property.job_title = Poste
+
+[tracker:bob]
+database_id = db-bob
+rate_limit = 2
+
+[tracker:carol]
+database_id = db-carol
+api_key = secret_carol
+"""
+
+
+TEMPLATE = Path(__file__).parent.parent.joinpath('config.ini.template')
+
+
+@pytest.fixture
+def trackers():
+    config = ConfigParser()
+    config.read_string(CONFIG)
+    return load_trackers(config)
+
+
+def test_trackers_are_read_from_their_sections(trackers):
+    alice, bob, carol = trackers
+    assert [tracker.name for tracker in trackers] == ['alice', 'bob', 'carol']
+    assert alice.api_key == bob.api_key == 'secret_shared'
+    assert carol.api_key == 'secret_carol'
+    assert alice.schema['job_title'][0] == 'Poste'
+    assert bob.schema['job_title'][0] == 'Job Title'
+    # Each tracker has its own mirror.
+    assert len({tracker.mirror_path for tracker in trackers}) == 3
+
+
+def test_unknown_property_columns_are_rejected():
+    config = ConfigParser()
+    config.read_string(CONFIG + 'property.salary = Salaire\n')
+    with pytest.raises(ValueError, match='salary'):
+        load_trackers(config)
+
+
+def test_select_trackers(trackers):
+    assert select_trackers(trackers, None) == trackers
+    assert [tracker.name for tracker in
+            select_trackers(trackers, ['carol', 'alice'])] == \
+        ['carol', 'alice']
+    with pytest.raises(ValueError, match='dave'):
+        select_trackers(trackers, ['dave'])
+
+
+def test_trackers_sharing_an_integration_share_a_client(trackers):
+    clients = tracker_clients(trackers)
+    try:
+        assert set(clients) == {'secret_shared', 'secret_carol'}
+        # Limited to the lowest rate of the trackers using it.
+        assert clients['secret_shared'].limiter.rate == 2
+    finally:
+        for client in clients.values():
+            client.close()
+
+
+def test_failing_tracker_does_not_stop_the_others(fake, client, capsys):
+    trackers = [Tracker(name=name, database_id='db', api_key='key')
+                for name in ('first', 'broken', 'last')]
+
+    def action(tracker, tracker_client):
+        assert tracker_client is client
+        if tracker.name == 'broken':
+            raise RuntimeError('no such database')
+        return len(fetch_database_jsons(tracker_client, 'db'))
+
+    results = run_trackers(trackers, action, clients={'key': client},
+                           max_workers=3)
+    assert results['first'] == results['last'] == 50
+    assert isinstance(results['broken'], RuntimeError)
+    assert failed_trackers(results) == ['broken']
+    out = capsys.readouterr().out
+    assert 'Tracker broken failed: no such database' in out
+    assert 'Tracker last done.' in out
+    # The clients given are left open.
+    assert len(fetch_database_jsons(client, 'db')) == 50
+
+
+@pytest.mark.parametrize('databases, status', [
+    (['db'], 0),
+    (['db', 'missing'], 1),
+])
+def test_main_fails_when_a_tracker_fails(
+        fake, client, templates, tmp_path, monkeypatch, databases, status):
+    monkeypatch.setattr(trackers_module, 'load_trackers', lambda: [
+        Tracker(name=database_id, database_id=database_id, api_key='key',
+                data_path=tmp_path / database_id)
+        for database_id in databases
+    ])
+    monkeypatch.setattr(trackers_module, 'tracker_clients',
+                        lambda trackers: {'key': client})
+
+    assert main(['-a', 'fill_cover_letters']) == status
+    assert fake.writes
+
+
+def test_config_template_has_the_keys_read():
+    config = ConfigParser()
+    config.read(TEMPLATE)
+    for read in constants.CONFIG_CONSTANTS.values():
+        read(config)